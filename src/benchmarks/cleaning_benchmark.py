@@ -0,0 +1,58 @@
+# Scaling benchmark for the parallel cleaning process
+# Run from the repository root: python -m src.benchmarks.cleaning_benchmark [raw_file.csv]
+from __future__ import annotations
+
+import os
+import sys
+import time
+
+import pandas as pd
+
+from src.data.cleaning import run_cleaning_process
+from src.utils.constants import RAW_DIR_PATH, RAW_FILE_BEGIN
+from src.utils.data_loader import DataLoader
+
+
+def benchmark_parallel_cleaning(
+        df: pd.DataFrame,
+        n_jobs_list: tuple[int] = (1, 2, 4, 8),
+        repeat: int = 3,
+) -> pd.DataFrame:
+    """
+    Time run_cleaning_process on the same raw data for every number of workers in n_jobs_list,
+    and check that the output is identical to the serial one.
+    """
+    serial = None
+    results = []
+    for n_jobs in n_jobs_list:
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cleaned = run_cleaning_process(df=df.copy(), save_to_file=False, n_jobs=n_jobs)
+            timings.append(time.perf_counter() - start)
+        
+        if serial is None:
+            serial = cleaned
+        identical = cleaned.equals(serial)
+        results.append({'n_jobs': n_jobs, 'seconds': min(timings), 'identical': identical})
+    
+    results = pd.DataFrame(results)
+    results['speedup'] = results['seconds'].iloc[0] / results['seconds']
+    return results
+
+
+def main():
+    if len(sys.argv) > 1:
+        filepath = sys.argv[1]
+    else:
+        dl = DataLoader(dir_path=RAW_DIR_PATH)
+        filepath = os.path.join(RAW_DIR_PATH, dl.get_latest_file(begins_with=RAW_FILE_BEGIN))
+    
+    print(f'Reading raw file: {filepath}')
+    df = pd.read_csv(filepath)
+    print(f'Benchmarking the cleaning of {df.shape[0]} rows on {os.cpu_count()} cores...')
+    print(benchmark_parallel_cleaning(df).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
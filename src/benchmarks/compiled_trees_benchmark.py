@@ -0,0 +1,78 @@
+# Accuracy and speed of the compiled boosters of src/utils/compiled_trees.py against the native predictors of the ensemble
+# Run from the repository root: python -m src.benchmarks.compiled_trees_benchmark [n_estimators]
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.benchmarks.model_artifact_benchmark import make_listings
+from src.benchmarks.prediction_server_benchmark import fit_ensemble_artifacts
+from src.model_training.prediction_server import EnsemblePredictor
+from src.utils.compiled_trees import compile_booster
+from src.utils.model_artifacts import ModelArtifact
+
+# The largest difference allowed between the compiled and the native log-prices
+TOLERANCE = 1e-9
+
+
+def _time(function: callable, repeats: int) -> tuple[float, object]:
+    # The best time of repeats calls, and the result of the last one
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_compiled_trees(
+        models: dict[str, ModelArtifact],
+        cars: pd.DataFrame,
+        batch_sizes: tuple[int, ...] = (1, 64, 1024),
+        repeats: int = 3,
+) -> pd.DataFrame:
+    """
+    Compile the boosters of the models, and compare the averaged log-prices of batches of cars predicted by the
+    native and the compiled boosters
+    """
+    compiled_models = {}
+    for name, model in models.items():
+        compile_seconds, booster = _time(lambda: compile_booster(model.booster), 1)
+        compiled_models[name] = ModelArtifact(model.manifest, model.arrays, booster)
+        print(f'Compiled the {name} booster in {compile_seconds:.2f}s')
+    native, compiled = EnsemblePredictor(models), EnsemblePredictor(compiled_models)
+
+    records = cars.to_dict('records')
+    results = []
+    for batch_size in batch_sizes + (len(records),):
+        batch = records[:batch_size]
+        native_seconds, native_log_prices = _time(lambda: native.predict_log_price(batch), repeats)
+        compiled_seconds, compiled_log_prices = _time(lambda: compiled.predict_log_price(batch), repeats)
+        max_abs_diff = np.abs(native_log_prices - compiled_log_prices).max()
+        results.append({
+            'batch_size': len(batch),
+            'native_ms': native_seconds * 1000,
+            'compiled_ms': compiled_seconds * 1000,
+            'max_abs_diff': max_abs_diff,
+            'within_tolerance': max_abs_diff <= TOLERANCE,
+        })
+    return pd.DataFrame(results)
+
+
+def main():
+    n_estimators = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    df, y = make_listings(5000)
+    cars = df.sample(2000, random_state=1)
+    # Some missing values and categories the models have never seen
+    cars.loc[cars.index[::7], 'km'] = np.nan
+    cars.loc[cars.index[::11], 'oem'] = 'unseen oem'
+    print(f'Fitting the ensemble with {n_estimators} trees on {df.shape[0]} rows...')
+    models = fit_ensemble_artifacts(df, y, n_estimators=n_estimators)
+    print(benchmark_compiled_trees(models, cars).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+# Sustained pages per second of a crawl of the CarDekho listing against a local mock which answers 429 above its rate limit:
+# all the searches gathered at once like before, against the same searches run through the CrawlScheduler
+# Run from the repository root:
+# python -m src.benchmarks.crawl_scheduler_benchmark [n_searches] [api_rate_limit] [response_delay_ms]
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import pandas as pd
+
+from src.scrapper.cardekho_api import CarDekhoAPIException, CarDekhoSession
+from src.scrapper.crawl_scheduler import CrawlScheduler, TokenBucket
+
+PAGE_SIZE = 20
+# The number of cars of every search of the mock
+CARS_PER_SEARCH = 190
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, bucket: TokenBucket, counts, response_delay_ms: float):
+    # Answer the pages of the searches, or 429 when the rate limit of the mock is exceeded
+    try:
+        while True:
+            request = await reader.readuntil(b'\r\n\r\n')
+            await asyncio.sleep(response_delay_ms / 1000)
+            bucket._refill()
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                query = parse_qs(urlsplit(request.split(b' ')[1].decode()).query)
+                page_from = int(query['pagefrom'][0])
+                cars = [{'usedCarSkuId': f'{query["searchstring"][0]}-{i}'} for i in range(page_from, min(page_from + PAGE_SIZE, CARS_PER_SEARCH))]
+                status, payload = b'200 OK', json.dumps({'data': {'cars': cars}}).encode()
+            else:
+                with counts.get_lock():
+                    counts.value += 1
+                status, payload = b'429 Too Many Requests', b'{"message": "Too many requests"}'
+            writer.write(
+                b'HTTP/1.1 ' + status + b'\r\nContent-Type: application/json\r\nContent-Length: '
+                + str(len(payload)).encode() + b'\r\n\r\n' + payload
+            )
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    writer.close()
+
+
+def _serve_mock(ports: multiprocessing.Queue, counts, rate_limit: float, response_delay_ms: float) -> None:
+    async def serve():
+        bucket = TokenBucket(rate_limit)
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle_connection(reader, writer, bucket, counts, response_delay_ms),
+            '127.0.0.1', 0, backlog=1024,
+        )
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_mock_api(rate_limit: float, response_delay_ms: float) -> tuple[multiprocessing.Process, int, object]:
+    """
+    A mock of the listing API on a free port, in its own process, with the number of 429 it has answered.
+    Stop it with terminate()
+    """
+    ports, counts = multiprocessing.Queue(), multiprocessing.Value('i', 0)
+    process = multiprocessing.Process(target=_serve_mock, args=(ports, counts, rate_limit, response_delay_ms), daemon=True)
+    process.start()
+    return process, ports.get(), counts
+
+
+async def _crawl_search(get_page: callable, search_string: str) -> tuple[int, bool]:
+    # The pagination of src/scrapper/save_cars.py: a failed page ends the search
+    n_cars, page_from = 0, 0
+    while True:
+        try:
+            cars = await get_page({'searchstring': search_string, 'pagefrom': page_from})
+        except CarDekhoAPIException:
+            return n_cars, False
+        n_cars += len(cars)
+        if len(cars) < PAGE_SIZE:
+            return n_cars, True
+        page_from += PAGE_SIZE
+
+
+def benchmark_crawl_scheduler(n_searches: int = 50, rate_limit: float = 50, response_delay_ms: float = 20) -> pd.DataFrame:
+    """
+    Crawl n_searches searches against the mock API limited to rate_limit pages per second, with all the searches
+    gathered at once and through the CrawlScheduler
+    """
+    server, port, throttled = start_mock_api(rate_limit, response_delay_ms)
+    url = f'http://127.0.0.1:{port}/v5/srp/cardekho'
+    search_strings = [f'used-cars+in+search-{i}' for i in range(n_searches)]
+
+    async def crawl(use_scheduler: bool) -> tuple[list, dict]:
+        # A fresh scheduler starts at its default rate, it has to find the rate limit of the API
+        scheduler = CrawlScheduler() if use_scheduler else None
+        async with CarDekhoSession() as session:
+            async def get_page(query_params: dict) -> list:
+                if scheduler is None:
+                    return await session.get_cars(url, query_params)
+                return await scheduler.run(session.get_cars, url, query_params)
+
+            results = await asyncio.gather(*[_crawl_search(get_page, search_string) for search_string in search_strings])
+        return results, scheduler.get_stats() if scheduler is not None else {}
+
+    results = []
+    for mode in ('gather_all', 'crawl_scheduler'):
+        # Let the rate limit of the mock refill between the runs
+        time.sleep(2)
+        throttled.value = 0
+        start = time.perf_counter()
+        searches, stats = asyncio.run(crawl(mode == 'crawl_scheduler'))
+        seconds = time.perf_counter() - start
+        n_cars = sum(n_cars for n_cars, _ in searches)
+        n_pages = sum(-(-n_cars // PAGE_SIZE) for n_cars, _ in searches)
+        results.append({
+            'mode': mode,
+            'seconds': seconds,
+            'pages_per_second': n_pages / seconds,
+            'complete_searches': sum(complete for _, complete in searches),
+            'cars': n_cars,
+            'expected_cars': n_searches * CARS_PER_SEARCH,
+            'responses_429': throttled.value,
+            'final_rate': stats.get('rate'),
+        })
+    server.terminate()
+    return pd.DataFrame(results)
+
+
+def main():
+    n_searches = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    rate_limit = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    response_delay_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    print(f'Benchmarking a crawl of {n_searches} searches against an API limited to {rate_limit} pages per second...')
+    print(benchmark_crawl_scheduler(n_searches, rate_limit, response_delay_ms).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+# Accuracy vs speed benchmark of the neighbour searches of the KNN imputation
+# Run from the repository root: python -m src.benchmarks.knn_imputer_benchmark [data_file.csv]
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.impute import KNNImputer
+
+from src.feature_engineering.neighbours import NeighbourImputer, get_neighbour_search
+from src.utils.storage import get_storage
+
+PARTITION_COLS = ['oem', 'model']
+NUMERICAL_COLS = ['km', 'mileage', 'engine_cc', 'max_power_bhp', 'seats', 'listed_price']
+
+
+def make_cars(n_rows: int, seed: int = 0) -> pd.DataFrame:
+    """
+    Synthetic cars where the numerical columns mostly depend on the model, like in the real listings
+    """
+    rng = np.random.default_rng(seed)
+    oem = rng.integers(0, 30, n_rows)
+    model = oem * 5 + rng.integers(0, 5, n_rows)
+    model_profile = np.random.default_rng(seed + 1).normal(size=(30 * 5, len(NUMERICAL_COLS)))
+    values = model_profile[model] + rng.normal(scale=0.1, size=(n_rows, len(NUMERICAL_COLS)))
+    df = pd.DataFrame(values, columns=NUMERICAL_COLS)
+    df['oem'] = oem.astype(str)
+    df['model'] = model.astype(str)
+    return df
+
+
+def benchmark_neighbour_searches(
+        df: pd.DataFrame,
+        searches: tuple[str] = ('brute', 'partitioned', 'ball_tree'),
+        n_neighbors: int = 5,
+        missing_rate: float = 0.1,
+        seed: int = 0,
+) -> pd.DataFrame:
+    """
+    Hide missing_rate of the numerical values, impute them with the KNNImputer of sklearn and with every neighbour search,
+    and compare the time, the error against the hidden values and the difference with the KNNImputer.
+    """
+    X = df[NUMERICAL_COLS].to_numpy(dtype=np.float64)
+    X = (X - np.nanmean(X, axis=0)) / np.nanstd(X, axis=0)
+    groups = df[PARTITION_COLS]
+    hidden = np.random.default_rng(seed).random(X.shape) < missing_rate
+    hidden &= ~np.isnan(X)
+    X_missing = np.where(hidden, np.nan, X)
+
+    start = time.perf_counter()
+    exact = KNNImputer(n_neighbors=n_neighbors).fit_transform(X_missing)
+    results = [{
+        'search': 'sklearn',
+        'seconds': time.perf_counter() - start,
+        'rmse': np.sqrt(np.mean((exact[hidden] - X[hidden]) ** 2)),
+        'mean_abs_diff_to_sklearn': 0.0,
+    }]
+    for search in searches:
+        search_arguments = {'partition_cols': PARTITION_COLS} if search == 'partitioned' else {}
+        imputer = NeighbourImputer(get_neighbour_search(search, **search_arguments), n_neighbors=n_neighbors)
+        start = time.perf_counter()
+        imputed = imputer.fit_transform(X_missing, groups)
+        results.append({
+            'search': search,
+            'seconds': time.perf_counter() - start,
+            'rmse': np.sqrt(np.mean((imputed[hidden] - X[hidden]) ** 2)),
+            'mean_abs_diff_to_sklearn': np.mean(np.abs(imputed[hidden] - exact[hidden])),
+        })
+
+    results = pd.DataFrame(results)
+    results['speedup'] = results['seconds'].iloc[0] / results['seconds']
+    return results
+
+
+def main():
+    if len(sys.argv) > 1:
+        filepath = sys.argv[1]
+        print(f'Reading data file: {filepath}')
+        frames = [get_storage(file_path=filepath).load(filepath, columns=NUMERICAL_COLS + PARTITION_COLS)]
+    else:
+        frames = [make_cars(n_rows) for n_rows in (2000, 8000, 20000)]
+
+    for df in frames:
+        print(f'Benchmarking the neighbour searches on {df.shape[0]} rows...')
+        print(benchmark_neighbour_searches(df).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+# Load time and size of the native model artifacts against the joblib pickles of the pipelines
+# Run from the repository root: python -m src.benchmarks.model_artifact_benchmark [n_estimators]
+from __future__ import annotations
+
+import os
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from src.model_training.training import CatBoostRegModel, LightGBMRegModel
+from src.utils.constants import FEATURE_LIST_COLS, TARGET
+from src.utils.model_artifacts import load_model_artifact
+
+
+def make_listings(n_rows: int, n_features: int = 200, seed: int = 0) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Synthetic listings with feature list columns, a few numerical and categorical columns and a price
+    """
+    rng = np.random.default_rng(seed)
+    features = np.array([f'feature {i}' for i in range(n_features)])
+    df = pd.DataFrame({
+        col: [str(features[rng.choice(n_features, rng.integers(0, 15), replace=False)].tolist()) for _ in range(n_rows)]
+        for col in FEATURE_LIST_COLS
+    })
+    df['km'] = rng.integers(1000, 200000, n_rows).astype(float)
+    df['year'] = rng.integers(2005, 2023, n_rows).astype(float)
+    df['engine_cc'] = rng.normal(1500, 300, n_rows)
+    df['oem'] = rng.choice([f'oem {i}' for i in range(30)], n_rows).astype(object)
+    df['fuel'] = rng.choice(['Petrol', 'Diesel', 'CNG'], n_rows).astype(object)
+    price = 2e5 + (df['year'] - 2005) * 5e4 - df['km'] * 0.5 + rng.normal(0, 2e4, n_rows)
+    return df, pd.Series(np.abs(price) + 1e4, name=TARGET)
+
+
+def _get_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+
+
+def _time(function: callable, repeats: int) -> tuple[float, object]:
+    # The best time of repeats calls, and the result of the last one
+    best = np.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark_model_artifacts(
+        df: pd.DataFrame,
+        y: pd.Series,
+        n_estimators: int = 1000,
+        repeats: int = 5,
+) -> pd.DataFrame:
+    """
+    Fit both models, save them as joblib pickles and as native artifacts, and compare the size of the files,
+    the time to load them and the time of a first prediction of one row after loading
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, model_class in (('catboost', CatBoostRegModel), ('lightgbm', LightGBMRegModel)):
+            model = model_class(transform_target=True)
+            model.model.set_params(n_estimators=n_estimators, verbose=0 if name == 'catboost' else -1)
+            model.fit(df, y)
+            expected = model.predict(df)
+
+            pickle_path = os.path.join(tmp_dir, f'{name}_pipeline.pkl')
+            artifact_path = os.path.join(tmp_dir, f'{name}_model')
+            formats = {
+                'joblib': (
+                    lambda: model.save_model(pickle_path, native=False),
+                    lambda: joblib.load(pickle_path),
+                    lambda pipeline, X: np.exp(pipeline.predict(X)),
+                    pickle_path,
+                ),
+                'native': (
+                    lambda: model.save_model(artifact_path),
+                    lambda: load_model_artifact(artifact_path),
+                    lambda artifact, X: artifact.predict(X),
+                    artifact_path,
+                ),
+            }
+            for format_name, (save, load, predict, path) in formats.items():
+                save_seconds, _ = _time(save, 1)
+                load_seconds, loaded = _time(load, repeats)
+                predict_seconds, _ = _time(lambda: predict(loaded, df.iloc[:1]), 1)
+                results.append({
+                    'model': name,
+                    'format': format_name,
+                    'size_kb': _get_size(path) / 1024,
+                    'save_seconds': save_seconds,
+                    'load_seconds': load_seconds,
+                    'first_predict_seconds': predict_seconds,
+                    'max_abs_diff': np.abs(predict(loaded, df) - expected).max(),
+                })
+    return pd.DataFrame(results)
+
+
+def main():
+    n_estimators = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    df, y = make_listings(5000)
+    print(f'Benchmarking the model artifacts with {n_estimators} trees on {df.shape[0]} rows...')
+    print(benchmark_model_artifacts(df, y, n_estimators=n_estimators).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+# Latency of single car predictions: the DataFrame path of the artifacts, the hot path of predict_one, and the HTTP server,
+# throughput of the server under concurrent requests with and without micro-batching, and the prediction cache
+# Run from the repository root: python -m src.benchmarks.prediction_server_benchmark [n_requests]
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.benchmarks.model_artifact_benchmark import make_listings
+from src.model_training.prediction_server import EnsemblePredictor, make_server
+from src.model_training.training import CatBoostRegModel, LightGBMRegModel
+from src.utils.constants import PREDICTION_P99_TARGET_MS
+from src.utils.model_artifacts import load_model_artifact
+from src.utils.prediction_cache import PredictionCache
+
+
+def _latency_stats(name: str, latencies: list[float]) -> dict:
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        'path': name,
+        'p50_ms': np.percentile(latencies_ms, 50),
+        'p99_ms': np.percentile(latencies_ms, 99),
+        'max_ms': latencies_ms.max(),
+        'within_p99_target': np.percentile(latencies_ms, 99) <= PREDICTION_P99_TARGET_MS,
+    }
+
+
+def fit_ensemble_artifacts(df: pd.DataFrame, y: pd.Series, n_estimators: int = 1000) -> dict:
+    """
+    Fit both models, save them as native artifacts and load them back
+    """
+    models = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, model_class in (('catboost', CatBoostRegModel), ('lightgbm', LightGBMRegModel)):
+            model = model_class(transform_target=True)
+            model.model.set_params(n_estimators=n_estimators, verbose=0 if name == 'catboost' else -1)
+            model.fit(df, y)
+            model.save_model(os.path.join(tmp_dir, f'{name}_model'))
+            models[name] = load_model_artifact(os.path.join(tmp_dir, f'{name}_model'), mmap=False)
+    return models
+
+
+def benchmark_prediction_latency(models: dict, cars: pd.DataFrame) -> pd.DataFrame:
+    """
+    Time the prediction of the cars one at a time
+    """
+    predictor = EnsemblePredictor(models)
+    n_requests = len(cars)
+
+    latencies = []
+    for i in range(n_requests):
+        start = time.perf_counter()
+        np.mean([model.predict(cars.iloc[i:i + 1]) for model in models.values()])
+        latencies.append(time.perf_counter() - start)
+    results = [_latency_stats('dataframe', latencies)]
+
+    records = cars.to_dict('records')
+    latencies = []
+    for car in records:
+        start = time.perf_counter()
+        predictor.predict_one(car)
+        latencies.append(time.perf_counter() - start)
+    results.append(_latency_stats('predict_one', latencies))
+
+    server = make_server(predictor, port=0, batch_max_size=1)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    connection = http.client.HTTPConnection(*server.server_address)
+    latencies = []
+    for car in records:
+        start = time.perf_counter()
+        connection.request('POST', '/predict', body=json.dumps(car), headers={'Content-Type': 'application/json'})
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+    server.shutdown()
+    server.server_close()
+    results.append(_latency_stats('http', latencies))
+    return pd.DataFrame(results)
+
+
+def _run_client(address: tuple, cars: list[dict], latencies: list) -> None:
+    connection = http.client.HTTPConnection(*address)
+    for car in cars:
+        start = time.perf_counter()
+        connection.request('POST', '/predict', body=json.dumps(car), headers={'Content-Type': 'application/json'})
+        connection.getresponse().read()
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def benchmark_concurrent_requests(
+        models: dict,
+        cars: pd.DataFrame,
+        n_clients: int = 16,
+        batch_max_sizes: tuple[int] = (1, 16, 64),
+        batch_max_wait_ms: float = 2,
+) -> pd.DataFrame:
+    """
+    Send the cars from n_clients concurrent clients to servers without (batch_max_size=1) and with micro-batching
+    """
+    records = cars.to_dict('records')
+    results = []
+    for batch_max_size in batch_max_sizes:
+        server = make_server(
+            EnsemblePredictor(models), port=0, batch_max_wait_ms=batch_max_wait_ms, batch_max_size=batch_max_size)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        latencies = []
+        clients = [
+            threading.Thread(target=_run_client, args=(server.server_address, records[i::n_clients], latencies))
+            for i in range(n_clients)
+        ]
+        start = time.perf_counter()
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        seconds = time.perf_counter() - start
+
+        server.shutdown()
+        server.server_close()
+        result = {'batch_max_size': batch_max_size, 'requests_per_second': len(records) / seconds}
+        result.update(_latency_stats('http', latencies))
+        if server.batcher is not None:
+            server.batcher.close()
+            result['batch_sizes'] = server.batcher.get_stats()['batch_sizes']
+        results.append(result)
+    return pd.DataFrame(results).drop(columns='path')
+
+
+def make_popular_requests(cars: pd.DataFrame, n_requests: int, n_popular: int = 200, seed: int = 0) -> list[dict]:
+    """
+    Requests for a few popular cars, picked with a Zipf distribution, with their km varying by up to 2000
+    """
+    rng = np.random.default_rng(seed)
+    popular = cars.sample(n_popular, random_state=seed).to_dict('records')
+    ranks = np.minimum(rng.zipf(1.2, n_requests), n_popular) - 1
+    return [{**popular[rank], 'km': popular[rank]['km'] + rng.integers(-2000, 2000)} for rank in ranks]
+
+
+def benchmark_prediction_cache(
+        models: dict,
+        requests: list[dict],
+        max_sizes: tuple[int] = (0, 100, 10000),
+        buckets: dict[str, float] = None,
+) -> pd.DataFrame:
+    """
+    Time the predictions of the requests one at a time without a cache (max_size=0) and with caches of max_sizes entries
+    """
+    buckets = {'km': 5000, 'year': 1} if buckets is None else buckets
+    results = []
+    for max_size in max_sizes:
+        cache = PredictionCache(max_size=max_size, buckets=buckets) if max_size > 0 else None
+        predictor = EnsemblePredictor(models, cache=cache)
+        latencies = []
+        for car in requests:
+            start = time.perf_counter()
+            predictor.predict_one(car)
+            latencies.append(time.perf_counter() - start)
+        result = {'cache_size': max_size}
+        result.update(_latency_stats('predict_one', latencies))
+        if cache is not None:
+            stats = cache.get_stats()
+            result.update({'hit_rate': stats['hit_rate'], 'entries': stats['size'], 'memory_kb': stats['memory_bytes'] / 1024})
+        results.append(result)
+    return pd.DataFrame(results).drop(columns='path')
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    df, y = make_listings(5000)
+    models = fit_ensemble_artifacts(df, y)
+    cars = df.sample(n_requests, replace=True, random_state=0)
+    print(f'Benchmarking the latency of {n_requests} single car predictions...')
+    print(benchmark_prediction_latency(models, cars).to_string(index=False))
+    print(f'Benchmarking {n_requests} concurrent requests...')
+    print(benchmark_concurrent_requests(models, cars).to_string(index=False))
+    print(f'Benchmarking the prediction cache on {n_requests} requests for popular cars...')
+    print(benchmark_prediction_cache(models, make_popular_requests(df, n_requests)).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
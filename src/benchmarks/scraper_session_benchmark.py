@@ -0,0 +1,134 @@
+# Throughput of the detail calls of the scraper against a local mock of the CarDekho API: a new httpx.AsyncClient per call
+# against the pooled CarDekhoSession. The mock server can delay every new connection like the TCP and TLS handshakes do,
+# and every response like the network and the API do.
+# Run from the repository root:
+# python -m src.benchmarks.scraper_session_benchmark [n_requests] [connect_delay_ms] [response_delay_ms]
+from __future__ import annotations
+
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+
+import httpx
+import pandas as pd
+
+from src.scrapper.cardekho_api import CarDekhoSession
+
+CAR_DETAILS = {
+    'data': {
+        'dataLayer': {'oem': 'Maruti', 'model': 'Swift', 'km': '45,000 Kms'},
+        'carFeatures': {'top': [{'value': 'Power Steering'}], 'data': []},
+        'carSpecification': {'data': [{'list': [{'key': 'Engine', 'value': '1197 CC'}]}]},
+    }
+}
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, connections, connect_delay_ms: float, response_delay_ms: float):
+    # Answer every GET of the connection with the same details, and keep it open like the real API
+    with connections.get_lock():
+        connections.value += 1
+    await asyncio.sleep(connect_delay_ms / 1000)
+    payload = json.dumps(CAR_DETAILS).encode()
+    response = (
+        b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: '
+        + str(len(payload)).encode() + b'\r\n\r\n' + payload
+    )
+    try:
+        while await reader.readuntil(b'\r\n\r\n'):
+            await asyncio.sleep(response_delay_ms / 1000)
+            writer.write(response)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    writer.close()
+
+
+def _serve_mock(ports: multiprocessing.Queue, connections, connect_delay_ms: float, response_delay_ms: float) -> None:
+    async def serve():
+        server = await asyncio.start_server(
+            lambda reader, writer: _handle_connection(reader, writer, connections, connect_delay_ms, response_delay_ms),
+            '127.0.0.1', 0, backlog=1024,
+        )
+        ports.put(server.sockets[0].getsockname()[1])
+        await server.serve_forever()
+
+    asyncio.run(serve())
+
+
+def start_mock_server(connect_delay_ms: float = 0, response_delay_ms: float = 0) -> tuple[multiprocessing.Process, int, object]:
+    """
+    A mock of the detail API on a free port, answering after response_delay_ms and opening the connections after
+    connect_delay_ms, with the number of connections it has opened. It runs in its own process
+    so it does not compete with the client for the GIL. Stop it with terminate()
+    """
+    ports, connections = multiprocessing.Queue(), multiprocessing.Value('i', 0)
+    process = multiprocessing.Process(target=_serve_mock, args=(ports, connections, connect_delay_ms, response_delay_ms), daemon=True)
+    process.start()
+    return process, ports.get(), connections
+
+
+async def _get_with_new_client(url: str, used_car_id: str) -> dict:
+    # The calls of the scraper before the session: a new client, and so a new connection, per call
+    async with httpx.AsyncClient() as client:
+        response = await client.get(url, params={'usedcarid': used_car_id})
+        return response.json()['data']
+
+
+async def _run_requests(get: callable, n_requests: int, step_size: int) -> None:
+    # In steps of concurrent calls, like src/scrapper/save_car_details.py
+    for i in range(0, n_requests, step_size):
+        await asyncio.gather(*[get(str(j)) for j in range(i, min(i + step_size, n_requests))])
+
+
+def benchmark_scraper_session(
+        n_requests: int = 1000,
+        connect_delay_ms: float = 30,
+        response_delay_ms: float = 50,
+        step_size: int = 200,
+) -> pd.DataFrame:
+    """
+    Time n_requests detail calls with a new client per call and with the pooled session
+    """
+    server, port, connections = start_mock_server(connect_delay_ms, response_delay_ms)
+    url = f'http://127.0.0.1:{port}/v2/vdp/detail'
+
+    async def run_session():
+        async with CarDekhoSession() as session:
+            await _run_requests(lambda used_car_id: session.get_car_details(used_car_id, url=url), n_requests, step_size)
+
+    modes = {
+        'client_per_call': lambda: _run_requests(lambda used_car_id: _get_with_new_client(url, used_car_id), n_requests, step_size),
+        'pooled_session': run_session,
+    }
+    results = []
+    for mode, run in modes.items():
+        connections.value = 0
+        start = time.perf_counter()
+        asyncio.run(run())
+        seconds = time.perf_counter() - start
+        results.append({
+            'mode': mode,
+            'requests': n_requests,
+            'seconds': seconds,
+            'requests_per_second': n_requests / seconds,
+            'connections_opened': connections.value,
+        })
+    server.terminate()
+    return pd.DataFrame(results)
+
+
+def main():
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    connect_delay_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 30
+    response_delay_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    print(
+        f'Benchmarking {n_requests} detail calls, with {connect_delay_ms} ms per new connection '
+        f'and {response_delay_ms} ms per response...'
+    )
+    print(benchmark_scraper_session(n_requests, connect_delay_ms, response_delay_ms).to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,148 @@ from __future__ import annotations
 
 import datetime
 import os
+from concurrent.futures import ProcessPoolExecutor
 
+import numpy as np
 import pandas as pd  # data processing, CSV file I/O
 
-from src.utils.constants import INDEX, TARGET, CLEAN_DIR_PATH, CLEAN_FILE_BEGIN, RAW_DIR_PATH, RAW_FILE_BEGIN
+from src.utils.constants import INDEX, TARGET, CLEAN_DIR_PATH, CLEAN_FILE_BEGIN, RAW_DIR_PATH, RAW_FILE_BEGIN, STORAGE_FORMAT
 from src.utils.data_loader import DataLoader
+from src.utils.storage import get_storage
+from src.utils.shared_frames import frame_from_shared_memory, frame_to_shared_memory
 from src.utils.utils import Utility as cutil
+from src.data.normalization import CategoricalNormalizer
+
+
+COLUMNS_TO_KEEP = [
+    "loc",
+    "myear",
+    "bt",
+    "tt",
+    "ft",
+    "km",
+    "ip",
+    "images",
+    "imgCount",
+    "threesixty",
+    "dvn",
+    "oem",
+    "model",
+    "variantName",
+    "city_x",
+    "pu",
+    "discountValue",
+    "utype",
+    "carType",
+    "top_features",
+    "comfort_features",
+    "interior_features",
+    "exterior_features",
+    "safety_features",
+    "Color",
+    "Engine Type",
+    "Displacement",
+    "mileage_new",
+    "Max Power",
+    "Max Torque",
+    "No of Cylinder",
+    "Values per Cylinder",
+    "Value Configuration",
+    "BoreX Stroke",
+    "Turbo Charger",
+    "Super Charger",
+    "Length",
+    "Width",
+    "Height",
+    "Wheel Base",
+    "Front Tread",
+    "Rear Tread",
+    "Kerb Weight",
+    "Gross Weight",
+    "Gear Box",
+    "Drive Type",
+    "Seating Capacity",
+    "Steering Type",
+    "Turning Radius",
+    "Front Brake Type",
+    "Rear Brake Type",
+    "Top Speed",
+    "Acceleration",
+    "Tyre Type",
+    "No Door Numbers",
+    "Cargo Volumn",
+    "model_type_new",
+    "state",
+    "owner_type",
+    "exterior_color",
+    "Fuel Suppy System",
+    "Compression Ratio",
+    "Alloy Wheel Size",
+    "Ground Clearance Unladen",
+]
+
+COLUMNS_STR_TO_LOWER = [
+    'loc',
+    'bt',
+    'ft',
+    'tt',
+    'images',
+    'dvn',
+    'oem',
+    'model',
+    'variantName',
+    'city_x',
+    'utype',
+    'carType',
+    'top_features',
+    'comfort_features',
+    'interior_features',
+    'exterior_features',
+    'safety_features',
+    'Color',
+    'Engine Type',
+    "mileage_new",  # 25.4 kmpl -> 25.4
+    'Max Power',  # Max Power : 33.54bhp@4000 rpm -> 2 columns 33.54, 4000
+    'Max Torque',  # Max Torque : 40.2Nm@3500 rpm -> 2 columns 40.2, 3500
+    # No of Cylinder : float -> int,
+    # Values per Cylinder : float -> int, !! Fix the name -> Valve per Cylinder
+    'Value Configuration',  # !! Fix the name -> Valve Configuration
+    'BoreX Stroke',  # BoreX Stroke : 69 x 72 mm -> Bore: 69, Stroke: 72
+    'Turbo Charger',  # Convert to boolean
+    'Super Charger',  # Convert to boolean
+    'Length',  # Length : 3599mm -> 3599
+    'Width',  # Width : 1495mm -> 1495
+    'Height',  # Height : 1700mm -> 1700
+    'Wheel Base',  # Wheel Base : 2400mm -> 2400
+    'Front Tread',  # Front Tread : 1295mm -> 1295
+    'Rear Tread',  # Rear Tread : 1295mm -> 1295
+    'Kerb Weight',  # Kerb Weight : 960kg -> 960
+    'Gross Weight',  # Gross Weight : 1350kg -> 1350
+    'Gear Box',  # might need some additional cleaning
+    'Drive Type',  # might need some additional cleaning
+    # Seating Capacity : float -> int
+    'Steering Type',  # might need some additional cleaning
+    'Turning Radius',  # Turning Radius : 4.6 metres -> 4.6
+    'Front Brake Type',  # might need some additional cleaning
+    'Rear Brake Type',  # might need some additional cleaning
+    'Top Speed',  # Top Speed : 137 kmph -> 137
+    'Acceleration',  # Acceleration : 13.5 seconds -> 13.5
+    'Tyre Type',  # might need some additional cleaning
+    # No Door Numbers : float -> int !! fix name
+    'Cargo Volumn',  # 'Cargo Volumn' : 300 litres -> 300, !! fix name
+    'model_type_new',  # !! fix name
+    'state',
+    'exterior_color',
+    'owner_type',  # might need some additional cleaning
+    'Fuel Suppy System',  # might need some additional cleaning
+    # Compression Ratio : 10.0:1 -> 10.0
+    'Alloy Wheel Size',  # Alloy Wheel Size : convert to float
+    'Ground Clearance Unladen',  # Ground Clearance Unladen : 170mm -> 170
+]
+
+# The raw columns which the cleaning steps parse as text. The chunks of a raw file are read with them as text, so a chunk
+# where one of them only has numbers and NaNs (e.g. a Height of 1485, read as 1485.0) is parsed like the whole file
+RAW_TEXT_COLUMNS = COLUMNS_STR_TO_LOWER + ['pu', 'km', 'Compression Ratio']
 
 
 class Cleaning:
@@ -15,7 +151,8 @@ class Cleaning:
             self,
             filepath: str,
             df: pd.DataFrame = None,
-            index: str | None = None
+            index: str | None = None,
+            normalizer: CategoricalNormalizer = None,
     ):
         assert filepath is not None or df is not None, "Either filepath or df must be provided"
         assert filepath is None or isinstance(filepath, str), "filepath must be a string"
@@ -26,6 +163,8 @@ class Cleaning:
             df = pd.read_csv(filepath, index_col=index)
         self.df = df
         self.index = index
+        # A normalizer can be shared with the other chunks of the same file, to report their unmapped values together
+        self.normalizer = normalizer if normalizer is not None else CategoricalNormalizer()
         return
     
     def drop_columns(self, columns: list[str]):
@@ -40,8 +179,18 @@ class Cleaning:
         self.df.drop(rows, inplace=True)
         return
     
-    def drop_duplicates(self):
-        self.df.drop_duplicates(inplace=True)
+    def drop_duplicates(self, seen_row_hashes: set | None = None):
+        if seen_row_hashes is None:
+            self.df.drop_duplicates(inplace=True)
+            return
+        
+        # Hash the rows instead of comparing them, so the rows of the previous chunks don't have to be kept.
+        # Numbers are hashed as floats since the same column can be read as int in one chunk and float in another
+        hashed = self.df.apply(lambda col: col.astype(float) if pd.api.types.is_numeric_dtype(col) else col)
+        row_hashes = pd.util.hash_pandas_object(hashed, index=False)
+        duplicated = row_hashes.duplicated() | row_hashes.isin(seen_row_hashes)
+        seen_row_hashes.update(row_hashes[~duplicated])
+        self.df.drop(self.df.index[duplicated.values], inplace=True)
         return
     
     def str_columns_to_lower(self, columns: list[str]):
@@ -50,472 +199,61 @@ class Cleaning:
         return
     
     def handle_value_configuration(self):
-        # Replace all the variants of `dohc` to simply `dohc`
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            'dohc with vis', 'dohc')
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            'dohc with vgt', 'dohc')
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            '16-valve dohc layout', 'dohc')
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            'dohc with tis', 'dohc')
-        
-        # Replace `undefined`, `mpfi`, `vtec` with `NaN`
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            'undefined', 'nan')
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            'mpfi', 'nan')
-        self.df['Value Configuration'] = self.df['Value Configuration'].str.replace(
-            'vtec', 'nan')
+        self.normalizer.apply(self.df, 'value_configuration')
         return
     
     def handle_gear_box(self):
-        gear_box_mapping = {}
-        gear_box_mapping['1 speed'] = [
-            'single speed',
-            'single speed automatic',
-            'single speed reduction gear',
-            'single-speed transmission',
-        ]
-        gear_box_mapping['4 speed'] = [
-            '4 speed',
-            '4-speed',
-        ]
-        gear_box_mapping['5 speed'] = [
-            '5',
-            '5 - speed',
-            '5 gears',
-            '5 manual',
-            '5 speed',
-            '5 speed at+ paddle shifters',
-            '5 speed cvt',
-            '5 speed forward, 1 reverse',
-            '5 speed manual',
-            '5 speed manual transmission',
-            '5 speed+1(r)',
-            '5 speed,5 forward, 1 reverse',
-            '5-speed',
-            '5-speed`',
-            'five speed',
-            'five speed manual',
-            'five speed manual transmission',
-            'five speed manual transmission gearbox',
-        ]
-        gear_box_mapping['6 speed'] = [
-            '6',
-            '6 speed',
-            '6 speed at',
-            '6 speed automatic',
-            '6 speed geartronic',
-            '6 speed imt',
-            '6 speed ivt',
-            '6 speed mt',
-            '6 speed with sequential shift',
-            '6-speed',
-            '6-speed at',
-            '6-speed automatic',
-            '6-speed autoshift',
-            '6-speed cvt',
-            '6-speed dct',
-            '6-speed imt',
-            '6-speed ivt',
-            '6-speed`',
-            'six speed  gearbox',
-            'six speed automatic gearbox',
-            'six speed automatic transmission',
-            'six speed geartronic, six speed automati',
-            'six speed manual',
-            'six speed manual transmission',
-            'six speed manual with paddle shifter',
-        ]
-        gear_box_mapping['7 speed'] = [
-            '7 speed',
-            '7 speed 7g-dct',
-            '7 speed 9g-tronic automatic',
-            '7 speed cvt',
-            '7 speed dct',
-            '7 speed dsg',
-            '7 speed dual clutch transmission',
-            '7 speed s tronic',
-            '7-speed',
-            '7-speed dct',
-            '7-speed dsg',
-            '7-speed pdk',
-            '7-speed s tronic',
-            '7-speed s-tronic',
-            '7-speed steptronic',
-            '7-speed stronic',
-            '7g dct 7-speed dual clutch transmission',
-            '7g-dct',
-            '7g-tronic automatic transmission',
-            'amg 7-speed dct',
-            'mercedes benz 7 speed automatic',
-        ]
-        gear_box_mapping['8 speed'] = [
-            '8',
-            '8 speed',
-            '8 speed cvt',
-            '8 speed multitronic',
-            '8 speed sport',
-            '8 speed tip tronic s',
-            '8 speed tiptronic',
-            '8-speed',
-            '8-speed automatic',
-            '8-speed automatic transmission',
-            '8-speed dct',
-            '8-speed steptronic',
-            '8-speed steptronic sport automatic transmission',
-            '8-speed tiptronic',
-            '8speed',
-            'amg speedshift dct 8g',
-        ]
-        gear_box_mapping['9 speed'] = [
-            '9 -speed',
-            '9 speed',
-            '9 speed tronic',
-            '9-speed',
-            '9-speed automatic',
-            '9g tronic',
-            '9g-tronic',
-            '9g-tronic automatic',
-            'amg speedshift 9g tct automatic',
-        ]
-        gear_box_mapping['10 speed'] = [
-            '10 speed',
-        ]
-        gear_box_mapping['cvt'] = [
-            'cvt',
-            'e-cvt',
-            'ecvt',
-        ]
-        gear_box_mapping['direct drive'] = [
-            'direct drive',
-        ]
-        gear_box_mapping['fully automatic'] = [
-            'automatic transmission',
-            'fully automatic',
-        ]
-        gear_box_mapping['nan'] = [
-            'nan',
-            'ags',
-            'imt',
-            'ivt',
-        ]
-        
-        mapping_dict = {v: k for k, lst in gear_box_mapping.items()
-                        for v in lst}
-        self.df['Gear Box'] = self.df['Gear Box'].replace(mapping_dict)
+        self.normalizer.apply(self.df, 'gear_box')
         return
     
     def handle_drive_type(self):
-        drive_type_mapping = {}
-        drive_type_mapping['fwd'] = ['fwd', 'front wheel drive']
-        drive_type_mapping['2wd'] = [
-            '2wd', 'two wheel drive', '2 wd', 'two whhel drive']
-        drive_type_mapping['rwd'] = [
-            'rwd', 'rear wheel drive with esp', 'rear-wheel drive with esp', 'rwd(with mtt)']
-        drive_type_mapping['awd'] = ['awd', 'all wheel drive',
-                                     'all-wheel drive with electronic traction', 'permanent all-wheel drive quattro']
-        drive_type_mapping['4wd'] = ['4wd', '4 wd', '4x4', 'four whell drive']
-        drive_type_mapping['nan'] = ['nan', '3']
-        
-        mapping_dict = {v: k for k, lst in drive_type_mapping.items()
-                        for v in lst}
-        self.df['Drive Type'] = self.df['Drive Type'].replace(mapping_dict)
+        self.normalizer.apply(self.df, 'drive_type')
         return
     
     def handle_steering_type(self):
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'electrical', 'power')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'electric', 'power')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'electronic', 'power')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'epas', 'power')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'mt', 'power')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'motor', 'power')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'hydraulic', 'manual')
-        self.df['Steering Type'] = self.df['Steering Type'].str.replace(
-            'hydraulic', 'manual')
+        self.normalizer.apply(self.df, 'steering_type')
         return
     
     def handle_brake_type(self):
-        brake_type_mapping = {}
-        brake_type_mapping['disc'] = [
-            'disc',
-            '260mm discs',
-            'disc brakes',
-            'disc, 236 mm',
-            'discs',
-            'disk',
-            'multilateral disc',
-            'solid disc',
-            'electric parking brake',
-            'abs',
-        ]
-        brake_type_mapping['ventilated disc'] = [
-            '264mm ventilated discs',
-            'booster assisted ventilated disc',
-            'caliper ventilated disc',
-            'disc brakes with inner cooling',
-            'disc,internally ventilated',
-            'vantilated disc',
-            'ventilated & grooved steel discs',
-            'ventilated disc',
-            'ventilated disc with twin pot caliper',
-            'ventilated discs',
-            'ventilated disk',
-            'ventillated disc',
-            'ventillated discs',
-            'ventlated disc',
-            'ventilated drum in discs',
-            'ventialte disc',
-            'ventialted disc',
-        ]
-        brake_type_mapping['carbon ceramic'] = [
-            'carbon ceramic brakes',
-            'carbon ceramic brakes.',
-        ]
-        brake_type_mapping['disc & drum'] = [
-            'disc & drum',
-            '228.6 mm dia, drums on rear wheels',
-            '262mm disc & drum combination',
-            'drum in disc',
-            'drum in discs',
-        ]
-        brake_type_mapping['drum'] = [
-            'drum',
-            '203mm drums',
-            'drum`',
-            'drums',
-            'drums 180 mm',
-            'booster assisted drum',
-            'drum brakes',
-            'leading & trailing drum',
-            'leading-trailing drum',
-            'self adjusting drum',
-            'self adjusting drums',
-            'self-adjusting drum',
-            'single piston sliding fist',
-            'ventilated drum',
-            'tandem master cylinder with servo assist',
-        
-        ]
-        brake_type_mapping['caliper'] = [
-            'six piston claipers',
-            'twin piston sliding fist caliper',
-            'vacuum assisted hydraulic dual circuit w',
-            'four piston calipers',
-            'disc & caliper type',
-        ]
-        
-        mapping_dict = {v: k for k, lst in brake_type_mapping.items()
-                        for v in lst}
-        self.df['Front Brake Type'] = self.df['Front Brake Type'].replace(
-            mapping_dict)
-        self.df['Rear Brake Type'] = self.df['Rear Brake Type'].replace(
-            mapping_dict)
+        self.normalizer.apply(self.df, 'brake_type')
         return
     
     def handle_tyre_type(self):
-        tyre_type_mapping = {}
-        tyre_type_mapping['tubeless'] = [
-            'tubeless tyres',
-            'tubeless',
-            'tubeless tyres mud terrain',
-            'tubeless tyre',
-        ]
-        tyre_type_mapping['tubeless radial'] = [
-            'tubeless, radial',
-            'tubeless,radial',
-            'tubeless tyres, radial',
-            'tubeless radial tyres',
-            'radial, tubeless',
-            'radial',
-            'tubless, radial',
-            'radial tubeless',
-            'tubeless radial',
-            'tubeless,radials',
-            'tubeless radials',
-            'radial,tubeless',
-            'tubeless radial tyre',
-            'radial, tubless',
-            'tubless radial tyrees',
-            'tubeless , radial',
-            'tubeless, radials',
-            'radial tyres',
-        ]
-        tyre_type_mapping['runflat'] = [
-            'runflat tyres',
-            'runflat',
-            'tubeless,runflat',
-            'run-flat',
-            'runflat tyre',
-            'tubeless, runflat',
-            'tubeless. runflat',
-            'tubeless.runflat',
-            'tubeless radial tyrees',
-        ]
-        tyre_type_mapping['tube'] = [
-            'radial with tube',
-        ]
-        
-        mapping_dict = {v: k for k, lst in tyre_type_mapping.items()
-                        for v in lst}
-        self.df['Tyre Type'] = self.df['Tyre Type'].replace(mapping_dict)
+        self.normalizer.apply(self.df, 'tyre_type')
         return
     
     def handle_fuel_injection(self):
-        fuel_injection_mapping = {
-            "Gasoline Port Injection": [
-                "intelligent-gas port injection",
-                "i-gpi",
-                "dohc",
-                "pfi"
-            ],
-            "Multi-Point Fuel Injection": [
-                "mpfi",
-                "multi-point injection",
-                "mpfi+lpg",
-                "mpfi+cng",
-                "multipoint injection",
-                "smpi",
-                "mpi",
-                "multi point fuel injection",
-                "dpfi",
-                "mfi",
-                "multi point injection",
-                "msds",
-                "cng"
-            ],
-            "Electronic Fuel Injection": [
-                "efi(electronic fuel injection)",
-                "efi",
-                "efi (electronic fuel injection)",
-                "efic",
-                "electronic fuel injection",
-                "electronically controlled injection",
-                "electronic injection system",
-                "sefi",
-                "egis",
-                "efi (electronic fuel injection",
-                "efi",
-                "efi -electronic fuel injection",
-            ],
-            "Direct Injection": [
-                "direct injection",
-                "direct injectio",
-                "direct fuel injection",
-                "direct engine",
-            ],
-            "Common Rail Injection": [
-                "crdi",
-                "common rail",
-                "common rail injection",
-                "common rail direct injection",
-                "common rail direct injection (dci)",
-                "common-rail type",
-                "advanced common rail",
-                "common rail system",
-                "common rail diesel",
-                "pgm-fi (programmed fuel injection)",
-                "pgm-fi (programmed fuel inje",
-                "pgm - fi",
-                "pgm-fi",
-                "pgm-fi (programmed fuel inject",
-                "direct injection common rail",
-                "cdi"
-            ],
-            "Distributor-Type Fuel Injection": [
-                "dedst",
-                "distribution type fuel injection",
-                "distributor-type diesel fuel injection",
-            ],
-            "Indirect Injection": [
-                "indirect injection",
-                "idi"
-            ],
-            "Gasoline Direct Injection": [
-                "gdi",
-                "gasoline direct injection",
-                "tfsi",
-                "tsi",
-                "tgdi"
-            ],
-            "Turbo Intercooled Diesel": [
-                "tcdi",
-                "turbo intercooled diesel",
-                "tdci"
-            ],
-            "Intake Port Injection": [
-                "intake port(multi-point)"
-            ],
-            "Diesel Direct Injection": [
-                "ddi",
-                "ddis"
-            ],
-            "Variable Valve Timing Injection": [
-                "dual vvt-i",
-                "vvt-ie",
-                "ti-vct"
-            ],
-            "Three-Phase AC Induction Motors": [
-                "3 phase ac induction motors"
-            ],
-            "Electric": [
-                "electric",
-                "isg"
-            ],
-        }
-        
-        mapping_dict = {v: k for k, lst in fuel_injection_mapping.items()
-                        for v in lst}
-        self.df['Fuel Suppy System'] = self.df['Fuel Suppy System'].replace(
-            mapping_dict)
+        self.normalizer.apply(self.df, 'fuel_injection')
         return
     
     def handle_pu(self):
         self.df['pu'] = self.df['pu'].str.replace(',', '').astype(float)
     
     def handle_max_power(self):
-        self.df['Max Power Delivered'] = self.df['Max Power'].str.split(
-            '@').str[0].apply(cutil.get_begin_float).astype(float)
-        self.df['Max Power At'] = self.df['Max Power'].str.split(
-            '@').str[1].apply(cutil.get_begin_float).astype(float)
+        self.df['Max Power Delivered'] = cutil.get_begin_float_series(
+            self.df['Max Power'].str.split('@').str[0]).astype(float)
+        self.df['Max Power At'] = cutil.get_begin_float_series(
+            self.df['Max Power'].str.split('@').str[1]).astype(float)
         self.df.drop(columns=['Max Power'], inplace=True, axis=1)
         return
     
     def handle_max_torque(self):
-        def get_rpm_average(x):
-            x = str(x)
-            if '-' in x:
-                p1 = cutil.get_begin_float(x.split('-')[0])
-                p2 = cutil.get_begin_float(x.split('-')[1])
-                if p1 is None:
-                    return p2
-                if p2 is None:
-                    return p1
-                
-                return (p1 + p2) / 2
-            else:
-                return cutil.get_begin_float(x)
+        # The rpm is either a single value or a range like 1500-2500, in which case we take the average
+        rpm_range = self.df['Max Torque'].str.split('@').str[1].astype(str).str.split('-')
+        rpm_low = cutil.get_begin_float_series(rpm_range.str[0])
+        rpm_high = cutil.get_begin_float_series(rpm_range.str[1])
         
-        self.df['Max Torque Delivered'] = self.df['Max Torque'].str.split(
-            '@').str[0].apply(cutil.get_begin_float).astype(float)
-        self.df['Max Torque At'] = self.df['Max Torque'].str.split(
-            '@').str[1].apply(get_rpm_average).astype(float)
+        self.df['Max Torque Delivered'] = cutil.get_begin_float_series(
+            self.df['Max Torque'].str.split('@').str[0]).astype(float)
+        self.df['Max Torque At'] = ((rpm_low + rpm_high) / 2).fillna(rpm_low).fillna(rpm_high)
         self.df.drop(columns=['Max Torque'], inplace=True, axis=1)
         return
     
     def handle_borex_stroke(self):
-        self.df['Bore'] = self.df['BoreX Stroke'].str.split(
-            'x').str[0].apply(cutil.get_begin_float).astype(float)
-        self.df['Stroke'] = self.df['BoreX Stroke'].str.split(
-            'x').str[1].apply(cutil.get_begin_float).astype(float)
+        self.df['Bore'] = cutil.get_begin_float_series(
+            self.df['BoreX Stroke'].str.split('x').str[0]).astype(float)
+        self.df['Stroke'] = cutil.get_begin_float_series(
+            self.df['BoreX Stroke'].str.split('x').str[1]).astype(float)
         self.df.drop(columns=['BoreX Stroke'], inplace=True, axis=1)
         return
     
@@ -534,83 +272,83 @@ class Cleaning:
         return
     
     def handle_length(self):
-        self.df['Length'] = self.df['Length'].apply(
-            cutil.get_begin_number).astype(float)
+        self.df['Length'] = cutil.get_begin_number_series(
+            self.df['Length']).astype(float)
         return
     
     def handle_width(self):
-        self.df['Width'] = self.df['Width'].apply(
-            cutil.get_begin_number).astype(float)
+        self.df['Width'] = cutil.get_begin_number_series(
+            self.df['Width']).astype(float)
         return
     
     def handle_height(self):
-        self.df['Height'] = self.df['Height'].apply(
-            cutil.get_begin_number).astype(float)
+        self.df['Height'] = cutil.get_begin_number_series(
+            self.df['Height']).astype(float)
         return
     
     def handle_wheel_base(self):
-        self.df['Wheel Base'] = self.df['Wheel Base'].apply(
-            cutil.get_begin_number).astype(float)
+        self.df['Wheel Base'] = cutil.get_begin_number_series(
+            self.df['Wheel Base']).astype(float)
         return
     
     def handle_front_tread(self):
-        self.df['Front Tread'] = self.df['Front Tread'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Front Tread'] = cutil.get_begin_float_series(
+            self.df['Front Tread']).astype(float)
         return
     
     def handle_rear_tread(self):
-        self.df['Rear Tread'] = self.df['Rear Tread'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Rear Tread'] = cutil.get_begin_float_series(
+            self.df['Rear Tread']).astype(float)
         return
     
     def handle_kerb_weight(self):
-        self.df['Kerb Weight'] = self.df['Kerb Weight'].apply(
-            cutil.get_begin_number).astype(float)
+        self.df['Kerb Weight'] = cutil.get_begin_number_series(
+            self.df['Kerb Weight']).astype(float)
         return
     
     def handle_gross_weight(self):
-        self.df['Gross Weight'] = self.df['Gross Weight'].apply(
-            cutil.get_begin_number).astype(float)
+        self.df['Gross Weight'] = cutil.get_begin_number_series(
+            self.df['Gross Weight']).astype(float)
         return
     
     def handle_turning_radius(self):
-        self.df['Turning Radius'] = self.df['Turning Radius'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Turning Radius'] = cutil.get_begin_float_series(
+            self.df['Turning Radius']).astype(float)
         return
     
     def handle_top_speed(self):
-        self.df['Top Speed'] = self.df['Top Speed'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Top Speed'] = cutil.get_begin_float_series(
+            self.df['Top Speed']).astype(float)
         return
     
     def handle_acceleration(self):
-        self.df['Acceleration'] = self.df['Acceleration'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Acceleration'] = cutil.get_begin_float_series(
+            self.df['Acceleration']).astype(float)
         return
     
     def handle_cargo_volumn(self):
-        self.df['Cargo Volumn'] = self.df['Cargo Volumn'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Cargo Volumn'] = cutil.get_begin_float_series(
+            self.df['Cargo Volumn']).astype(float)
         return
     
     def handle_ground_clearance_unladen(self):
-        self.df['Ground Clearance Unladen'] = self.df['Ground Clearance Unladen'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Ground Clearance Unladen'] = cutil.get_begin_float_series(
+            self.df['Ground Clearance Unladen']).astype(float)
         return
     
     def handle_compression_ratio(self):
-        self.df['Compression Ratio'] = self.df['Compression Ratio'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Compression Ratio'] = cutil.get_begin_float_series(
+            self.df['Compression Ratio']).astype(float)
         return
     
     def handle_alloy_wheel_size(self):
-        self.df['Alloy Wheel Size'] = self.df['Alloy Wheel Size'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['Alloy Wheel Size'] = cutil.get_begin_float_series(
+            self.df['Alloy Wheel Size']).astype(float)
         return
     
     def handle_km(self):
-        self.df['km'] = self.df['km'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['km'] = cutil.get_begin_float_series(
+            self.df['km']).astype(float)
         
         # Convert to integer
         self.df['km'] = self.df['km'].astype(int)
@@ -620,8 +358,8 @@ class Cleaning:
         """
         Convert mileage_new to float
         """
-        self.df['mileage_new'] = self.df['mileage_new'].apply(
-            cutil.get_begin_float).astype(float)
+        self.df['mileage_new'] = cutil.get_begin_float_series(
+            self.df['mileage_new']).astype(float)
         return
     
     def rename_columns(self, renames: dict = None):
@@ -644,6 +382,12 @@ class Cleaning:
         self.df.rename(columns=renames, inplace=True)
         return
     
+    def get_unmapped_values(self) -> pd.DataFrame:
+        """
+        Get the categorical values which none of the normalization rules recognised
+        """
+        return self.normalizer.unmapped_report()
+    
     def get_data(self) -> pd.DataFrame:
         """
         Get the dataframe
@@ -651,7 +395,8 @@ class Cleaning:
         return self.df
     
     def save_data(self, file_path) -> bool:
-        self.df.to_csv(file_path, index=True)
+        # The format is picked from the file extension
+        get_storage(file_path=file_path).save(self.df, file_path)
         return True
 
 
@@ -660,155 +405,69 @@ def run_cleaning_process(
         df: pd.DataFrame = None,
         index: str = None,
         save_to_file: bool = True,
+        storage_format: str = STORAGE_FORMAT,
+        chunksize: int | None = None,
+        n_jobs: int = 1,
+        normalizer: CategoricalNormalizer = None,
 ) -> str | pd.DataFrame:
+    # The unmapped values of the cleaning are collected in normalizer, if given
     # The filepath was set as following:
     # cardekho_cars_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv
     # Get the latest file from the data folder
+    if df is None and filepath is None:
+        dl = DataLoader(dir_path=RAW_DIR_PATH)
+        filename = dl.get_latest_file(begins_with=RAW_FILE_BEGIN)
+        filepath = os.path.join(RAW_DIR_PATH, filename)
+    
+    # Stream the raw file in chunks of rows if it doesn't fit in memory
+    if chunksize is not None:
+        assert df is None, "chunksize can only be used when reading from a file"
+        assert save_to_file, "The chunked cleaning process can only save to a file"
+        return run_chunked_cleaning_process(
+            filepath, chunksize=chunksize, storage_format=storage_format, n_jobs=n_jobs, normalizer=normalizer)
+    
     if df is None:
-        if filepath is None:
-            dl = DataLoader(dir_path=RAW_DIR_PATH)
-            filename = dl.get_latest_file(begins_with=RAW_FILE_BEGIN)
-            filepath = os.path.join(RAW_DIR_PATH, filename)
-        
         df = pd.read_csv(filepath)
     index = INDEX
     
     # Create a new instance of the Cleaning class
-    cdc = Cleaning(filepath=filepath, df=df, index=index)
-    
-    columns_to_keep = [
-        "loc",
-        "myear",
-        "bt",
-        "tt",
-        "ft",
-        "km",
-        "ip",
-        "images",
-        "imgCount",
-        "threesixty",
-        "dvn",
-        "oem",
-        "model",
-        "variantName",
-        "city_x",
-        "pu",
-        "discountValue",
-        "utype",
-        "carType",
-        "top_features",
-        "comfort_features",
-        "interior_features",
-        "exterior_features",
-        "safety_features",
-        "Color",
-        "Engine Type",
-        "Displacement",
-        "mileage_new",
-        "Max Power",
-        "Max Torque",
-        "No of Cylinder",
-        "Values per Cylinder",
-        "Value Configuration",
-        "BoreX Stroke",
-        "Turbo Charger",
-        "Super Charger",
-        "Length",
-        "Width",
-        "Height",
-        "Wheel Base",
-        "Front Tread",
-        "Rear Tread",
-        "Kerb Weight",
-        "Gross Weight",
-        "Gear Box",
-        "Drive Type",
-        "Seating Capacity",
-        "Steering Type",
-        "Turning Radius",
-        "Front Brake Type",
-        "Rear Brake Type",
-        "Top Speed",
-        "Acceleration",
-        "Tyre Type",
-        "No Door Numbers",
-        "Cargo Volumn",
-        "model_type_new",
-        "state",
-        "owner_type",
-        "exterior_color",
-        "Fuel Suppy System",
-        "Compression Ratio",
-        "Alloy Wheel Size",
-        "Ground Clearance Unladen",
-    ]
+    cdc = Cleaning(filepath=filepath, df=df, index=index, normalizer=normalizer)
+    run_cleaning_steps(cdc, n_jobs=n_jobs)
+    if not save_to_file:
+        return cdc.get_data()
+    
+    save_filename = f"{CLEAN_FILE_BEGIN}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{get_storage(storage_format).extension}"
+    save_filepath = os.path.join(CLEAN_DIR_PATH, save_filename)
+    # Save the cleaned data
+    cdc.save_data(save_filepath)
     
+    return save_filepath
+
+
+def run_cleaning_steps(cdc: Cleaning, seen_row_hashes: set | None = None, n_jobs: int = 1) -> Cleaning:
+    """
+    Run all the cleaning steps in place on the data of `cdc`
+    """
     # Drop the columns that are not needed
-    cdc.drop_columns_except(columns_to_keep)
-    
-    # Drop duplicate rows
-    cdc.drop_duplicates()
-    
-    columns_str_to_lower = [
-        'loc',
-        'bt',
-        'ft',
-        'tt',
-        'images',
-        'dvn',
-        'oem',
-        'model',
-        'variantName',
-        'city_x',
-        'utype',
-        'carType',
-        'top_features',
-        'comfort_features',
-        'interior_features',
-        'exterior_features',
-        'safety_features',
-        'Color',
-        'Engine Type',
-        "mileage_new",  # 25.4 kmpl -> 25.4
-        'Max Power',  # Max Power : 33.54bhp@4000 rpm -> 2 columns 33.54, 4000
-        'Max Torque',  # Max Torque : 40.2Nm@3500 rpm -> 2 columns 40.2, 3500
-        # No of Cylinder : float -> int,
-        # Values per Cylinder : float -> int, !! Fix the name -> Valve per Cylinder
-        'Value Configuration',  # !! Fix the name -> Valve Configuration
-        'BoreX Stroke',  # BoreX Stroke : 69 x 72 mm -> Bore: 69, Stroke: 72
-        'Turbo Charger',  # Convert to boolean
-        'Super Charger',  # Convert to boolean
-        'Length',  # Length : 3599mm -> 3599
-        'Width',  # Width : 1495mm -> 1495
-        'Height',  # Height : 1700mm -> 1700
-        'Wheel Base',  # Wheel Base : 2400mm -> 2400
-        'Front Tread',  # Front Tread : 1295mm -> 1295
-        'Rear Tread',  # Rear Tread : 1295mm -> 1295
-        'Kerb Weight',  # Kerb Weight : 960kg -> 960
-        'Gross Weight',  # Gross Weight : 1350kg -> 1350
-        'Gear Box',  # might need some additional cleaning
-        'Drive Type',  # might need some additional cleaning
-        # Seating Capacity : float -> int
-        'Steering Type',  # might need some additional cleaning
-        'Turning Radius',  # Turning Radius : 4.6 metres -> 4.6
-        'Front Brake Type',  # might need some additional cleaning
-        'Rear Brake Type',  # might need some additional cleaning
-        'Top Speed',  # Top Speed : 137 kmph -> 137
-        'Acceleration',  # Acceleration : 13.5 seconds -> 13.5
-        'Tyre Type',  # might need some additional cleaning
-        # No Door Numbers : float -> int !! fix name
-        'Cargo Volumn',  # 'Cargo Volumn' : 300 litres -> 300, !! fix name
-        'model_type_new',  # !! fix name
-        'state',
-        'exterior_color',
-        'owner_type',  # might need some additional cleaning
-        'Fuel Suppy System',  # might need some additional cleaning
-        # Compression Ratio : 10.0:1 -> 10.0
-        'Alloy Wheel Size',  # Alloy Wheel Size : convert to float
-        'Ground Clearance Unladen',  # Ground Clearance Unladen : 170mm -> 170
-    ]
+    cdc.drop_columns_except(COLUMNS_TO_KEEP)
+    
+    # Drop duplicate rows, including the ones already seen in the previous chunks
+    cdc.drop_duplicates(seen_row_hashes=seen_row_hashes)
+    
+    # The rest of the steps are independent for every row
+    if n_jobs > 1:
+        cdc.df = run_row_cleaning_steps_in_parallel(cdc.get_data(), n_jobs=n_jobs, normalizer=cdc.normalizer)
+    else:
+        run_row_cleaning_steps(cdc)
+    return cdc
+
+
+def run_row_cleaning_steps(cdc: Cleaning) -> Cleaning:
+    """
+    Run the cleaning steps which only look at one row at a time
+    """
     # Standardize the string columns
-    cdc.str_columns_to_lower(columns_str_to_lower)
+    cdc.str_columns_to_lower(COLUMNS_STR_TO_LOWER)
     
     # Get all the functions that start with 'handle_'
     # and call them
@@ -819,13 +478,76 @@ def run_cleaning_process(
     
     # Rename the columns
     cdc.rename_columns()
-    if not save_to_file:
-        return cdc.get_data()
-    
-    save_filename = f"{CLEAN_FILE_BEGIN}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+    return cdc
+
+
+def _clean_partition(name: str, size: int) -> tuple[tuple[str, int], dict]:
+    # Runs in the worker processes: the partition comes in and goes out through shared memory,
+    # with the unmapped values found in it
+    df = frame_from_shared_memory(name, size, unlink=True)
+    cdc = Cleaning(filepath=None, df=df, index=INDEX)
+    run_row_cleaning_steps(cdc)
+    return frame_to_shared_memory(cdc.get_data()), cdc.normalizer.unmapped
+
+
+def run_row_cleaning_steps_in_parallel(
+        df: pd.DataFrame,
+        n_jobs: int,
+        normalizer: CategoricalNormalizer = None,
+) -> pd.DataFrame:
+    """
+    Split the rows into `n_jobs` contiguous partitions and clean them in a process pool.
+    The partitions are passed to and from the workers as Arrow buffers in shared memory, not as pickled dataframes,
+    and are put back together in their original order. The unmapped values of every partition are merged into `normalizer`.
+    """
+    # The workers turn these into strings anyway, and Arrow can't hold an object column with mixed types
+    for col in COLUMNS_STR_TO_LOWER:
+        if col in df.columns and df[col].dtype == object:
+            df[col] = df[col].astype(str)
+    
+    bounds = np.linspace(0, len(df), n_jobs + 1, dtype=int)
+    partitions = [df.iloc[begin:end] for begin, end in zip(bounds[:-1], bounds[1:]) if end > begin]
+    
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        futures = [executor.submit(_clean_partition, *frame_to_shared_memory(partition)) for partition in partitions]
+        cleaned_partitions = []
+        for future in futures:
+            block, unmapped = future.result()
+            cleaned_partitions.append(frame_from_shared_memory(*block, unlink=True))
+            if normalizer is not None:
+                normalizer.merge_unmapped(unmapped)
+    
+    df = pd.concat(cleaned_partitions)
+    # Arrow gives the missing values of the object columns back as None, the serial steps leave them as NaN
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].mask(df[col].isna(), np.nan)
+    return df
+
+
+def run_chunked_cleaning_process(
+        filepath: str,
+        chunksize: int = 100_000,
+        storage_format: str = STORAGE_FORMAT,
+        n_jobs: int = 1,
+        normalizer: CategoricalNormalizer = None,
+) -> str:
+    """
+    Clean the raw file `chunksize` rows at a time and append every cleaned chunk to the output file,
+    so the memory used is bounded by the chunk size and not by the size of the raw file.
+    Duplicate rows are dropped across the chunks by keeping the hashes of all the rows seen so far.
+    The unmapped values of all the chunks are collected in `normalizer`, if given.
+    """
+    normalizer = normalizer if normalizer is not None else CategoricalNormalizer()
+    storage = get_storage(storage_format)
+    save_filename = f"{CLEAN_FILE_BEGIN}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{storage.extension}"
     save_filepath = os.path.join(CLEAN_DIR_PATH, save_filename)
-    # Save the cleaned data
-    cdc.save_data(save_filepath)
+    
+    seen_row_hashes = set()
+    with storage.open_writer(save_filepath) as writer:
+        for chunk in pd.read_csv(filepath, chunksize=chunksize, dtype={col: str for col in RAW_TEXT_COLUMNS}):
+            cdc = Cleaning(filepath=filepath, df=chunk, index=INDEX, normalizer=normalizer)
+            run_cleaning_steps(cdc, seen_row_hashes=seen_row_hashes, n_jobs=n_jobs)
+            writer.write(cdc.get_data())
     
     return save_filepath
 
@@ -0,0 +1,519 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass
+class NormalizationRule:
+    columns: list[str]  # The columns the rule is applied to
+    mapping: dict[str, list[str]] = None  # canonical value -> list of raw spellings, replaced on an exact match
+    substring_replacements: list[tuple[str, str]] = None  # (old, new) pairs applied in order, like chained str.replace
+    canonical_values: set = field(default_factory=set)  # Values that are already clean and should not be reported
+
+    def __post_init__(self):
+        assert (self.mapping is None) != (self.substring_replacements is None), \
+            'Exactly one of mapping or substring_replacements should be provided'
+        if self.mapping is not None:
+            # Later spellings win, same as building the dict with a comprehension
+            self.lookup = {v: k for k, lst in self.mapping.items() for v in lst}
+            self.canonical_values = set(self.canonical_values) | set(self.mapping.keys())
+        else:
+            self.lookup = None
+            self.canonical_values = set(self.canonical_values) | {new for _, new in self.substring_replacements}
+
+    def map_value(self, value):
+        """
+        Map a single unique value of the column
+        """
+        if self.lookup is not None:
+            return self.lookup.get(value, value)
+
+        # Non string values become NaN, the same as the pandas str accessor
+        if not isinstance(value, str):
+            return np.nan
+        for old, new in self.substring_replacements:
+            value = value.replace(old, new)
+        return value
+
+    def is_unmapped(self, value, mapped_value) -> bool:
+        if self.lookup is not None:
+            return value not in self.lookup and value not in self.canonical_values
+        return value == mapped_value and value not in self.canonical_values
+
+
+NORMALIZATION_RULES: dict[str, 'NormalizationRule'] = {}
+
+
+class CategoricalNormalizer:
+    """
+    Applies the registered categorical normalizations done during cleaning.
+    - Every rule is compiled into a lookup once, when it is registered, and shared by all the normalizers.
+    - A column is factorized to its unique values and only the uniques are mapped, so the cost scales with the
+      cardinality of the column and not the number of rows.
+    - Values that none of the rules know about are collected in `unmapped`, with their counts, so new spellings
+      from fresh scrapes show up without scanning the column again.
+    """
+
+    def __init__(self, rules: dict[str, NormalizationRule] = None):
+        self.rules = rules if rules is not None else NORMALIZATION_RULES
+        self.unmapped: dict[str, dict] = {}
+
+    @staticmethod
+    def normalize_column(s: pd.Series, rule: NormalizationRule) -> tuple[pd.Series, dict]:
+        codes, uniques = pd.factorize(s)
+        uniques = np.asarray(uniques, dtype=object)
+        mapped = np.array([rule.map_value(value) for value in uniques] + [np.nan], dtype=object)
+
+        # NaN has the code -1, which picks the trailing NaN
+        normalized = pd.Series(mapped[codes], index=s.index, name=s.name, dtype=object)
+
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        unmapped = {
+            value: int(count) for value, mapped_value, count in zip(uniques, mapped, counts)
+            if rule.is_unmapped(value, mapped_value)
+        }
+        return normalized, unmapped
+
+    def apply(self, df: pd.DataFrame, name: str) -> pd.DataFrame:
+        """
+        Apply the rule called `name` in place to every one of its columns
+        """
+        rule = self.rules[name]
+        for col in rule.columns:
+            df[col], unmapped = self.normalize_column(df[col], rule)
+            self.merge_unmapped({col: unmapped})
+        return df
+
+    def merge_unmapped(self, unmapped: dict[str, dict]) -> None:
+        """
+        Add the counts of the unmapped values of another part of the rows, e.g. a partition cleaned by another process
+        or a previous chunk of the raw file
+        """
+        for col, values in unmapped.items():
+            col_unmapped = self.unmapped.setdefault(col, {})
+            for value, count in values.items():
+                col_unmapped[value] = col_unmapped.get(value, 0) + count
+
+    def unmapped_report(self) -> pd.DataFrame:
+        """
+        Get all the values which were not mapped by any rule, most frequent first
+        """
+        rows = [
+            {'column': col, 'value': value, 'count': count}
+            for col, values in self.unmapped.items() for value, count in values.items()
+        ]
+        report = pd.DataFrame(rows, columns=['column', 'value', 'count'])
+        return report.sort_values(['column', 'count'], ascending=[True, False], ignore_index=True)
+
+
+def register_normalization(name: str, rule: NormalizationRule) -> NormalizationRule:
+    assert name not in NORMALIZATION_RULES, f'A rule called {name} is already registered'
+    NORMALIZATION_RULES[name] = rule
+    return rule
+
+register_normalization('value_configuration', NormalizationRule(
+    columns=['Value Configuration'],
+    substring_replacements=[
+        # Replace all the variants of `dohc` to simply `dohc`
+        ('dohc with vis', 'dohc'),
+        ('dohc with vgt', 'dohc'),
+        ('16-valve dohc layout', 'dohc'),
+        ('dohc with tis', 'dohc'),
+        # Replace `undefined`, `mpfi`, `vtec` with `NaN`
+        ('undefined', 'nan'),
+        ('mpfi', 'nan'),
+        ('vtec', 'nan'),
+    ],
+    canonical_values={'sohc'},
+))
+
+register_normalization('gear_box', NormalizationRule(
+    columns=['Gear Box'],
+    mapping={
+        '1 speed': [
+            'single speed',
+            'single speed automatic',
+            'single speed reduction gear',
+            'single-speed transmission',
+        ],
+        '4 speed': [
+            '4 speed',
+            '4-speed',
+        ],
+        '5 speed': [
+            '5',
+            '5 - speed',
+            '5 gears',
+            '5 manual',
+            '5 speed',
+            '5 speed at+ paddle shifters',
+            '5 speed cvt',
+            '5 speed forward, 1 reverse',
+            '5 speed manual',
+            '5 speed manual transmission',
+            '5 speed+1(r)',
+            '5 speed,5 forward, 1 reverse',
+            '5-speed',
+            '5-speed`',
+            'five speed',
+            'five speed manual',
+            'five speed manual transmission',
+            'five speed manual transmission gearbox',
+        ],
+        '6 speed': [
+            '6',
+            '6 speed',
+            '6 speed at',
+            '6 speed automatic',
+            '6 speed geartronic',
+            '6 speed imt',
+            '6 speed ivt',
+            '6 speed mt',
+            '6 speed with sequential shift',
+            '6-speed',
+            '6-speed at',
+            '6-speed automatic',
+            '6-speed autoshift',
+            '6-speed cvt',
+            '6-speed dct',
+            '6-speed imt',
+            '6-speed ivt',
+            '6-speed`',
+            'six speed  gearbox',
+            'six speed automatic gearbox',
+            'six speed automatic transmission',
+            'six speed geartronic, six speed automati',
+            'six speed manual',
+            'six speed manual transmission',
+            'six speed manual with paddle shifter',
+        ],
+        '7 speed': [
+            '7 speed',
+            '7 speed 7g-dct',
+            '7 speed 9g-tronic automatic',
+            '7 speed cvt',
+            '7 speed dct',
+            '7 speed dsg',
+            '7 speed dual clutch transmission',
+            '7 speed s tronic',
+            '7-speed',
+            '7-speed dct',
+            '7-speed dsg',
+            '7-speed pdk',
+            '7-speed s tronic',
+            '7-speed s-tronic',
+            '7-speed steptronic',
+            '7-speed stronic',
+            '7g dct 7-speed dual clutch transmission',
+            '7g-dct',
+            '7g-tronic automatic transmission',
+            'amg 7-speed dct',
+            'mercedes benz 7 speed automatic',
+        ],
+        '8 speed': [
+            '8',
+            '8 speed',
+            '8 speed cvt',
+            '8 speed multitronic',
+            '8 speed sport',
+            '8 speed tip tronic s',
+            '8 speed tiptronic',
+            '8-speed',
+            '8-speed automatic',
+            '8-speed automatic transmission',
+            '8-speed dct',
+            '8-speed steptronic',
+            '8-speed steptronic sport automatic transmission',
+            '8-speed tiptronic',
+            '8speed',
+            'amg speedshift dct 8g',
+        ],
+        '9 speed': [
+            '9 -speed',
+            '9 speed',
+            '9 speed tronic',
+            '9-speed',
+            '9-speed automatic',
+            '9g tronic',
+            '9g-tronic',
+            '9g-tronic automatic',
+            'amg speedshift 9g tct automatic',
+        ],
+        '10 speed': [
+            '10 speed',
+        ],
+        'cvt': [
+            'cvt',
+            'e-cvt',
+            'ecvt',
+        ],
+        'direct drive': [
+            'direct drive',
+        ],
+        'fully automatic': [
+            'automatic transmission',
+            'fully automatic',
+        ],
+        'nan': [
+            'nan',
+            'ags',
+            'imt',
+            'ivt',
+        ],
+    },
+))
+
+register_normalization('drive_type', NormalizationRule(
+    columns=['Drive Type'],
+    mapping={
+        'fwd': ['fwd', 'front wheel drive'],
+        '2wd': ['2wd', 'two wheel drive', '2 wd', 'two whhel drive'],
+        'rwd': ['rwd', 'rear wheel drive with esp', 'rear-wheel drive with esp', 'rwd(with mtt)'],
+        'awd': ['awd', 'all wheel drive', 'all-wheel drive with electronic traction', 'permanent all-wheel drive quattro'],
+        '4wd': ['4wd', '4 wd', '4x4', 'four whell drive'],
+        'nan': ['nan', '3'],
+    },
+))
+
+register_normalization('steering_type', NormalizationRule(
+    columns=['Steering Type'],
+    substring_replacements=[
+        ('electrical', 'power'),
+        ('electric', 'power'),
+        ('electronic', 'power'),
+        ('epas', 'power'),
+        ('mt', 'power'),
+        ('motor', 'power'),
+        ('hydraulic', 'manual'),
+    ],
+    canonical_values={'nan'},
+))
+
+register_normalization('brake_type', NormalizationRule(
+    columns=['Front Brake Type', 'Rear Brake Type'],
+    mapping={
+        'disc': [
+            'disc',
+            '260mm discs',
+            'disc brakes',
+            'disc, 236 mm',
+            'discs',
+            'disk',
+            'multilateral disc',
+            'solid disc',
+            'electric parking brake',
+            'abs',
+        ],
+        'ventilated disc': [
+            '264mm ventilated discs',
+            'booster assisted ventilated disc',
+            'caliper ventilated disc',
+            'disc brakes with inner cooling',
+            'disc,internally ventilated',
+            'vantilated disc',
+            'ventilated & grooved steel discs',
+            'ventilated disc',
+            'ventilated disc with twin pot caliper',
+            'ventilated discs',
+            'ventilated disk',
+            'ventillated disc',
+            'ventillated discs',
+            'ventlated disc',
+            'ventilated drum in discs',
+            'ventialte disc',
+            'ventialted disc',
+        ],
+        'carbon ceramic': [
+            'carbon ceramic brakes',
+            'carbon ceramic brakes.',
+        ],
+        'disc & drum': [
+            'disc & drum',
+            '228.6 mm dia, drums on rear wheels',
+            '262mm disc & drum combination',
+            'drum in disc',
+            'drum in discs',
+        ],
+        'drum': [
+            'drum',
+            '203mm drums',
+            'drum`',
+            'drums',
+            'drums 180 mm',
+            'booster assisted drum',
+            'drum brakes',
+            'leading & trailing drum',
+            'leading-trailing drum',
+            'self adjusting drum',
+            'self adjusting drums',
+            'self-adjusting drum',
+            'single piston sliding fist',
+            'ventilated drum',
+            'tandem master cylinder with servo assist',
+        ],
+        'caliper': [
+            'six piston claipers',
+            'twin piston sliding fist caliper',
+            'vacuum assisted hydraulic dual circuit w',
+            'four piston calipers',
+            'disc & caliper type',
+        ],
+    },
+    canonical_values={'nan'},
+))
+
+register_normalization('tyre_type', NormalizationRule(
+    columns=['Tyre Type'],
+    mapping={
+        'tubeless': [
+            'tubeless tyres',
+            'tubeless',
+            'tubeless tyres mud terrain',
+            'tubeless tyre',
+        ],
+        'tubeless radial': [
+            'tubeless, radial',
+            'tubeless,radial',
+            'tubeless tyres, radial',
+            'tubeless radial tyres',
+            'radial, tubeless',
+            'radial',
+            'tubless, radial',
+            'radial tubeless',
+            'tubeless radial',
+            'tubeless,radials',
+            'tubeless radials',
+            'radial,tubeless',
+            'tubeless radial tyre',
+            'radial, tubless',
+            'tubless radial tyrees',
+            'tubeless , radial',
+            'tubeless, radials',
+            'radial tyres',
+        ],
+        'runflat': [
+            'runflat tyres',
+            'runflat',
+            'tubeless,runflat',
+            'run-flat',
+            'runflat tyre',
+            'tubeless, runflat',
+            'tubeless. runflat',
+            'tubeless.runflat',
+            'tubeless radial tyrees',
+        ],
+        'tube': [
+            'radial with tube',
+        ],
+    },
+    canonical_values={'nan'},
+))
+
+register_normalization('fuel_injection', NormalizationRule(
+    columns=['Fuel Suppy System'],
+    mapping={
+        "Gasoline Port Injection": [
+            "intelligent-gas port injection",
+            "i-gpi",
+            "dohc",
+            "pfi"
+        ],
+        "Multi-Point Fuel Injection": [
+            "mpfi",
+            "multi-point injection",
+            "mpfi+lpg",
+            "mpfi+cng",
+            "multipoint injection",
+            "smpi",
+            "mpi",
+            "multi point fuel injection",
+            "dpfi",
+            "mfi",
+            "multi point injection",
+            "msds",
+            "cng"
+        ],
+        "Electronic Fuel Injection": [
+            "efi(electronic fuel injection)",
+            "efi",
+            "efi (electronic fuel injection)",
+            "efic",
+            "electronic fuel injection",
+            "electronically controlled injection",
+            "electronic injection system",
+            "sefi",
+            "egis",
+            "efi (electronic fuel injection",
+            "efi",
+            "efi -electronic fuel injection",
+        ],
+        "Direct Injection": [
+            "direct injection",
+            "direct injectio",
+            "direct fuel injection",
+            "direct engine",
+        ],
+        "Common Rail Injection": [
+            "crdi",
+            "common rail",
+            "common rail injection",
+            "common rail direct injection",
+            "common rail direct injection (dci)",
+            "common-rail type",
+            "advanced common rail",
+            "common rail system",
+            "common rail diesel",
+            "pgm-fi (programmed fuel injection)",
+            "pgm-fi (programmed fuel inje",
+            "pgm - fi",
+            "pgm-fi",
+            "pgm-fi (programmed fuel inject",
+            "direct injection common rail",
+            "cdi"
+        ],
+        "Distributor-Type Fuel Injection": [
+            "dedst",
+            "distribution type fuel injection",
+            "distributor-type diesel fuel injection",
+        ],
+        "Indirect Injection": [
+            "indirect injection",
+            "idi"
+        ],
+        "Gasoline Direct Injection": [
+            "gdi",
+            "gasoline direct injection",
+            "tfsi",
+            "tsi",
+            "tgdi"
+        ],
+        "Turbo Intercooled Diesel": [
+            "tcdi",
+            "turbo intercooled diesel",
+            "tdci"
+        ],
+        "Intake Port Injection": [
+            "intake port(multi-point)"
+        ],
+        "Diesel Direct Injection": [
+            "ddi",
+            "ddis"
+        ],
+        "Variable Valve Timing Injection": [
+            "dual vvt-i",
+            "vvt-ie",
+            "ti-vct"
+        ],
+        "Three-Phase AC Induction Motors": [
+            "3 phase ac induction motors"
+        ],
+        "Electric": [
+            "electric",
+            "isg"
+        ],
+    },
+    canonical_values={'nan'},
+))
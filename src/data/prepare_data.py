@@ -6,14 +6,17 @@ import pandas as pd
 from sklearn.model_selection import train_test_split
 
 from src.utils.constants import *
+from src.feature_engineering.feature_matrix import load_or_build_feature_matrix
 from src.utils.data_loader import DataLoader
+from src.utils.storage import get_storage
 
 
 def prepare_data(
 		filepath: str = None,
 		train_size: float = 0.75,
 		test_size: float = 0.15,
-		validation_size: float = 0.1
+		validation_size: float = 0.1,
+		storage_format: str = STORAGE_FORMAT
 ) -> bool:
 	"""
 	Prepare the data for model training
@@ -24,7 +27,7 @@ def prepare_data(
 	assert validation_size > 0, 'Validation size should be greater than 0'
 	
 	if filepath is None:
-		dl = DataLoader(dir_path=PROCESSED_DIR_PATH)
+		dl = DataLoader(dir_path=PROCESSED_DIR_PATH, storage_format=storage_format)
 		filepath = dl.get_latest_file(begins_with=PROCESSED_FILE_BEGIN)
 		
 	if filepath is None:
@@ -36,7 +39,7 @@ def prepare_data(
 	try:
 		print(f"Reading processed file from : {filepath}")
 		print('Preparing data for model training and testing...')
-		df = pd.read_csv(filepath, index_col=INDEX)
+		df = get_storage(file_path=filepath).load(filepath, index_col=INDEX)
 		print(df.info())
 		
 		# Split the data into train, test and validation
@@ -44,9 +47,14 @@ def prepare_data(
 		train, test = train_test_split(model_data, test_size=test_size, random_state=42)
 		
 		# Save the data in the train, test and validation directories
-		train.to_csv(f"{TRAIN_DIR_PATH}{TRAIN_FILE_BEGIN}_{datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)}.csv")
-		test.to_csv(f"{TEST_DIR_PATH}{TEST_FILE_BEGIN}_{datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)}.csv")
-		validation.to_csv(f"{VALIDATION_DIR_PATH}{VALIDATION_FILE_BEGIN}_{datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)}.csv")
+		storage = get_storage(storage_format)
+		train_path = storage.save(train, f"{TRAIN_DIR_PATH}{TRAIN_FILE_BEGIN}_{datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)}{storage.extension}")
+		test_path = storage.save(test, f"{TEST_DIR_PATH}{TEST_FILE_BEGIN}_{datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)}{storage.extension}")
+		validation_path = storage.save(validation, f"{VALIDATION_DIR_PATH}{VALIDATION_FILE_BEGIN}_{datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)}{storage.extension}")
+		
+		# Parse the feature lists once and save their multi-hot matrices next to the splits
+		for split, split_path in ((train, train_path), (test, test_path), (validation, validation_path)):
+			load_or_build_feature_matrix(split, split_path, FEATURE_LIST_COLS)
 		
 		print(f"Train data shape: {train.shape}")
 		print(f"Test data shape: {test.shape}")
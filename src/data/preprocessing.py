@@ -7,7 +7,8 @@ import pandas as pd
 
 from src.utils.constants import INDEX, TARGET
 from src.utils.data_loader import DataLoader
-from src.utils.constants import CLEAN_DIR_PATH, CLEAN_FILE_BEGIN, PROCESSED_DIR_PATH, PROCESSED_FILE_BEGIN
+from src.utils.constants import CLEAN_DIR_PATH, CLEAN_FILE_BEGIN, PROCESSED_DIR_PATH, PROCESSED_FILE_BEGIN, STORAGE_FORMAT
+from src.utils.storage import get_storage
 
 
 class Transformations:
@@ -230,16 +231,17 @@ class Transformations:
 def run_transformations(
 		filepath: str = None,
 		df: pd.DataFrame = None,
-		save_to_file: bool = True
+		save_to_file: bool = True,
+		storage_format: str = STORAGE_FORMAT
 ) -> str | pd.DataFrame:
 	if df is None:
 		if filepath is None:
-			dl = DataLoader(dir_path=CLEAN_DIR_PATH)
+			dl = DataLoader(dir_path=CLEAN_DIR_PATH, storage_format=storage_format)
 			file_name = dl.get_latest_file(begins_with=CLEAN_FILE_BEGIN)
 			filepath = os.path.join(CLEAN_DIR_PATH, file_name)
 		
 		print(f"Reading file: {filepath}")
-		df = pd.read_csv(filepath, index_col=INDEX)
+		df = get_storage(file_path=filepath).load(filepath, index_col=INDEX)
 	
 	# Get all the functions from the Transformations class
 	suggested_transformations = [func for func in dir(Transformations) if callable(
@@ -254,9 +256,10 @@ def run_transformations(
 		return df
 	
 	# Save the transformed data
-	save_filename = f"{PROCESSED_FILE_BEGIN}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+	storage = get_storage(storage_format)
+	save_filename = f"{PROCESSED_FILE_BEGIN}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}{storage.extension}"
 	save_filepath = os.path.join(PROCESSED_DIR_PATH, save_filename)
-	df.to_csv(save_filepath)
+	storage.save(df, save_filepath)
 	
 	return save_filepath
 
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import os
+from ast import literal_eval
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.utils.constants import FEATURE_MATRIX_EXTENSION
+
+
+@lru_cache(maxsize=65536)
+def _parse_feature_list(feature_list: str) -> tuple:
+	# The same lists come back on every prediction call, so they are only parsed once per process
+	return tuple(literal_eval(feature_list))
+
+
+def explode_feature_lists(s: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+	"""
+	Explode a column of stringified feature lists, parsing every distinct list only once
+
+	Returns
+	-------
+		(np.ndarray, np.ndarray)
+			The position of the row of every feature, and the features themselves, in the order they appear
+	"""
+	codes, uniques = pd.factorize(s)
+	if (codes == -1).any():
+		raise ValueError(f'Column {s.name} contains missing values instead of a list of features')
+
+	parsed = [_parse_feature_list(feature_list) for feature_list in uniques]
+	lengths = np.array([len(feature_list) for feature_list in parsed], dtype=np.int64)
+	flat_features = np.array([feature for feature_list in parsed for feature in feature_list], dtype=object)
+	offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]]).astype(np.int64)
+
+	# For every feature of every row, find where it is in flat_features
+	row_lengths = lengths[codes]
+	row_index = np.repeat(np.arange(len(s)), row_lengths)
+	row_starts = np.concatenate([[0], np.cumsum(row_lengths)[:-1]]).astype(np.int64)
+	positions = np.arange(row_lengths.sum()) + np.repeat(offsets[codes] - row_starts, row_lengths)
+	return row_index, flat_features[positions]
+
+
+class FeatureMatrix:
+	"""
+	Multi-hot encoding of the columns holding stringified lists of car features (top_features, comfort_features, etc.).
+	Every column is a CSR matrix with one row per car and one column per feature of a vocabulary shared by all the columns,
+	so the lists only have to be parsed once and can be saved next to the dataset.
+
+	Parameters
+	----------
+		index: pd.Index
+			The index of the rows of the dataframe the matrix was built from
+		vocabulary: list
+			The features, in the order of the columns of the matrices
+		matrices: dict
+			The CSR matrix of every feature list column
+	"""
+
+	def __init__(self, index: pd.Index, vocabulary: list, matrices: dict[str, sparse.csr_matrix]):
+		self.index = index
+		self.vocabulary = list(vocabulary)
+		self.matrices = matrices
+
+	@property
+	def columns(self) -> list[str]:
+		return list(self.matrices.keys())
+
+	@classmethod
+	def from_frame(cls, df: pd.DataFrame, columns: list[str], vocabulary: list = None) -> 'FeatureMatrix':
+		"""
+		Build the matrices of the columns of df. If no vocabulary is given, the features are numbered in the order they are
+		first seen, otherwise the features missing from the vocabulary are left out.
+		"""
+		exploded = {col: explode_feature_lists(df[col]) for col in columns}
+
+		if vocabulary is None:
+			features = [col_features for _, col_features in exploded.values()]
+			codes, vocabulary = pd.factorize(np.concatenate(features) if features else np.array([], dtype=object))
+			vocabulary = vocabulary.tolist()
+			splits = np.cumsum([len(col_features) for col_features in features])[:-1]
+			codes = dict(zip(columns, np.split(codes, splits)))
+		else:
+			lookup = pd.Index(vocabulary)
+			codes = {col: lookup.get_indexer(col_features) for col, (_, col_features) in exploded.items()}
+
+		matrices = {}
+		for col, (row_index, _) in exploded.items():
+			col_codes = codes[col]
+			known = col_codes != -1
+			# Features listed twice in a row are summed into a count of 2, like the scores always did
+			matrices[col] = sparse.csr_matrix(
+				(np.ones(known.sum(), dtype=np.float64), (row_index[known], col_codes[known])),
+				shape=(len(df), len(vocabulary))
+			)
+		return cls(df.index, vocabulary, matrices)
+
+	def reindex(self, vocabulary: list) -> 'FeatureMatrix':
+		"""
+		Move the matrices to another vocabulary, dropping the features which are not part of it
+		"""
+		if list(vocabulary) == self.vocabulary:
+			return self
+		positions = pd.Index(vocabulary).get_indexer(self.vocabulary)
+		known = np.flatnonzero(positions != -1)
+		projection = sparse.csr_matrix(
+			(np.ones(len(known)), (known, positions[known])),
+			shape=(len(self.vocabulary), len(vocabulary))
+		)
+		return FeatureMatrix(self.index, vocabulary, {col: matrix @ projection for col, matrix in self.matrices.items()})
+
+	def take(self, index: pd.Index) -> 'FeatureMatrix':
+		"""
+		Select the rows matching index, in that order
+		"""
+		positions = self.index.get_indexer(index)
+		if (positions == -1).any():
+			raise KeyError('Some rows are not part of the feature matrix')
+		return FeatureMatrix(index, self.vocabulary, {col: matrix[positions] for col, matrix in self.matrices.items()})
+
+	@classmethod
+	def concat(cls, feature_matrices: list['FeatureMatrix'], index: pd.Index = None) -> 'FeatureMatrix':
+		"""
+		Stack the rows of feature matrices of the same columns, on the union of their vocabularies in the order the features
+		are first seen, like pd.concat of the dataframes they were built from. index replaces the stacked index if given.
+		"""
+		vocabulary = list(dict.fromkeys(feature for feature_matrix in feature_matrices for feature in feature_matrix.vocabulary))
+		columns = feature_matrices[0].columns
+		if any(feature_matrix.columns != columns for feature_matrix in feature_matrices):
+			raise ValueError('The feature matrices do not have the same columns')
+		reindexed = [feature_matrix.reindex(vocabulary) for feature_matrix in feature_matrices]
+		if index is None:
+			index = reindexed[0].index.append([feature_matrix.index for feature_matrix in reindexed[1:]])
+		matrices = {col: sparse.vstack([feature_matrix.matrices[col] for feature_matrix in reindexed], format='csr') for col in columns}
+		return cls(index, vocabulary, matrices)
+
+	def to_sparse(self, columns: list[str] = None) -> sparse.csr_matrix:
+		"""
+		The matrices of the columns side by side, to be used directly as the input of a model
+		"""
+		columns = columns or self.columns
+		return sparse.hstack([self.matrices[col] for col in columns], format='csr')
+
+	def get_feature_names_out(self, columns: list[str] = None) -> list[str]:
+		columns = columns or self.columns
+		return [f'{col}__{feature}' for col in columns for feature in self.vocabulary]
+
+	def save(self, file_path: str) -> str:
+		arrays = {
+			'index': self.index.to_numpy().astype(str) if self.index.dtype == object else self.index.to_numpy(),
+			'vocabulary': np.array(self.vocabulary, dtype=str),
+			'columns': np.array(self.columns, dtype=str),
+		}
+		for i, matrix in enumerate(self.matrices.values()):
+			arrays[f'data_{i}'] = matrix.data
+			arrays[f'indices_{i}'] = matrix.indices
+			arrays[f'indptr_{i}'] = matrix.indptr
+		np.savez_compressed(file_path, **arrays)
+		return file_path
+
+	@classmethod
+	def load(cls, file_path: str) -> 'FeatureMatrix':
+		with np.load(file_path, allow_pickle=False) as arrays:
+			index = pd.Index(arrays['index'])
+			vocabulary = arrays['vocabulary'].tolist()
+			matrices = {
+				col: sparse.csr_matrix(
+					(arrays[f'data_{i}'], arrays[f'indices_{i}'], arrays[f'indptr_{i}']),
+					shape=(len(index), len(vocabulary))
+				)
+				for i, col in enumerate(arrays['columns'].tolist())
+			}
+		return cls(index, vocabulary, matrices)
+
+
+def get_feature_matrix_path(dataset_path: str) -> str:
+	"""
+	The path of the feature matrix saved next to a dataset, e.g. train_<date>.csv -> train_<date>.features.npz
+	"""
+	return os.path.splitext(dataset_path)[0] + FEATURE_MATRIX_EXTENSION
+
+
+def load_or_build_feature_matrix(df: pd.DataFrame, dataset_path: str, columns: list[str]) -> FeatureMatrix:
+	"""
+	Load the feature matrix saved next to dataset_path, or build it from df and save it if it is missing or stale
+	"""
+	file_path = get_feature_matrix_path(dataset_path)
+	if os.path.exists(file_path) and os.path.getmtime(file_path) >= os.path.getmtime(dataset_path):
+		feature_matrix = FeatureMatrix.load(file_path)
+		if feature_matrix.columns == list(columns) and len(feature_matrix.index) == len(df) and \
+				(feature_matrix.index.astype(str) == df.index.astype(str)).all():
+			feature_matrix.index = df.index
+			return feature_matrix
+
+	feature_matrix = FeatureMatrix.from_frame(df, columns)
+	feature_matrix.save(file_path)
+	return feature_matrix
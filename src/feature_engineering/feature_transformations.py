@@ -1,11 +1,11 @@
-from ast import literal_eval
 import pandas as pd
 import numpy as np
 from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.utils.validation import check_is_fitted
 
 
-from src.utils.constants import INDEX, TARGET
+from src.feature_engineering.feature_matrix import FeatureMatrix
+from src.utils.constants import FEATURE_LIST_COLS, INDEX, TARGET
 
 
 class FeatureEngineeringTransformations(BaseEstimator, TransformerMixin):
@@ -28,52 +28,73 @@ class FeatureEngineeringTransformations(BaseEstimator, TransformerMixin):
 		self.feature_prices = None
 		self.df = None
 		if object_cols is None:
-			object_cols = [
-				'top_features',
-				'comfort_features',
-				'interior_features',
-				'exterior_features',
-				'safety_features'
-			]
+			object_cols = list(FEATURE_LIST_COLS)
 		self.object_cols = object_cols
 		self.target = target
 	
-	def _car_object_feature_dict(self) -> dict:
-		unique_feature_scores = dict()
+	def _get_feature_matrix(self, df: pd.DataFrame, feature_matrix: FeatureMatrix = None, vocabulary: list = None) -> FeatureMatrix:
+		# Use the precomputed matrix if there is one for these rows, otherwise parse the lists of df
+		if feature_matrix is None:
+			return FeatureMatrix.from_frame(df, self.object_cols, vocabulary=vocabulary)
+		if not feature_matrix.index.equals(df.index):
+			feature_matrix = feature_matrix.take(df.index)
+		return feature_matrix.reindex(vocabulary) if vocabulary is not None else feature_matrix
+	
+	def _car_object_feature_dict(self, feature_matrix: FeatureMatrix = None) -> dict:
+		feature_matrix = self._get_feature_matrix(self.df, feature_matrix)
+		
+		# Explode the matrices back to one (row, feature) pair per listed feature, column by column and row by row,
+		# a feature listed twice in a row being repeated, which is the order the prices were always summed in
+		target = self.df[self.target].to_numpy()
+		row_index, feature_codes = [], []
 		for col in self.object_cols:
-			for _, row in self.df.iterrows():
-				feature_list = literal_eval(row[col])
-				for feature in feature_list:
-					if feature in unique_feature_scores.keys():
-						unique_feature_scores[feature][1] += 1
-						unique_feature_scores[feature][0] += row[self.target]
-					else:
-						unique_feature_scores[feature] = [row[self.target], 1]
+			matrix = feature_matrix.matrices[col]
+			repeats = matrix.data.astype(np.int64)
+			row_index.append(np.repeat(np.repeat(np.arange(matrix.shape[0]), np.diff(matrix.indptr)), repeats))
+			feature_codes.append(np.repeat(matrix.indices, repeats))
+		row_index = np.concatenate(row_index)
+		feature_codes = np.concatenate(feature_codes)
 		
-		return unique_feature_scores
-	
-	def _map_object_cols_to_scores(self, x: str) -> float:
-		feature_list = literal_eval(x)
-		feature_score = 0
-		for feature in feature_list:
-			if feature in self.feature_prices.keys():
-				feature_score += self.feature_prices[feature][0] / self.feature_prices[feature][1]
-			else:
-				feature_score += 0
-		return feature_score
+		# np.add.at adds the prices one by one in order, which gives the exact same sums as a python loop
+		sums = np.zeros(len(feature_matrix.vocabulary), dtype=np.result_type(target.dtype, np.int64))
+		np.add.at(sums, feature_codes, target[row_index])
+		counts = np.bincount(feature_codes, minlength=len(feature_matrix.vocabulary))
+		
+		# A saved matrix can have features which none of the rows of X have, those are left out
+		seen = counts > 0
+		self.vocabulary_ = [feature for feature, is_seen in zip(feature_matrix.vocabulary, seen) if is_seen]
+		self.feature_scores_ = sums[seen] / counts[seen]
+		return {
+			feature: [total, count]
+			for feature, total, count in zip(self.vocabulary_, sums[seen].tolist(), counts[seen].tolist())
+		}
 	
-	def _car_object_feature_transformation(self, df) -> pd.DataFrame:
+	def _car_object_feature_transformation(self, df, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
 		if self.feature_prices is None:
 			raise Exception('Please fit the transformer first')
 		
+		# The score of a car is the sum of the mean prices of its features, the features never seen in fit count as 0
+		feature_matrix = self._get_feature_matrix(df, feature_matrix, self.vocabulary_)
 		for col in self.object_cols:
-			df[f'{col}_score'] = df[col].apply(self._map_object_cols_to_scores)
+			scores = feature_matrix.matrices[col] @ self.feature_scores_
 			df.drop(col, axis=1, inplace=True)
 			# Replace zero scores with nan
-			df[f'{col}_score'] = df[f'{col}_score'].replace(0, np.nan)
+			df[f'{col}_score'] = pd.Series(scores, index=df.index).replace(0, np.nan)
 		return df
 	
-	def fit(self, X: pd.DataFrame, y=None) -> 'FeatureEngineeringTransformations':
+	def __setstate__(self, state: dict) -> None:
+		# The pipelines pickled before the scores were vectorized only have feature_prices, and the training rows in df
+		if state.get('feature_prices') is not None and 'feature_scores_' not in state:
+			state['vocabulary_'] = list(state['feature_prices'])
+			state['feature_scores_'] = np.array([total / count for total, count in state['feature_prices'].values()], dtype=float)
+			state['df'] = None
+		self.__dict__.update(state)
+	
+	def fit(self, X: pd.DataFrame, y=None, feature_matrix: FeatureMatrix = None) -> 'FeatureEngineeringTransformations':
+		"""
+		Fit the feature scores. feature_matrix can be the FeatureMatrix of the object columns of X, saved with the dataset,
+		so the feature lists do not have to be parsed again.
+		"""
 		self.df = X.copy()
 		# Check if the target is present in the dataframe
 		if self.target not in self.df.columns:
@@ -83,13 +104,18 @@ class FeatureEngineeringTransformations(BaseEstimator, TransformerMixin):
 			else:
 				# If y is passed, add it to the dataframe
 				self.df[self.target] = y
-		self.feature_prices = self._car_object_feature_dict()
+		self.feature_prices = self._car_object_feature_dict(feature_matrix)
+		# The training rows are only needed to fit the scores, they are not kept in the fitted transformer
+		self.df = None
 		return self
 	
-	def transform(self, X: pd.DataFrame) -> pd.DataFrame:
-		check_is_fitted(self, 'feature_prices')
+	def transform(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
+		check_is_fitted(self, ['vocabulary_', 'feature_scores_'])
 		
 		# Transform the object columns to scores
 		X = X.copy()
-		X = self._car_object_feature_transformation(X)
-		return X
\ No newline at end of file
+		X = self._car_object_feature_transformation(X, feature_matrix)
+		return X
+	
+	def fit_transform(self, X: pd.DataFrame, y=None, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
+		return self.fit(X, y, feature_matrix=feature_matrix).transform(X, feature_matrix=feature_matrix)
\ No newline at end of file
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+
 from category_encoders import OneHotEncoder, TargetEncoder
 
 import numpy as np
+from src.feature_engineering.iterative_imputation import JacobiIterativeImputer
+from src.feature_engineering.neighbours import NeighbourImputer, NeighbourSearch, PartitionedSearch, get_neighbour_search
 from src.utils.constants import INDEX, ImputationStrategy, TARGET
 from src.utils.imputation_stats import KNNImputerArguments, IterativeImputerArguments, MatchingImputerArguments
 
@@ -14,6 +18,33 @@ from sklearn.impute import KNNImputer, IterativeImputer
 from sklearn.preprocessing import StandardScaler
 
 PROCESSED_DIR_PATH = '../../data/processed/'
+GROUPED_STRATEGIES = {
+	pd.Series.mean: 'mean',
+	pd.Series.median: 'median',
+	pd.Series.min: 'min',
+	pd.Series.max: 'max',
+	pd.Series.sum: 'sum',
+}
+
+
+def _transform_in_batches(transform: callable, n_rows: int, batch_size: int | None, n_jobs: int) -> np.ndarray:
+	"""
+	Call transform on consecutive batches of at most batch_size rows on a pool of n_jobs threads, and stack the results.
+	The rows are imputed independently of each other, so the result is the same as transforming all the rows at once,
+	but the imputers only hold the distances or predictions of n_jobs batches in memory.
+
+	Parameters
+	----------
+	transform : callable
+		Imputes the rows selected by the slice it is called with
+	"""
+	if batch_size is None or n_rows <= batch_size:
+		return transform(slice(0, n_rows))
+	
+	batches = [slice(start, start + batch_size) for start in range(0, n_rows, batch_size)]
+	# numpy and the distance computations release the GIL, so threads are enough and no data is copied to workers
+	with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+		return np.vstack(list(executor.map(transform, batches)))
 
 
 class CustomMatchingImputer(BaseEstimator, TransformerMixin):
@@ -22,11 +53,12 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 	- We aggregate the values in the target column by the columns specified in the match_by parameter.
 	- We then find the closest match for each value in the target column.
 	- This imputer doesn't guarantee that all values in the target column will be imputed.
+	- Several columns can be imputed at once, their values are aggregated in a single grouped pass.
 
 	Parameters
 	-------
-		target : str
-			The name of the column to impute
+		target : str | list[str]
+			The name of the column to impute, or a list of columns to impute together
 		imputer_arguments : MatchingImputer
 			The imputer_arguments to be used for imputation using KNNImputer
 	
@@ -38,18 +70,19 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 	
 	def __init__(
 			self,
-			target: str | None = None,
+			target: str | list[str] | None = None,
 			imputer_arguments: MatchingImputerArguments = MatchingImputerArguments(columns=['model', 'variant']),
 	) -> None:
 		super().__init__()
 		assert isinstance(imputer_arguments, MatchingImputerArguments) == True, \
 			'Unrecognized value for imputer_arguments, should be MatchingImputer object'
-		assert isinstance(target, str) or target is None, 'target should be a string or None'
+		assert isinstance(target, (str, list)) or target is None, 'target should be a string, a list of strings or None'
 		
 		self.target = target
 		self.imputer_arguments = imputer_arguments
 		self.match_by = imputer_arguments.columns
 		self.strategy = imputer_arguments.strategy
+		self.strategies = imputer_arguments.strategies or {}
 		self.missing_values = imputer_arguments.missing_values
 		self.add_indicator = imputer_arguments.add_indicator
 		self.copy = imputer_arguments.copy
@@ -57,7 +90,9 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 		self.match_level_array = np.array(imputer_arguments.match_level_array) or np.array(
 			[0] * self.match_level + [1] * (len(self.match_by) - self.match_level)
 		)
+		self.targets = None
 		self.car_groups = None
+		self.lookup_tables = None
 		
 		assert self.match_level >= 0, 'match_level should be greater than or equal to 0'
 		assert self.match_level < len(
@@ -92,11 +127,69 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 					self.target = y.name.__str__()
 					X[self.target] = y
 		
-		self.match_by = self.match_by or X.columns.drop(self.target)
-		self.match_by = [col for col in self.match_by if col != self.target]
-		self.car_groups = X.groupby(self.match_by)[self.target].agg(self.strategy).reset_index(drop=False)
+		self.targets = [self.target] if isinstance(self.target, str) else list(self.target)
+		self.match_by = self.match_by or X.columns.drop(self.targets)
+		self.match_by = [col for col in self.match_by if col not in self.targets]
+		self.column_strategies = {col: self._get_strategy(X, col) for col in self.targets}
+		self.car_groups = self._aggregate(X, self.match_by).reset_index(drop=False)
+		self.lookup_tables = self._build_lookup_tables()
 		return self
 	
+	def _get_strategy(self, X: pd.DataFrame, col: str) -> callable | str:
+		"""
+		The strategy of a target column: the one given in strategies, or the mode for categorical columns
+		which can't be averaged, or the default strategy
+		"""
+		if col in self.strategies:
+			return self.strategies[col]
+		if not pd.api.types.is_numeric_dtype(X[col]) and self.strategy in [pd.Series.mean, pd.Series.median, 'mean', 'median']:
+			return pd.Series.mode
+		return self.strategy
+	
+	def _aggregate(self, X: pd.DataFrame, by: list[str]) -> pd.DataFrame:
+		"""
+		Aggregate all the target columns of X grouped by the by columns, with the strategy of each column
+
+		Returns
+		-------
+		aggregated : pd.DataFrame
+			The aggregated target columns, indexed by the by columns
+		"""
+		grouped = X.groupby(by)
+		mode_cols = [col for col, strategy in self.column_strategies.items() if _is_mode(strategy)]
+		# The usual pandas functions are passed by name, so pandas uses its builtin grouped aggregations
+		other_strategies = {
+			col: GROUPED_STRATEGIES.get(strategy, strategy) if callable(strategy) else strategy
+			for col, strategy in self.column_strategies.items() if col not in mode_cols
+		}
+		
+		if other_strategies:
+			aggregated = grouped.agg(other_strategies)
+		else:
+			aggregated = pd.DataFrame(index=grouped.size().index)
+		for col in mode_cols:
+			aggregated[col] = _grouped_mode(X, by, col).reindex(aggregated.index)
+		return aggregated[self.targets]
+	
+	def _build_lookup_tables(self) -> dict[int, pd.DataFrame]:
+		"""
+		Aggregate car_groups once for every match level, keyed by the prefix of match_by of that level
+		e.g. (model,) for level 0 and (model, variant) for level 1
+
+		Returns
+		-------
+		lookup_tables : dict
+			The values to impute for every key of the prefix, for every level where match_level_array is 1
+		"""
+		lookup_tables = {}
+		for i in range(len(self.match_by)):
+			if self.match_level_array[i] != 1:
+				continue
+			table = self._aggregate(self.car_groups, self.match_by[:i + 1])
+			# Values which are missing themselves are left out, so the lookup falls back to the next level
+			lookup_tables[i] = table.where(table.notna() & ~table.isin(self.missing_values))
+		return lookup_tables
+	
 	def _get_closest_car_match(self, X: pd.DataFrame) -> pd.Series:
 		"""
 		Parameters
@@ -109,8 +202,7 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 		closest_match : pd.Series
 			The closest match for each row in the dataset
 		"""
-		# Get the closest match for the row
-		# If the value is missing, we try to find the closest match
+		# Get the closest match for every missing row
 		# This is how we find a match:
 		# First we try to match every col in the self.match_by list to the row
 		# If we find a match, we use the value of the closest match
@@ -118,17 +210,22 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 		# Repeat until we find a match or we run out of cols to match
 		# There is no guarantee that we will find a match
 		X = X.copy()
-		missing_rows = X[(X[self.target].isna()) | (X[self.target].isin(self.missing_values))]
-		for index, row in missing_rows.iterrows():
-			closest_match = np.nan
-			condition = True
-			for i, col in enumerate(self.match_by):
-				condition = condition & (self.car_groups[col] == row[col])
-				if self.match_level_array[i] == 1:
-					closest_match = self.car_groups[condition][self.target].agg(self.strategy)
-					if np.isnan(closest_match) or closest_match in self.missing_values:
-						continue
-					X.loc[index, self.target] = closest_match
+		missing = ((X[self.targets].isna()) | (X[self.targets].isin(self.missing_values))).to_numpy()
+		for i in sorted(self.lookup_tables, reverse=True):
+			missing_rows = np.flatnonzero(missing.any(axis=1))
+			if len(missing_rows) == 0:
+				break
+			prefix = self.match_by[:i + 1]
+			keys = X.iloc[missing_rows][prefix]
+			keys = pd.MultiIndex.from_frame(keys) if len(prefix) > 1 else pd.Index(keys[prefix[0]])
+			closest_match = self.lookup_tables[i].reindex(keys)
+			
+			for j, col in enumerate(self.targets):
+				values = closest_match[col].to_numpy()
+				found = missing[missing_rows, j] & pd.notna(values)
+				rows = missing_rows[found]
+				X.iloc[rows, X.columns.get_loc(col)] = values[found]
+				missing[rows, j] = False
 		
 		return X
 	
@@ -153,9 +250,10 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 		if self.copy:
 			X = X.copy()
 		
-		# Add an indicator column if needed
+		# Add the indicator columns if needed
 		if self.add_indicator:
-			X[f'{self.target}_imputed'] = X[self.target].isin(self.missing_values).astype(int)
+			indicators = X[self.targets].isin(self.missing_values).astype(int).add_suffix('_imputed')
+			X[indicators.columns.tolist()] = indicators
 		# Impute the missing values in the target column
 		# X = X.apply(self._get_closest_car_match, axis=1)
 		X = self._get_closest_car_match(X)
@@ -196,6 +294,20 @@ class CustomMatchingImputer(BaseEstimator, TransformerMixin):
 			raise ValueError(f"Target column {self.target} not found in dataframe")
 
 
+def _is_mode(strategy: callable | str) -> bool:
+	return strategy is pd.Series.mode or (isinstance(strategy, str) and strategy == 'mode')
+
+
+def _grouped_mode(X: pd.DataFrame, by: list[str], col: str) -> pd.Series:
+	"""
+	The most frequent value of col in every group, without calling pd.Series.mode on each group.
+	Like pd.Series.mode, the smallest value is kept when several values are the most frequent.
+	"""
+	counts = X.groupby(by + [col]).size().rename('count').reset_index()
+	counts = counts.sort_values(['count', col], ascending=[False, True], kind='mergesort')
+	return counts.drop_duplicates(by).set_index(by)[col]
+
+
 class CustomKNNImputer(BaseEstimator, TransformerMixin):
 	"""
 	Custom Simple Imputer class for imputing missing values in the dataset. This imputer works in the following way:
@@ -219,6 +331,16 @@ class CustomKNNImputer(BaseEstimator, TransformerMixin):
 			The imputer_arguments to be used for replacement using KNNImputer
 		encoding : str
 			The encoding to use for categorical columns. Can be 'onehot' or 'label' or 'target' (not implemented yet)
+		neighbours : str | NeighbourSearch
+			How the neighbours are found, one of the NEIGHBOUR_SEARCHES in src/feature_engineering/neighbours.py.
+			'brute' uses the KNNImputer of sklearn, 'partitioned' only searches the cars of the same partition_cols
+			and 'ball_tree' is an approximate search, all with the same nan_euclidean distances and weights.
+		partition_cols : list
+			The columns used to block the cars for the 'partitioned' search
+		batch_size : int
+			Impute the rows in batches of this size to bound the memory used by the distances, all at once if None
+		n_jobs : int
+			The number of threads imputing the batches
 	
 	Returns
 	-------
@@ -231,9 +353,15 @@ class CustomKNNImputer(BaseEstimator, TransformerMixin):
 			target: str = None,
 			imputer_arguments: KNNImputerArguments = KNNImputerArguments(),
 			encoding: str = 'onehot',
+			neighbours: str | NeighbourSearch = 'brute',
+			partition_cols: list[str] = None,
+			batch_size: int = None,
+			n_jobs: int = 1,
 	) -> None:
 		assert isinstance(imputer_arguments, KNNImputerArguments) == True, \
 			'Unrecognized value for imputer_arguments, should be SimpleImputerArguments object'
+		assert neighbours == 'brute' or imputer_arguments.metric == 'nan_euclidean', \
+			'Only the brute neighbour search supports other metrics than nan_euclidean'
 		
 		super().__init__()
 		self.target = target
@@ -245,6 +373,10 @@ class CustomKNNImputer(BaseEstimator, TransformerMixin):
 		self.encoding = encoding
 		self.encoders = {}
 		self.encoded_cols = []
+		self.neighbours = neighbours
+		self.partition_cols = partition_cols or ['oem', 'model']
+		self.batch_size = batch_size
+		self.n_jobs = n_jobs
 		
 		self.copy = self.imputer_arguments['copy']
 		self.imputer_arguments['copy'] = False
@@ -267,6 +399,7 @@ class CustomKNNImputer(BaseEstimator, TransformerMixin):
 		self._validate_target(X, y)
 		
 		X = X.copy()
+		groups = self._get_groups(X)
 		
 		self.numerical_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
 		self.group_cols = self.group_cols if self.group_cols else self.numerical_cols
@@ -278,12 +411,60 @@ class CustomKNNImputer(BaseEstimator, TransformerMixin):
 			if X[col].dtype.name in ['category', 'object']:
 				X = self._encode_column(X, col)
 		
-		self.group_cols.extend([self.target])
-		self.imputer = KNNImputer(**self.imputer_arguments)
-		self.imputer.fit(X[self.group_cols].values)
+		# The columns without any value are dropped by the imputer, unless keep_empty_features is set
+		self.empty_cols = [col for col in self.group_cols if X[col].isna().all()]
+		self.imputer = self._get_imputer()
+		if isinstance(self.imputer, NeighbourImputer):
+			self.imputer.fit(X[self.group_cols].values, groups=groups)
+		else:
+			self.imputer.fit(X[self.group_cols].values)
 		
 		return self
 	
+	def _get_imputer(self) -> KNNImputer | NeighbourImputer:
+		"""
+		Returns
+		-------
+		imputer : KNNImputer | NeighbourImputer
+			The KNNImputer of sklearn for the brute force search, or the imputer using the chosen neighbour search
+		"""
+		if isinstance(self.neighbours, str) and self.neighbours == 'brute':
+			# The batches are stacked as arrays, even with set_config(transform_output='pandas') like in training.py
+			return KNNImputer(**self.imputer_arguments).set_output(transform='default')
+		
+		search_arguments = {'partition_cols': self.partition_cols} if self.neighbours == 'partitioned' else {}
+		return NeighbourImputer(
+			search=get_neighbour_search(self.neighbours, **search_arguments),
+			n_neighbors=self.imputer_arguments['n_neighbors'],
+			weights=self.imputer_arguments['weights'],
+			add_indicator=self.imputer_arguments['add_indicator'],
+			keep_empty_features=self.imputer_arguments['keep_empty_features'],
+		)
+	
+	def _get_indicator_features(self) -> np.ndarray:
+		"""
+		Returns
+		-------
+		features : np.ndarray
+			The positions in group_cols of the columns which get a missing indicator, the ones with missing values in fit
+		"""
+		if isinstance(self.imputer, NeighbourImputer):
+			return self.imputer.indicator_features_
+		return self.imputer.indicator_.features_
+	
+	def _get_groups(self, X: pd.DataFrame) -> pd.DataFrame | None:
+		"""
+		Returns
+		-------
+		groups : pd.DataFrame | None
+			The partition columns of X, before any encoding, if the partitioned search is used
+		"""
+		if isinstance(self.neighbours, PartitionedSearch):
+			return X[self.neighbours.partition_cols].copy()
+		if self.neighbours == 'partitioned':
+			return X[self.partition_cols].copy()
+		return None
+	
 	def _encode_column(self, X: pd.DataFrame, col: str) -> pd.DataFrame:
 		"""
 		Parameters
@@ -363,14 +544,32 @@ class CustomKNNImputer(BaseEstimator, TransformerMixin):
 		
 		if self.copy:
 			X = X.copy()
+		groups = self._get_groups(X)
 		
 		# print(f'{X.isna().sum()}')
 		# Encode categorical columns
 		for col in self.encoded_cols:
 			X = self._encode_column(X, col)
 		
-		# Impute missing values
-		self.imputer.transform(X[self.group_cols])
+		# Impute missing values, in batches of rows
+		values = X[self.group_cols].to_numpy(dtype=np.float64)
+		
+		def transform_batch(rows: slice) -> np.ndarray:
+			if isinstance(self.imputer, NeighbourImputer):
+				return self.imputer.transform(values[rows], groups=groups.iloc[rows] if groups is not None else None)
+			return self.imputer.transform(values[rows])
+		
+		imputed = _transform_in_batches(transform_batch, len(values), self.batch_size, self.n_jobs)
+		
+		# Write the imputed values back, followed by the missing indicators
+		imputed_cols = [
+			col for col in self.group_cols
+			if col not in self.empty_cols or self.imputer_arguments['keep_empty_features']
+		]
+		X[imputed_cols] = imputed[:, :len(imputed_cols)]
+		if self.imputer_arguments['add_indicator']:
+			indicator_cols = [f'{self.group_cols[i]}_imputed' for i in self._get_indicator_features()]
+			X[indicator_cols] = imputed[:, len(imputed_cols):].astype(int)
 		
 		# Decode categorical columns
 		for col in self.encoded_cols:
@@ -431,6 +630,15 @@ class CustomIterativeImputer(BaseEstimator, TransformerMixin):
 			The imputer_arguments to be used for replacement using the IterativeImputer
 		encoding : str
 			The strategy to use for encoding the categorical columns. Can be 'label' or 'onehot'. Defaults to 'label'
+		batch_size : int
+			Impute the rows in batches of this size to bound the memory used, all at once if None
+		n_jobs : int
+			The number of threads imputing the batches, and of workers fitting the regressions in the 'jacobi' mode
+		mode : str
+			'sequential' uses the IterativeImputer of sklearn, which fits the regression of every column one after the other.
+			'jacobi' fits all the regressions of a round at the same time, see JacobiIterativeImputer
+		executor : str
+			Whether the 'jacobi' mode uses a pool of 'thread' or 'process'
 	
 	Returns
 	-------
@@ -442,10 +650,15 @@ class CustomIterativeImputer(BaseEstimator, TransformerMixin):
 			self,
 			imputer_arguments: IterativeImputerArguments = IterativeImputerArguments(),
 			encoding: str = 'label',
+			batch_size: int = None,
+			n_jobs: int = 1,
+			mode: str = 'sequential',
+			executor: str = 'thread',
 	):
 		assert isinstance(imputer_arguments, IterativeImputerArguments) == True, \
 			'Unrecognized value for imputer_arguments, should be IterativeImputerArguments object'
 		assert encoding in ['label', 'onehot'], 'encoding should be either label or onehot'
+		assert mode in ['sequential', 'jacobi'], 'mode should be either sequential or jacobi'
 		
 		self.imputer_arguments: dict = imputer_arguments.__dict__
 		self.group_cols: list[str] = self.imputer_arguments.pop('columns')
@@ -455,6 +668,10 @@ class CustomIterativeImputer(BaseEstimator, TransformerMixin):
 		self.encoding = encoding
 		self.encoders = {}
 		self.encoding_mappings = {}
+		self.batch_size = batch_size
+		self.n_jobs = n_jobs
+		self.mode = mode
+		self.executor = executor
 		self.scaler = StandardScaler()
 	
 	def fit(self, X: pd.DataFrame, y: pd.Series = None) -> 'CustomIterativeImputer':
@@ -499,7 +716,10 @@ class CustomIterativeImputer(BaseEstimator, TransformerMixin):
 			self.scaler.fit(X[self.group_cols])
 			X[self.group_cols] = self.scaler.transform(X[self.group_cols])
 		
-		self.imputer = IterativeImputer(**self.imputer_arguments)
+		if self.mode == 'jacobi':
+			self.imputer = JacobiIterativeImputer(**self.imputer_arguments, n_jobs=self.n_jobs, executor=self.executor)
+		else:
+			self.imputer = IterativeImputer(**self.imputer_arguments)
 		self.imputer.fit(X[self.group_cols])
 		return self
 	
@@ -594,8 +814,10 @@ class CustomIterativeImputer(BaseEstimator, TransformerMixin):
 		else:
 			X[self.group_cols] = self.scaler.transform(X[self.group_cols])
 		
-		# Transform the dataframe
-		imputed = self.imputer.transform(X[self.group_cols])
+		# Transform the dataframe, in batches of rows
+		group_values = X[self.group_cols]
+		imputed = _transform_in_batches(
+			lambda rows: self.imputer.transform(group_values.iloc[rows]), len(group_values), self.batch_size, self.n_jobs)
 		X[self.group_cols] = imputed
 		
 		# De-standardize the dataframe
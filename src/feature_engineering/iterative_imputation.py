@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import copy
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+from sklearn.base import BaseEstimator, clone
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import BayesianRidge
+
+EXECUTORS = {
+	'thread': ThreadPoolExecutor,
+	'process': ProcessPoolExecutor,
+}
+
+
+def _fit_column(estimator: BaseEstimator, X: np.ndarray, y: np.ndarray) -> BaseEstimator:
+	# Module level so it can be sent to a process pool
+	return estimator.fit(X, y)
+
+
+class JacobiIterativeImputer:
+	"""
+	Imputes every column with a regression on the other columns, in rounds, like the IterativeImputer of sklearn.
+	The IterativeImputer updates the columns one after the other (Gauss-Seidel), so every regression depends on the previous
+	one. Here all the regressions of a round are fitted on the values of the previous round (Jacobi), so they are independent
+	and run concurrently on a pool of n_jobs threads or processes. The imputation order therefore does not matter.
+	The plain Jacobi update diverges when the columns are correlated, so every round only moves the imputed values a fraction
+	damping of the way to the new predictions, and the rounds stop at the first one which changes the values more than the
+	previous one, which is dropped.
+	The parameters of the IterativeImputer which this does not support (sample_posterior, n_nearest_features and an
+	imputation_order other than the default) raise a ValueError.
+
+	Parameters
+	----------
+		estimator: BaseEstimator
+			The regression used for every column, BayesianRidge by default
+		max_iter: int
+			The maximum number of rounds
+		tol: float
+			Stop when the largest change of a round is below tol times the largest absolute value of X, like sklearn
+		initial_strategy: str
+			The strategy of the SimpleImputer used before the first round
+		skip_complete: bool
+			Whether to skip the columns without missing values in fit, they are not imputed in transform then
+		warm_start: bool
+			Whether every round starts from the fit of the previous round: estimators with a warm_start parameter are refitted
+			in place and BayesianRidge starts from the previous alpha_ and lambda_
+		n_jobs: int
+			The number of regressions fitted at the same time
+		executor: str
+			'thread' or 'process'. The linear estimators spend their time in numpy and release the GIL, so threads are enough.
+		damping: float
+			The fraction of the way to the new predictions every round moves the imputed values, in (0, 1]
+	"""
+
+	def __init__(
+			self,
+			estimator: BaseEstimator = None,
+			missing_values: int | float = np.nan,
+			sample_posterior: bool = False,
+			max_iter: int = 10,
+			tol: float = 1e-3,
+			n_nearest_features: int = None,
+			initial_strategy: str = 'mean',
+			imputation_order: str = 'ascending',
+			skip_complete: bool = False,
+			verbose: int = 0,
+			random_state: int = None,
+			warm_start: bool = True,
+			n_jobs: int = 1,
+			executor: str = 'thread',
+			damping: float = 0.5,
+	):
+		if sample_posterior:
+			raise ValueError('sample_posterior is not supported by the Jacobi imputer')
+		if n_nearest_features is not None:
+			raise ValueError('n_nearest_features is not supported by the Jacobi imputer')
+		# All the columns of a round are imputed together, in no order
+		if imputation_order != 'ascending':
+			raise ValueError(f"imputation_order {imputation_order} is not supported by the Jacobi imputer, only 'ascending'")
+		assert executor in EXECUTORS, f'executor should be one of {list(EXECUTORS.keys())}'
+		if not 0 < damping <= 1:
+			raise ValueError(f'damping should be in (0, 1], got {damping}')
+
+		self.estimator = estimator
+		self.missing_values = missing_values
+		self.max_iter = max_iter
+		self.tol = tol
+		self.initial_strategy = initial_strategy
+		self.imputation_order = imputation_order
+		self.skip_complete = skip_complete
+		self.verbose = verbose
+		self.random_state = random_state
+		self.warm_start = warm_start
+		self.n_jobs = n_jobs
+		self.executor = executor
+		self.damping = damping
+
+	def _warm_start_estimator(self, previous: BaseEstimator | None, col: int) -> BaseEstimator:
+		if previous is None or not self.warm_start:
+			estimator = clone(self.estimator if self.estimator is not None else BayesianRidge())
+			if self.random_state is not None and 'random_state' in estimator.get_params():
+				estimator.set_params(random_state=self.random_state + col)
+			return estimator
+
+		# A copy, so the estimator of the previous round is still there for transform
+		estimator = copy.deepcopy(previous)
+		if 'warm_start' in estimator.get_params():
+			estimator.set_params(warm_start=True)
+		elif isinstance(estimator, BayesianRidge):
+			estimator.set_params(alpha_init=previous.alpha_, lambda_init=previous.lambda_)
+		return estimator
+
+	def _impute_round(self, Xt: np.ndarray, mask: np.ndarray, estimators: dict) -> np.ndarray:
+		# Every column is predicted from the values of the previous round, and moved part of the way to the predictions
+		Xt_next = Xt.copy()
+		for col, estimator in estimators.items():
+			missing = mask[:, col]
+			if missing.any():
+				predictions = estimator.predict(np.delete(Xt[missing], col, axis=1))
+				Xt_next[missing, col] = (1 - self.damping) * Xt[missing, col] + self.damping * predictions
+		return Xt_next
+
+	def fit_transform(self, X: np.ndarray, y=None) -> np.ndarray:
+		X = np.asarray(X, dtype=np.float64)
+		# The rounds work on arrays, even with set_config(transform_output='pandas') like in src/model_training/training.py
+		self.initial_imputer_ = SimpleImputer(
+			missing_values=self.missing_values, strategy=self.initial_strategy).set_output(transform='default')
+		Xt = self.initial_imputer_.fit_transform(X)
+		# The SimpleImputer drops the columns without any value
+		self.valid_mask_ = ~np.all(self._get_mask(X), axis=0)
+		X = X[:, self.valid_mask_]
+		mask = self._get_mask(X)
+
+		self.columns_ = [col for col in range(X.shape[1]) if mask[:, col].any() or not self.skip_complete]
+		self.imputation_sequence_ = []
+		self.n_iter_ = 0
+		if self.max_iter == 0 or not mask.any():
+			return Xt
+
+		normalized_tol = self.tol * np.max(np.abs(X[~mask]))
+		previous = {col: None for col in self.columns_}
+		previous_norm = np.inf
+		with EXECUTORS[self.executor](max_workers=self.n_jobs) as executor:
+			for self.n_iter_ in range(1, self.max_iter + 1):
+				estimators = {col: self._warm_start_estimator(previous[col], col) for col in self.columns_}
+				futures = {
+					col: executor.submit(
+						_fit_column, estimator, np.delete(Xt[~mask[:, col]], col, axis=1), Xt[~mask[:, col], col])
+					for col, estimator in estimators.items()
+				}
+				estimators = {col: future.result() for col, future in futures.items()}
+
+				Xt_next = self._impute_round(Xt, mask, estimators)
+				inf_norm = np.linalg.norm(Xt_next - Xt, ord=np.inf, axis=None)
+				if self.verbose > 0:
+					print(f'[JacobiIterativeImputer] Round {self.n_iter_}/{self.max_iter}, change: {inf_norm}, scaled tolerance: {normalized_tol}')
+				# A growing change means the rounds diverge, the values of the previous round are kept
+				if inf_norm > previous_norm:
+					self.n_iter_ -= 1
+					if self.verbose > 0:
+						print('[JacobiIterativeImputer] The change grew, stopping at the previous round.')
+					break
+				
+				Xt = Xt_next
+				self.imputation_sequence_.append(estimators)
+				previous = estimators
+				previous_norm = inf_norm
+				if inf_norm < normalized_tol:
+					if self.verbose > 0:
+						print('[JacobiIterativeImputer] Early stopping criterion reached.')
+					break
+		return Xt
+
+	def fit(self, X: np.ndarray, y=None) -> 'JacobiIterativeImputer':
+		self.fit_transform(X)
+		return self
+
+	def transform(self, X: np.ndarray) -> np.ndarray:
+		"""
+		Impute X by replaying the rounds of fit, starting from the initial imputation
+		"""
+		X = np.asarray(X, dtype=np.float64)
+		Xt = self.initial_imputer_.transform(X)
+		mask = self._get_mask(X)[:, self.valid_mask_]
+		for estimators in self.imputation_sequence_:
+			Xt = self._impute_round(Xt, mask, estimators)
+		return Xt
+
+	def _get_mask(self, X: np.ndarray) -> np.ndarray:
+		if self.missing_values is np.nan or (isinstance(self.missing_values, float) and np.isnan(self.missing_values)):
+			return np.isnan(X)
+		return X == self.missing_values
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from typing import Iterator
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics.pairwise import nan_euclidean_distances
+from sklearn.neighbors import BallTree
+
+# Upper bound on the number of distances computed at once by the brute force searches
+DISTANCES_CHUNK_SIZE = 2 ** 22
+
+
+class NeighbourSearch(ABC):
+	"""
+	Base class for the ways to find the nearest donors of the rows to impute.
+	The distances are always the nan_euclidean distances of sklearn, so only the features observed in both rows are used.
+	"""
+
+	def fit(self, X: np.ndarray, groups: pd.DataFrame | None = None) -> 'NeighbourSearch':
+		self._fit_X = X
+		return self
+
+	@abstractmethod
+	def kneighbors(
+			self,
+			X: np.ndarray,
+			donors: np.ndarray,
+			n_neighbors: int,
+			groups: pd.DataFrame | None = None,
+	) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+		"""
+		Find the n_neighbors nearest donors of every row of X, among the rows of the fit data in donors
+
+		Returns
+		-------
+			Iterator of (np.ndarray, np.ndarray, np.ndarray)
+				Blocks of (positions of the rows in X, distances to their neighbours, positions of the neighbours in the fit data).
+				The neighbours of a row are not sorted, and the distance is NaN when the rows have no feature in common.
+		"""
+
+
+def _brute_force_kneighbors(
+		X: np.ndarray,
+		fit_X: np.ndarray,
+		donors: np.ndarray,
+		n_neighbors: int,
+) -> Iterator[tuple[np.ndarray, np.ndarray, np.ndarray]]:
+	# Same selection as the KNNImputer of sklearn, in chunks of rows so the distance matrix stays small
+	n_neighbors = min(n_neighbors, len(donors))
+	chunk_size = max(1, DISTANCES_CHUNK_SIZE // max(len(donors), 1))
+	for start in range(0, len(X), chunk_size):
+		distances = nan_euclidean_distances(X[start:start + chunk_size], fit_X[donors])
+		neighbours = np.argpartition(distances, n_neighbors - 1, axis=1)[:, :n_neighbors]
+		yield np.arange(start, start + len(distances)), np.take_along_axis(distances, neighbours, axis=1), donors[neighbours]
+
+
+class BruteForceSearch(NeighbourSearch):
+	"""
+	Exact search against every donor, like the KNNImputer of sklearn
+	"""
+
+	def kneighbors(self, X, donors, n_neighbors, groups=None):
+		yield from _brute_force_kneighbors(X, self._fit_X, donors, n_neighbors)
+
+
+class PartitionedSearch(NeighbourSearch):
+	"""
+	Exact search inside blocks of cars sharing the same values of the partition columns (e.g. oem and model).
+	Rows whose block has fewer than min_donors donors are searched against all the donors instead.
+
+	Parameters
+	----------
+		partition_cols: list
+			The columns of groups used to block the rows
+		min_donors: int
+			The minimum number of donors in a block, defaults to the number of neighbours
+	"""
+
+	def __init__(self, partition_cols: list[str], min_donors: int = None):
+		self.partition_cols = partition_cols
+		self.min_donors = min_donors
+
+	def _get_block_keys(self, groups: pd.DataFrame) -> pd.Series:
+		if groups is None:
+			raise ValueError(f'The partitioned search needs the partition columns {self.partition_cols}')
+		return pd.MultiIndex.from_frame(groups[self.partition_cols].astype(str)).to_flat_index().to_series()
+
+	def fit(self, X, groups=None):
+		super().fit(X, groups)
+		self._fit_blocks = pd.Series(np.arange(len(X))).groupby(self._get_block_keys(groups).to_numpy()).indices
+		return self
+
+	def kneighbors(self, X, donors, n_neighbors, groups=None):
+		min_donors = self.min_donors or n_neighbors
+		is_donor = np.zeros(len(self._fit_X), dtype=bool)
+		is_donor[donors] = True
+
+		fallback = []
+		for key, rows in pd.Series(np.arange(len(X))).groupby(self._get_block_keys(groups).to_numpy()).indices.items():
+			block = self._fit_blocks.get(key, np.array([], dtype=int))
+			block_donors = block[is_donor[block]]
+			if len(block_donors) < min_donors:
+				fallback.append(rows)
+				continue
+			for positions, distances, neighbours in _brute_force_kneighbors(X[rows], self._fit_X, block_donors, n_neighbors):
+				yield rows[positions], distances, neighbours
+
+		if fallback:
+			rows = np.concatenate(fallback)
+			for positions, distances, neighbours in _brute_force_kneighbors(X[rows], self._fit_X, donors, n_neighbors):
+				yield rows[positions], distances, neighbours
+
+
+class BallTreeSearch(NeighbourSearch):
+	"""
+	Approximate search with a ball tree over the donors, where the missing values are replaced by the mean of the feature.
+	The tree is built on the columns standardized with the means and standard deviations of the fit data, so a feature with
+	large values (e.g. km) does not decide the candidates alone. The tree returns n_neighbors * oversampling candidates,
+	which are ranked again with the exact nan_euclidean distances on the original values.
+
+	Parameters
+	----------
+		oversampling: int
+			How many candidates to take from the tree for every neighbour
+		leaf_size: int
+			The leaf size of the ball tree
+	"""
+
+	def __init__(self, oversampling: int = 3, leaf_size: int = 40):
+		self.oversampling = oversampling
+		self.leaf_size = leaf_size
+
+	def fit(self, X, groups=None):
+		super().fit(X, groups)
+		self._means = np.nan_to_num(np.nanmean(np.where(np.isnan(X).all(axis=0), 0, X), axis=0))
+		stds = np.nan_to_num(np.nanstd(np.where(np.isnan(X).all(axis=0), 0, X), axis=0))
+		self._stds = np.where(stds > 0, stds, 1.0)
+		self._filled_fit_X = self._standardize(X)
+		# One tree for every set of donors and features, i.e. every column with missing values
+		self._trees = {}
+		return self
+
+	def _standardize(self, X: np.ndarray) -> np.ndarray:
+		# The missing values are at the mean, i.e. 0
+		return np.where(np.isnan(X), 0.0, (X - self._means) / self._stds)
+
+	def _get_tree(self, donors: np.ndarray, features: np.ndarray) -> BallTree:
+		key = (donors.tobytes(), features.tobytes())
+		if key not in self._trees:
+			self._trees[key] = BallTree(self._filled_fit_X[np.ix_(donors, features)], leaf_size=self.leaf_size)
+		return self._trees[key]
+
+	def kneighbors(self, X, donors, n_neighbors, groups=None):
+		n_neighbors = min(n_neighbors, len(donors))
+		n_candidates = min(n_neighbors * self.oversampling, len(donors))
+		# The features missing in all the rows, like the one being imputed, would only pull the candidates towards the mean
+		features = np.flatnonzero(~np.isnan(X).all(axis=0))
+		if len(features) == 0:
+			yield from _brute_force_kneighbors(X, self._fit_X, donors, n_neighbors)
+			return
+		filled_X = self._standardize(X)[:, features]
+		_, candidates = self._get_tree(donors, features).query(filled_X, k=n_candidates)
+		candidates = donors[candidates]
+
+		# Rank the candidates again with the distances on the features observed in both rows
+		distances = _paired_nan_euclidean_distances(X, self._fit_X[candidates])
+		neighbours = np.argpartition(np.where(np.isnan(distances), np.inf, distances), n_neighbors - 1, axis=1)[:, :n_neighbors]
+		yield np.arange(len(X)), np.take_along_axis(distances, neighbours, axis=1), np.take_along_axis(candidates, neighbours, axis=1)
+
+
+def _paired_nan_euclidean_distances(X: np.ndarray, candidates: np.ndarray) -> np.ndarray:
+	# The nan_euclidean distance of every row of X to each of its own candidates
+	present = ~np.isnan(X)[:, None, :] & ~np.isnan(candidates)
+	squared = np.where(present, X[:, None, :] - candidates, 0) ** 2
+	n_present = present.sum(axis=2)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		distances = np.sqrt(squared.sum(axis=2) * X.shape[1] / n_present)
+	distances[n_present == 0] = np.nan
+	return distances
+
+
+NEIGHBOUR_SEARCHES = {
+	'brute': BruteForceSearch,
+	'partitioned': PartitionedSearch,
+	'ball_tree': BallTreeSearch,
+}
+
+
+class NeighbourImputer:
+	"""
+	Imputes the missing values like the KNNImputer of sklearn, with a pluggable search for the nearest donors.
+	Every missing value is the (weighted) mean of the feature over the nearest rows of the fit data which have it,
+	or the mean of the feature if no donor has any feature in common with the row.
+
+	Parameters
+	----------
+		search: NeighbourSearch
+			How the nearest donors are found
+		n_neighbors: int
+			The number of donors used for every missing value
+		weights: str
+			'uniform' or 'distance'
+		add_indicator: bool
+			Whether to append the missing indicators of the features which had missing values in fit
+		keep_empty_features: bool
+			Whether to keep the features without any value in fit, imputed with 0
+	"""
+
+	def __init__(
+			self,
+			search: NeighbourSearch = None,
+			n_neighbors: int = 5,
+			weights: str = 'uniform',
+			add_indicator: bool = False,
+			keep_empty_features: bool = False,
+	):
+		assert weights in ['uniform', 'distance'], 'weights should be uniform or distance'
+		self.search = search or BruteForceSearch()
+		self.n_neighbors = n_neighbors
+		self.weights = weights
+		self.add_indicator = add_indicator
+		self.keep_empty_features = keep_empty_features
+
+	def fit(self, X: np.ndarray, groups: pd.DataFrame | None = None) -> 'NeighbourImputer':
+		X = np.asarray(X, dtype=np.float64)
+		self._fit_X = X
+		self._mask_fit_X = np.isnan(X)
+		self._valid_mask = ~self._mask_fit_X.all(axis=0)
+		self.indicator_features_ = np.flatnonzero(self._mask_fit_X.any(axis=0))
+		self._means = np.ma.array(X, mask=self._mask_fit_X).mean(axis=0).data
+		self.search.fit(X, groups)
+		return self
+
+	def _calc_impute(self, distances: np.ndarray, neighbours: np.ndarray, col: int) -> np.ndarray:
+		if self.weights == 'distance':
+			with np.errstate(divide='ignore'):
+				weights = 1.0 / distances
+			# Like sklearn, a donor at distance 0 takes all the weight
+			zero = np.isinf(weights).any(axis=1)
+			weights[zero] = np.isinf(weights[zero]).astype(float)
+			weights[np.isnan(weights)] = 0.0
+		else:
+			weights = None
+		return np.ma.average(np.ma.array(self._fit_X[neighbours, col]), axis=1, weights=weights).data
+
+	def transform(self, X: np.ndarray, groups: pd.DataFrame | None = None) -> np.ndarray:
+		X = np.array(X, dtype=np.float64)
+		mask = np.isnan(X)
+		indicator = mask[:, self.indicator_features_]
+
+		rows_missing = np.flatnonzero(mask[:, self._valid_mask].any(axis=1))
+		# The distances are computed on the values before imputation, like sklearn
+		X_missing = X[rows_missing].copy()
+		groups_missing = groups.iloc[rows_missing] if groups is not None else None
+		for col in np.flatnonzero(self._valid_mask):
+			receivers = np.flatnonzero(mask[rows_missing, col])
+			if len(receivers) == 0:
+				continue
+			donors = np.flatnonzero(~self._mask_fit_X[:, col])
+			receivers_groups = groups_missing.iloc[receivers] if groups_missing is not None else None
+			for positions, distances, neighbours in self.search.kneighbors(
+					X_missing[receivers], donors, self.n_neighbors, receivers_groups):
+				rows = rows_missing[receivers[positions]]
+				all_nan = np.isnan(distances).all(axis=1)
+				X[rows[all_nan], col] = self._means[col]
+				if (~all_nan).any():
+					X[rows[~all_nan], col] = self._calc_impute(distances[~all_nan], neighbours[~all_nan], col)
+
+		if self.keep_empty_features:
+			X[:, ~self._valid_mask] = 0
+		else:
+			X = X[:, self._valid_mask]
+		if self.add_indicator:
+			X = np.hstack([X, indicator.astype(X.dtype)])
+		return X
+
+	def fit_transform(self, X: np.ndarray, groups: pd.DataFrame | None = None) -> np.ndarray:
+		return self.fit(X, groups).transform(X, groups)
+
+
+def get_neighbour_search(neighbours: str | NeighbourSearch, **kwargs) -> NeighbourSearch:
+	"""
+	Get a neighbour search from its name in NEIGHBOUR_SEARCHES, or return it as is if it already is one
+	"""
+	if isinstance(neighbours, NeighbourSearch):
+		return neighbours
+	if neighbours not in NEIGHBOUR_SEARCHES:
+		raise ValueError(f'Unrecognized neighbour search {neighbours}, should be one of {list(NEIGHBOUR_SEARCHES.keys())}')
+	return NEIGHBOUR_SEARCHES[neighbours](**kwargs)
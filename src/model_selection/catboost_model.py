@@ -1,3 +1,5 @@
+from __future__ import annotations
+
 from catboost import CatBoostRegressor
 import pandas as pd
 from sklearn import pipeline
@@ -6,7 +8,8 @@ from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import MinMaxScaler
 
 from src.feature_engineering.feature_transformations import FeatureEngineeringTransformations
-from src.utils.constants import TARGET
+from src.utils.constants import FIT_CACHE_DIR_PATH, TARGET
+from src.utils.fit_cache import CachedTransformer
 
 
 class CatBoostModel:
@@ -28,7 +31,7 @@ class CatBoostModel:
 			early_stopping_rounds=200,
 		)
 	
-	def get_preprocessor(self, X: pd.DataFrame) -> pipeline:
+	def get_preprocessor(self, X: pd.DataFrame, cache_dir: str | None = FIT_CACHE_DIR_PATH) -> pipeline:
 		X = X.copy()
 		numerical_cols = X.select_dtypes(include=['int64', 'float64']).columns.tolist()
 		categorical_cols = X.select_dtypes(include=['object', 'category']).columns.tolist()
@@ -37,16 +40,18 @@ class CatBoostModel:
 		# TODO: Add the matching imputation
 		# Matching imputation : A custom imputation which aggregates the data by the columns specified in the
 		# arguments and gets an exact match if available.
-		# for col in nan_cols:
-		# 	args = MatchingImputerArguments(
-		# 		strategy=pd.Series.mode if col in categorical_cols else pd.Series.mean,
+		# All the columns with NaNs are imputed together, the categorical ones with their mode
+		# matching_imputer = CustomMatchingImputer(
+		# 	target=nan_cols,
+		# 	imputer_arguments=MatchingImputerArguments(
+		# 		strategy=pd.Series.mean,
 		# 		columns=['model', 'variant'],
 		# 		add_indicator=True,
 		# 		copy=False,
 		# 		match_level=0,
-		# 	)
-		# 	matching_imputer = CustomMatchingImputer(target=col, imputer_arguments=args)
-		# 	X[col] = matching_imputer.fit_transform(X)
+		# 	),
+		# )
+		# X = matching_imputer.fit_transform(X)
 		
 		# Feature engineering transformations and changing of columns accordingly
 		feature_engineering = FeatureEngineeringTransformations(target=TARGET)
@@ -83,7 +88,8 @@ class CatBoostModel:
 		
 		preprocessor = pipeline.Pipeline(
 			steps=[
-				('feature_engineering', feature_engineering),
+				# Fitted once for the same training data and shared by the models, see src/utils/fit_cache.py
+				('feature_engineering', CachedTransformer(feature_engineering, cache_dir=cache_dir)),
 				('column_transformer', column_transformer)
 			]
 		)
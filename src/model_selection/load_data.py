@@ -1,24 +1,31 @@
+from __future__ import annotations
+
 import os
 
 import pandas as pd
+from src.feature_engineering.feature_matrix import FeatureMatrix, load_or_build_feature_matrix
 from src.utils.constants import *
 from src.utils.data_loader import DataLoader
+from src.utils.storage import get_storage
 
 
 def load_training_data(
 		filepath: str = None,
 		verbose: bool = True,
-) -> pd.DataFrame | None:
+		columns: list[str] = None,
+		storage_format: str = STORAGE_FORMAT,
+		with_feature_matrix: bool = False,
+) -> pd.DataFrame | tuple[pd.DataFrame, FeatureMatrix] | None:
 	"""
 	Load the training data
 	
 	Returns
 	-------
-		pd.DataFrame | None
-			The training data or None if the file is not found
+		pd.DataFrame | (pd.DataFrame, FeatureMatrix) | None
+			The training data, with its feature matrix if with_feature_matrix, or None if the file is not found
 	"""
 	if filepath is None:
-		dl = DataLoader(TRAIN_DIR_PATH)
+		dl = DataLoader(TRAIN_DIR_PATH, storage_format=storage_format)
 		filename = dl.get_latest_file(begins_with=TRAIN_FILE_BEGIN)
 		if filename is None:
 			raise FileNotFoundError('No training file found. Prepare the data first')
@@ -26,9 +33,12 @@ def load_training_data(
 	
 	print(f"Reading training file from : {filepath}")
 	try:
-		df = pd.read_csv(filepath, index_col=INDEX)
+		df = get_storage(file_path=filepath).load(filepath, columns=columns, index_col=INDEX)
 		if verbose:
 			print(df.info())
+		if with_feature_matrix:
+			# The feature lists parsed once by prepare_data and saved next to the file
+			return df, load_or_build_feature_matrix(df, filepath, FEATURE_LIST_COLS)
 		return df
 	except Exception as e:
 		print(f"Error reading file: {filepath}")
@@ -39,17 +49,20 @@ def load_training_data(
 def load_testing_data(
 		filepath: str = None,
 		verbose: bool = True,
-) -> pd.DataFrame | None:
+		columns: list[str] = None,
+		storage_format: str = STORAGE_FORMAT,
+		with_feature_matrix: bool = False,
+) -> pd.DataFrame | tuple[pd.DataFrame, FeatureMatrix] | None:
 	"""
 	Load the testing data
 	
 	Returns
 	-------
-		pd.DataFrame
-			The testing data or None if the file is not found
+		pd.DataFrame | (pd.DataFrame, FeatureMatrix) | None
+			The testing data, with its feature matrix if with_feature_matrix, or None if the file is not found
 	"""
 	if filepath is None:
-		dl = DataLoader(TEST_DIR_PATH)
+		dl = DataLoader(TEST_DIR_PATH, storage_format=storage_format)
 		filename = dl.get_latest_file(begins_with=TEST_FILE_BEGIN)
 		if filename is None:
 			raise FileNotFoundError('No testing file found. Prepare the data first')
@@ -57,9 +70,12 @@ def load_testing_data(
 	
 	print(f"Reading testing file from : {filepath}")
 	try:
-		df = pd.read_csv(filepath, index_col=INDEX)
+		df = get_storage(file_path=filepath).load(filepath, columns=columns, index_col=INDEX)
 		if verbose:
 			print(df.info())
+		if with_feature_matrix:
+			# The feature lists parsed once by prepare_data and saved next to the file
+			return df, load_or_build_feature_matrix(df, filepath, FEATURE_LIST_COLS)
 		return df
 	except Exception as e:
 		print(f"Error reading file: {filepath}")
@@ -70,17 +86,20 @@ def load_testing_data(
 def load_validation_data(
 		filepath: str = None,
 		verbose: bool = True,
-) -> pd.DataFrame | None:
+		columns: list[str] = None,
+		storage_format: str = STORAGE_FORMAT,
+		with_feature_matrix: bool = False,
+) -> pd.DataFrame | tuple[pd.DataFrame, FeatureMatrix] | None:
 	"""
 	Load the validation data
 	
 	Returns
 	-------
-		pd.DataFrame
-			The validation data or None if the file is not found
+		pd.DataFrame | (pd.DataFrame, FeatureMatrix) | None
+			The validation data, with its feature matrix if with_feature_matrix, or None if the file is not found
 	"""
 	if filepath is None:
-		dl = DataLoader(VALIDATION_DIR_PATH)
+		dl = DataLoader(VALIDATION_DIR_PATH, storage_format=storage_format)
 		filename = dl.get_latest_file(begins_with=VALIDATION_FILE_BEGIN)
 		if filename is None:
 			raise FileNotFoundError('No validation file found. Prepare the data first')
@@ -88,9 +107,12 @@ def load_validation_data(
 	
 	print(f"Reading validation file from : {filepath}")
 	try:
-		df = pd.read_csv(filepath, index_col=INDEX)
+		df = get_storage(file_path=filepath).load(filepath, columns=columns, index_col=INDEX)
 		if verbose:
 			print(df.info())
+		if with_feature_matrix:
+			# The feature lists parsed once by prepare_data and saved next to the file
+			return df, load_or_build_feature_matrix(df, filepath, FEATURE_LIST_COLS)
 		return df
 	except Exception as e:
 		print(f"Error reading file: {filepath}")
@@ -103,6 +125,9 @@ def load_train_test_valid_data(
 		test_path: str = None,
 		validation_path: str = None,
 		verbose: bool = False,
+		columns: list[str] = None,
+		storage_format: str = STORAGE_FORMAT,
+		with_feature_matrix: bool = False,
 ) -> (pd.DataFrame, pd.DataFrame, pd.DataFrame):
 	"""
 	Load the training, testing and validation data
@@ -110,12 +135,19 @@ def load_train_test_valid_data(
 	Returns
 	-------
 		(pd.DataFrame, pd.DataFrame, pd.DataFrame) or None
-			The training, testing and validation data respectively or None if any of the files is not found
+			The training, testing and validation data respectively or None if any of the files is not found,
+			each with its feature matrix if with_feature_matrix
 	"""
 	
-	train = load_training_data(filepath=train_path, verbose=verbose)
-	test = load_testing_data(filepath=test_path, verbose=verbose)
-	validation = load_validation_data(filepath=validation_path, verbose=verbose)
+	train = load_training_data(
+		filepath=train_path, verbose=verbose, columns=columns, storage_format=storage_format,
+		with_feature_matrix=with_feature_matrix)
+	test = load_testing_data(
+		filepath=test_path, verbose=verbose, columns=columns, storage_format=storage_format,
+		with_feature_matrix=with_feature_matrix)
+	validation = load_validation_data(
+		filepath=validation_path, verbose=verbose, columns=columns, storage_format=storage_format,
+		with_feature_matrix=with_feature_matrix)
 	
 	if train is None or test is None or validation is None:
 		return None
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from src.utils.constants import (
+	BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, COMPILED_TREES, MODEL_DIR_PATH, PREDICTION_CACHE_SIZE, PREDICTION_P99_TARGET_MS,
+	SERVER_HOST, SERVER_PORT
+)
+from src.utils.data_loader import DataLoader
+from src.utils.micro_batching import MicroBatcher
+from src.utils.model_artifacts import ModelArtifact, load_model_artifact
+from src.utils.prediction_cache import PredictionCache
+
+ENSEMBLE_MEMBERS = ['catboost', 'lightgbm']
+
+
+def load_ensemble(model_dir: str = MODEL_DIR_PATH, compiled: bool = COMPILED_TREES) -> dict[str, ModelArtifact]:
+	"""
+	Load the latest native artifact of every ensemble member saved by src/model_training/training.py,
+	with the compiled boosters of src/utils/compiled_trees.py if compiled
+	"""
+	dl = DataLoader(model_dir)
+	models = {}
+	for member in ENSEMBLE_MEMBERS:
+		filename = dl.get_latest_file(begins_with=f'{member}_model')
+		if filename is None:
+			raise FileNotFoundError(f'No {member} model found in {model_dir}. Train the models first')
+		models[member] = load_model_artifact(os.path.join(model_dir, filename), compiled=compiled)
+	return models
+
+
+class EnsemblePredictor:
+	"""
+	Predicts the price of one car as the average of the prices predicted by the models, and keeps the latencies
+	of the last predictions to check them against the p99 target.
+
+	Parameters
+	----------
+		models: dict
+			The ModelArtifact of every member of the ensemble
+		latency_window: int
+			The number of latencies kept for the stats
+		cache: PredictionCache
+			The cache of the predictions, keyed by the input rows of the models, None predicts every car
+	"""
+
+	def __init__(self, models: dict[str, ModelArtifact], latency_window: int = 10000, cache: PredictionCache = None):
+		self.models = models
+		self.latencies = deque(maxlen=latency_window)
+		self.cache = cache
+
+	def set_models(self, models: dict[str, ModelArtifact]) -> None:
+		"""
+		Replace the models, e.g. by newly trained ones, the predictions cached for the previous models are dropped
+		"""
+		self.models = models
+		if self.cache is not None:
+			self.cache.clear()
+
+	def _get_cached(self, models: dict[str, ModelArtifact], car: dict) -> tuple[bytes, dict | None]:
+		key = self.cache.make_key([model.feature_vector_bytes(car) for model in models.values()])
+		return key, self.cache.get(key)
+
+	def _put_cached(self, models: dict[str, ModelArtifact], key: bytes, prices: dict) -> None:
+		# Not if the models were replaced during the prediction
+		if self.models is models:
+			self.cache.put(key, dict(prices))
+
+	def check_car(self, car: dict) -> None:
+		"""
+		Raise a TypeError if a value of the car does not have the type the models expect for its column
+		"""
+		for model in self.models.values():
+			model.check_car(car)
+
+	def predict_one(self, car: dict) -> dict:
+		start = time.perf_counter()
+		models = self.models
+		if self.cache is not None:
+			car = self.cache.bucket(car)
+			key, cached = self._get_cached(models, car)
+			if cached is not None:
+				self.latencies.append(time.perf_counter() - start)
+				return dict(cached)
+		prices = {member: model.predict_one(car) for member, model in models.items()}
+		prices['price'] = sum(prices.values()) / len(models)
+		if self.cache is not None:
+			self._put_cached(models, key, prices)
+		self.latencies.append(time.perf_counter() - start)
+		return prices
+
+	def predict_many(self, cars: list[dict]) -> list[dict]:
+		"""
+		Predict several cars like predict_one, with one call to every model for the cars which are not cached
+		"""
+		start = time.perf_counter()
+		models = self.models
+		results = [None] * len(cars)
+		keys = [None] * len(cars)
+		if self.cache is not None:
+			cars = [self.cache.bucket(car) for car in cars]
+			for i, car in enumerate(cars):
+				keys[i], cached = self._get_cached(models, car)
+				results[i] = None if cached is None else dict(cached)
+		missing = [i for i, result in enumerate(results) if result is None]
+
+		if missing:
+			missing_cars = [cars[i] for i in missing]
+			prices = {member: model.predict_many(missing_cars) for member, model in models.items()}
+			prices['price'] = sum(prices.values()) / len(models)
+			for j, i in enumerate(missing):
+				results[i] = {name: float(member_prices[j]) for name, member_prices in prices.items()}
+				if self.cache is not None:
+					self._put_cached(models, keys[i], results[i])
+		# Every car of the batch waited for the whole batch
+		self.latencies.extend([time.perf_counter() - start] * len(cars))
+		return results
+
+	def predict_log_price(self, cars: list[dict]) -> np.ndarray:
+		"""
+		The average of the raw predictions of the models, the log-prices of the cars when the models predict the log of the target
+		"""
+		return sum(model.predict_many(cars, raw=True) for model in self.models.values()) / len(self.models)
+
+	def get_latency_stats(self) -> dict:
+		latencies_ms = np.array(self.latencies) * 1000
+		if len(latencies_ms) == 0:
+			return {'count': 0, 'p99_target_ms': PREDICTION_P99_TARGET_MS}
+		p50, p99 = np.percentile(latencies_ms, [50, 99])
+		return {
+			'count': len(latencies_ms),
+			'p50_ms': p50,
+			'p99_ms': p99,
+			'p99_target_ms': PREDICTION_P99_TARGET_MS,
+			'p99_within_target': bool(p99 <= PREDICTION_P99_TARGET_MS),
+		}
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+	"""
+	POST /predict with the JSON of a car returns its predicted price, POST /reload loads the latest models,
+	GET /health and GET /stats report on the service
+	"""
+	# Keep the connections open, so the clients do not pay for a new connection on every prediction
+	protocol_version = 'HTTP/1.1'
+	# The headers and the body are written separately, with Nagle's algorithm the body waits for the delayed ACK (~40 ms)
+	disable_nagle_algorithm = True
+
+	def _send_json(self, status: int, body: dict) -> None:
+		payload = json.dumps(body).encode()
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(payload)))
+		self.end_headers()
+		self.wfile.write(payload)
+
+	def do_GET(self):
+		if self.path == '/health':
+			self._send_json(200, {'status': 'ok', 'models': list(self.server.predictor.models.keys())})
+		elif self.path == '/stats':
+			stats = self.server.predictor.get_latency_stats()
+			if self.server.batcher is not None:
+				stats['batching'] = self.server.batcher.get_stats()
+			if self.server.predictor.cache is not None:
+				stats['cache'] = self.server.predictor.cache.get_stats()
+			self._send_json(200, stats)
+		else:
+			self._send_json(404, {'error': f'Unknown path {self.path}'})
+
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+		if self.path == '/reload':
+			try:
+				self.server.predictor.set_models(load_ensemble(self.server.model_dir))
+			except FileNotFoundError as e:
+				self._send_json(404, {'error': str(e)})
+				return
+			self._send_json(200, {'status': 'reloaded', 'models': list(self.server.predictor.models.keys())})
+			return
+		if self.path != '/predict':
+			self._send_json(404, {'error': f'Unknown path {self.path}'})
+			return
+		try:
+			car = json.loads(body)
+		except json.JSONDecodeError as e:
+			self._send_json(400, {'error': f'Invalid JSON: {e}'})
+			return
+		if not isinstance(car, dict):
+			self._send_json(400, {'error': 'The body should be the JSON object of a car'})
+			return
+
+		try:
+			self.server.predictor.check_car(car)
+			if self.server.batcher is not None:
+				self._send_json(200, self.server.batcher.predict(car))
+			else:
+				self._send_json(200, self.server.predictor.predict_one(car))
+		except (ValueError, TypeError, SyntaxError) as e:
+			self._send_json(400, {'error': f'Cannot predict the price of this car: {e}'})
+		except Exception as e:
+			# Any other error is a bug of the server, the client still gets a response instead of a dropped connection
+			self._send_json(500, {'error': f'Internal error: {type(e).__name__}: {e}'})
+
+	def log_message(self, format, *args):
+		# Writing a line to stderr for every request would cost more than the prediction itself
+		pass
+
+
+class PredictionServer(ThreadingHTTPServer):
+	# The default backlog of 5 drops the connections of a burst of clients, which then retry after a second
+	request_queue_size = 128
+	daemon_threads = True
+
+
+def make_server(
+		predictor: EnsemblePredictor,
+		host: str = SERVER_HOST,
+		port: int = SERVER_PORT,
+		batch_max_wait_ms: float = BATCH_MAX_WAIT_MS,
+		batch_max_size: int = BATCH_MAX_SIZE,
+		model_dir: str = MODEL_DIR_PATH,
+) -> PredictionServer:
+	"""
+	The HTTP server of the predictor, port 0 picks a free port. Run it with serve_forever().
+	The concurrent requests are micro-batched unless batch_max_size is 1, close server.batcher after shutting it down.
+	"""
+	server = PredictionServer((host, port), PredictionRequestHandler)
+	server.predictor = predictor
+	server.model_dir = model_dir
+	server.batcher = None
+	if batch_max_size > 1:
+		server.batcher = MicroBatcher(predictor.predict_many, max_wait_ms=batch_max_wait_ms, max_batch_size=batch_max_size)
+	return server
+
+
+def main():
+	port = int(sys.argv[1]) if len(sys.argv) > 1 else SERVER_PORT
+
+	# Load the models once, they stay in memory for all the requests
+	print('Loading the models...')
+	cache = PredictionCache() if PREDICTION_CACHE_SIZE > 0 else None
+	predictor = EnsemblePredictor(load_ensemble(), cache=cache)
+
+	server = make_server(predictor, port=port)
+	print(f'Serving the predictions on http://{SERVER_HOST}:{port}/predict')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		if server.batcher is not None:
+			server.batcher.close()
+			print(f'Batching: {server.batcher.get_stats()}')
+		if cache is not None:
+			print(f'Cache: {cache.get_stats()}')
+		print(f'Latencies: {predictor.get_latency_stats()}')
+
+
+if __name__ == '__main__':
+	main()
@@ -6,32 +6,45 @@ import numpy as np
 from src.model_selection.load_data import load_validation_data
 from src.utils.constants import TARGET, INDEX, MODEL_DIR_PATH
 from src.utils.data_loader import DataLoader
+from src.utils.model_artifacts import load_model_artifact
 
 
 def main():
-	# Load the validation data
-	df = load_validation_data(verbose=False)
-	X = df.drop(columns=TARGET)
-	y = df[TARGET]
-	
-	# Load the file names of the models
+	# Load the models, the native artifacts or else the pickled pipelines of older trainings
 	dl = DataLoader(MODEL_DIR_PATH)
-	catboost_pipeline_filename = dl.get_latest_file(begins_with='catboost_pipeline')
-	lightgbm_pipeline_filename = dl.get_latest_file(begins_with='lightgbm_pipeline')
-	if catboost_pipeline_filename is None or lightgbm_pipeline_filename is None:
-		raise FileNotFoundError('No model file found. Train the models first')
-	
-	# Get the full path of the models
-	catboost_pipeline_filepath = os.path.join(MODEL_DIR_PATH, catboost_pipeline_filename)
-	lightgbm_pipeline_filepath = os.path.join(MODEL_DIR_PATH, lightgbm_pipeline_filename)
-	
-	# Load the models
-	catboost_pipeline = joblib.load(catboost_pipeline_filepath)
-	lightgbm_pipeline = joblib.load(lightgbm_pipeline_filepath)
-	
-	# Predict the target
-	catboost_pred = np.exp(catboost_pipeline.predict(X))
-	lightgbm_pred = np.exp(lightgbm_pipeline.predict(X))
+	catboost_model_filename = dl.get_latest_file(begins_with='catboost_model')
+	lightgbm_model_filename = dl.get_latest_file(begins_with='lightgbm_model')
+	if catboost_model_filename is not None and lightgbm_model_filename is not None:
+		catboost_model = load_model_artifact(os.path.join(MODEL_DIR_PATH, catboost_model_filename))
+		lightgbm_model = load_model_artifact(os.path.join(MODEL_DIR_PATH, lightgbm_model_filename))
+		
+		# Load the validation data, only the columns the models read, with the feature lists parsed by prepare_data
+		columns = list(dict.fromkeys(catboost_model.input_columns + lightgbm_model.input_columns + [TARGET]))
+		df, feature_matrix = load_validation_data(verbose=False, columns=columns, with_feature_matrix=True)
+		X = df.drop(columns=TARGET)
+		y = df[TARGET]
+		
+		# Predict the target, the artifacts invert the transform of the target themselves
+		catboost_pred = catboost_model.predict(X, feature_matrix=feature_matrix)
+		lightgbm_pred = lightgbm_model.predict(X, feature_matrix=feature_matrix)
+	else:
+		catboost_pipeline_filename = dl.get_latest_file(begins_with='catboost_pipeline')
+		lightgbm_pipeline_filename = dl.get_latest_file(begins_with='lightgbm_pipeline')
+		if catboost_pipeline_filename is None or lightgbm_pipeline_filename is None:
+			raise FileNotFoundError('No model file found. Train the models first')
+		
+		# Load the models
+		catboost_pipeline = joblib.load(os.path.join(MODEL_DIR_PATH, catboost_pipeline_filename))
+		lightgbm_pipeline = joblib.load(os.path.join(MODEL_DIR_PATH, lightgbm_pipeline_filename))
+		
+		# Load the validation data, the pipelines do not record the columns they read
+		df = load_validation_data(verbose=False)
+		X = df.drop(columns=TARGET)
+		y = df[TARGET]
+		
+		# Predict the target
+		catboost_pred = np.exp(catboost_pipeline.predict(X))
+		lightgbm_pred = np.exp(lightgbm_pipeline.predict(X))
 	
 	# Average the predictions
 	avg_pred = (catboost_pred + lightgbm_pred) / 2
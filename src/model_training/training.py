@@ -1,5 +1,8 @@
+from __future__ import annotations
+
 import datetime
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 import joblib
 import numpy as np
@@ -8,14 +11,26 @@ from sklearn import pipeline
 from sklearn.metrics import mean_absolute_error, mean_absolute_percentage_error
 from sklearn.utils.validation import check_is_fitted
 
+from src.feature_engineering.feature_matrix import FeatureMatrix
 from src.model_selection.lightGBM_model import LightGBMModel
 from src.model_selection.load_data import load_train_test_valid_data
-from src.utils.constants import TARGET, MODEL_DIR_PATH, SAVE_DATE_TIME_FORMAT
+from src.utils.constants import TARGET, MODEL_DIR_PATH, SAVE_DATE_TIME_FORMAT, FIT_CACHE_DIR_PATH
+from src.utils.fit_cache import get_fit_cache
+from src.utils.model_artifacts import save_model_artifact
+from src.utils.shared_frames import arrays_from_shared_memory, arrays_to_shared_memory, unlink_shared_memory
 from src.model_selection.catboost_model import CatBoostModel
 from sklearn import set_config
 set_config(transform_output="pandas")
 
 
+def _preprocess(preprocessor: pipeline.Pipeline, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
+	# Pipeline.transform does not pass any parameter to the transforms, the feature matrix is given to the feature engineering
+	if feature_matrix is None:
+		return preprocessor.transform(X)
+	X = preprocessor.named_steps['feature_engineering'].transform(X, feature_matrix=feature_matrix)
+	return preprocessor.named_steps['column_transformer'].transform(X)
+
+
 class CatBoostRegModel:
 	def __init__(self, transform_target: bool = False, transform: callable = np.log, inverse_transform: callable = np.exp):
 		self.pipeline = None
@@ -29,36 +44,70 @@ class CatBoostRegModel:
 		self.num_features_after_transformation = None
 		self.cat_features_after_transformation = None
 	
-	def fit(self, X: pd.DataFrame, y: pd.Series):
+	def set_n_jobs(self, n_jobs: int) -> 'CatBoostRegModel':
+		self.model.set_params(thread_count=n_jobs)
+		return self
+	
+	def fit_preprocessor(self, X: pd.DataFrame, y: pd.Series, feature_matrix: FeatureMatrix = None) -> tuple[pd.DataFrame, pd.Series]:
+		"""
+		Fit the preprocessor, and return X and y transformed for the booster, which fit_model fits.
+		feature_matrix is the FeatureMatrix of the rows of X saved with the dataset, if it was loaded
+		"""
 		X = X.copy()
 		y = y.copy()
 
 		# Initialize the preprocessor
 		self.preprocessor = self.model_class.get_preprocessor(X)
-		# cat_cols = [f'cat__{col}' for col in X.select_dtypes(include=['object', 'category']).columns.tolist()]
 		
 		# Transform the target
 		if self.transform_target:
 			y = self.transform(y)
-			
-		# Make the pipeline
+		
+		X = self.preprocessor.fit_transform(X, y, feature_engineering__feature_matrix=feature_matrix)
+		return X, y
+	
+	def get_model_fit_params(self) -> dict:
+		"""
+		The parameters of the fit of the booster, which depend on the fitted preprocessor
+		"""
+		return {'cat_features': self.model_class.cat_features_after_transformation}
+	
+	def fit_model(self, X: pd.DataFrame, y: pd.Series) -> 'CatBoostRegModel':
+		"""
+		Fit the booster on the output of fit_preprocessor
+		"""
+		self.model.fit(X, y, **self.get_model_fit_params())
+		return self.set_model(self.model)
+	
+	def set_model(self, model) -> 'CatBoostRegModel':
+		"""
+		Make the pipeline of the fitted preprocessor and of model, a booster fitted on the output of fit_preprocessor,
+		possibly in another process
+		"""
+		self.model = model
 		self.pipeline = pipeline.Pipeline(
 			steps=[
 				('preprocessor', self.preprocessor),
-				('model', self.model)
+				('model', self.model),
 			]
 		)
-		
-		# Fit the pipeline
-		self.pipeline.fit(X, y, model__cat_features=self.model_class.cat_features_after_transformation)
 		return self
 	
-	def predict(self, X: pd.DataFrame) -> np.ndarray:
+	def fit(self, X: pd.DataFrame, y: pd.Series, feature_matrix: FeatureMatrix = None) -> 'CatBoostRegModel':
+		"""
+		Fit the pipeline. feature_matrix is the FeatureMatrix of the rows of X saved with the dataset, if it was loaded
+		"""
+		return self.fit_model(*self.fit_preprocessor(X, y, feature_matrix))
+	
+	def preprocess(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
 		check_is_fitted(self, ['pipeline'])
-		
-		X = X.copy()
-		# Predict
-		y_preds = self.pipeline.predict(X)
+		return _preprocess(self.pipeline.named_steps['preprocessor'], X.copy(), feature_matrix)
+	
+	def predict_preprocessed(self, X: pd.DataFrame) -> np.ndarray:
+		"""
+		Predict the output of preprocess
+		"""
+		y_preds = self.model.predict(X)
 		
 		# Inverse transform the target
 		if self.transform_target:
@@ -66,9 +115,18 @@ class CatBoostRegModel:
 		
 		return y_preds
 	
-	def save_model(self, path: str):
+	def predict(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> np.ndarray:
+		return self.predict_preprocessed(self.preprocess(X, feature_matrix))
+	
+	def save_model(self, path: str, native: bool = True):
+		"""
+		Save the model as a native artifact directory (see src/utils/model_artifacts.py), or pickle the pipeline with joblib
+		"""
 		check_is_fitted(self, ['pipeline'])
-		joblib.dump(self.pipeline, path)
+		if native:
+			save_model_artifact(self.pipeline, path, inverse_transform=self.inverse_transform if self.transform_target else None)
+		else:
+			joblib.dump(self.pipeline, path)
 
 
 class LightGBMRegModel:
@@ -84,7 +142,15 @@ class LightGBMRegModel:
 		self.num_features_after_transformation = None
 		self.cat_features_after_transformation = None
 	
-	def fit(self, X: pd.DataFrame, y: pd.Series):
+	def set_n_jobs(self, n_jobs: int) -> 'LightGBMRegModel':
+		self.model.set_params(n_jobs=n_jobs)
+		return self
+	
+	def fit_preprocessor(self, X: pd.DataFrame, y: pd.Series, feature_matrix: FeatureMatrix = None) -> tuple[pd.DataFrame, pd.Series]:
+		"""
+		Fit the preprocessor, and return X and y transformed for the booster, which fit_model fits.
+		feature_matrix is the FeatureMatrix of the rows of X saved with the dataset, if it was loaded
+		"""
 		X = X.copy()
 		y = y.copy()
 
@@ -94,25 +160,52 @@ class LightGBMRegModel:
 		# Transform the target
 		if self.transform_target:
 			y = self.transform(y)
-			
-		# Make the pipeline
+		
+		X = self.preprocessor.fit_transform(X, y, feature_engineering__feature_matrix=feature_matrix)
+		return X, y
+	
+	def get_model_fit_params(self) -> dict:
+		"""
+		The parameters of the fit of the booster, which depend on the fitted preprocessor
+		"""
+		return {}
+	
+	def fit_model(self, X: pd.DataFrame, y: pd.Series) -> 'LightGBMRegModel':
+		"""
+		Fit the booster on the output of fit_preprocessor
+		"""
+		self.model.fit(X, y, **self.get_model_fit_params())
+		return self.set_model(self.model)
+	
+	def set_model(self, model) -> 'LightGBMRegModel':
+		"""
+		Make the pipeline of the fitted preprocessor and of model, a booster fitted on the output of fit_preprocessor,
+		possibly in another process
+		"""
+		self.model = model
 		self.pipeline = pipeline.Pipeline(
 			steps=[
 				('preprocessor', self.preprocessor),
 				('model', self.model),
 			]
 		)
-		
-		# Fit the pipeline
-		self.pipeline.fit(X, y)
 		return self
 	
-	def predict(self, X: pd.DataFrame) -> np.ndarray:
+	def fit(self, X: pd.DataFrame, y: pd.Series, feature_matrix: FeatureMatrix = None) -> 'LightGBMRegModel':
+		"""
+		Fit the pipeline. feature_matrix is the FeatureMatrix of the rows of X saved with the dataset, if it was loaded
+		"""
+		return self.fit_model(*self.fit_preprocessor(X, y, feature_matrix))
+	
+	def preprocess(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
 		check_is_fitted(self, ['pipeline'])
-		
-		X = X.copy()
-		# Predict
-		y_preds = self.pipeline.predict(X)
+		return _preprocess(self.pipeline.named_steps['preprocessor'], X.copy(), feature_matrix)
+	
+	def predict_preprocessed(self, X: pd.DataFrame) -> np.ndarray:
+		"""
+		Predict the output of preprocess
+		"""
+		y_preds = self.model.predict(X)
 		
 		# Inverse transform the target
 		if self.transform_target:
@@ -120,36 +213,140 @@ class LightGBMRegModel:
 		
 		return y_preds
 	
-	def save_model(self, path: str):
+	def predict(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> np.ndarray:
+		return self.predict_preprocessed(self.preprocess(X, feature_matrix))
+	
+	def save_model(self, path: str, native: bool = True):
+		"""
+		Save the model as a native artifact directory (see src/utils/model_artifacts.py), or pickle the pipeline with joblib
+		"""
 		check_is_fitted(self, ['pipeline'])
-		joblib.dump(self.pipeline, path)
+		if native:
+			save_model_artifact(self.pipeline, path, inverse_transform=self.inverse_transform if self.transform_target else None)
+		else:
+			joblib.dump(self.pipeline, path)
+
+
+ENSEMBLE_MODELS = {
+	'catboost': CatBoostRegModel,
+	'lightgbm': LightGBMRegModel,
+}
+
+
+def split_thread_budget(n_threads: int | None, members: list[str]) -> dict[str, int]:
+	"""
+	Split n_threads (all the cores if None) between the ensemble members, so the models trained at the same time
+	do not use more threads than there are cores. The first members get the threads left over.
+	"""
+	n_threads = n_threads or os.cpu_count() or 1
+	share, left_over = divmod(n_threads, len(members))
+	return {member: max(1, share + (i < left_over)) for i, member in enumerate(members)}
+
+
+def _fit_ensemble_member(
+		booster,
+		fit_params: dict,
+		train_blocks: tuple[dict, dict],
+		test_block: dict | None,
+) -> tuple[object, np.ndarray | None]:
+	# Runs in a worker process which only fits the booster, on numpy views of the data preprocessed once by the parent,
+	# and returns it with its raw predictions on the test data
+	X_train, train_shm = arrays_from_shared_memory(train_blocks[0])
+	y_train, target_shm = arrays_from_shared_memory(train_blocks[1])
+	booster.fit(X_train, y_train.iloc[:, 0], **fit_params)
+	del X_train, y_train
+	train_shm.close()
+	target_shm.close()
+	
+	preds = None
+	if test_block is not None:
+		X_test, test_shm = arrays_from_shared_memory(test_block)
+		preds = booster.predict(X_test)
+		del X_test
+		test_shm.close()
+	return booster, preds
+
+
+def fit_ensemble(
+		X_train: pd.DataFrame,
+		y_train: pd.Series,
+		X_test: pd.DataFrame = None,
+		members: list[str] = None,
+		n_threads: int = None,
+		thread_budget: dict[str, int] = None,
+		feature_matrix_train: FeatureMatrix = None,
+		feature_matrix_test: FeatureMatrix = None,
+) -> dict[str, tuple[CatBoostRegModel | LightGBMRegModel, np.ndarray | None]]:
+	"""
+	Fit the ensemble members at the same time, each in its own process with its share of the threads,
+	and predict X_test with each of them if it is given.
+	The preprocessors are fitted here, the feature engineering only once for all the members thanks to the fit cache,
+	and the preprocessed data is written once to shared memory, so the processes only fit the boosters on views of it.
+	The feature matrices of X_train and X_test, if given, save parsing their feature lists again.
+	
+	Returns
+	-------
+		dict
+			The fitted model and the predictions on X_test (or None) of every member
+	"""
+	members = members or list(ENSEMBLE_MODELS.keys())
+	thread_budget = thread_budget or split_thread_budget(n_threads, members)
+	print(f'Threads of the ensemble members: {thread_budget}')
+	
+	models = {member: ENSEMBLE_MODELS[member](transform_target=True).set_n_jobs(thread_budget[member]) for member in members}
+	blocks = []
+	try:
+		train_blocks, test_blocks = {}, {}
+		for member, model in models.items():
+			X, y = model.fit_preprocessor(X_train, y_train, feature_matrix_train)
+			train_blocks[member] = (arrays_to_shared_memory(X), arrays_to_shared_memory(y.to_frame()))
+			blocks.extend(train_blocks[member])
+			test_blocks[member] = None
+			if X_test is not None:
+				test_blocks[member] = arrays_to_shared_memory(
+					_preprocess(model.preprocessor, X_test.copy(), feature_matrix_test))
+				blocks.append(test_blocks[member])
+		
+		with ProcessPoolExecutor(max_workers=len(members)) as executor:
+			futures = {
+				member: executor.submit(
+					_fit_ensemble_member, model.model, model.get_model_fit_params(), train_blocks[member], test_blocks[member],
+				)
+				for member, model in models.items()
+			}
+			results = {member: future.result() for member, future in futures.items()}
+	finally:
+		for block in blocks:
+			unlink_shared_memory(block['name'])
+	
+	ensemble = {}
+	for member, (booster, preds) in results.items():
+		model = models[member].set_model(booster)
+		if preds is not None and model.transform_target:
+			preds = model.inverse_transform(preds)
+		ensemble[member] = (model, preds)
+	return ensemble
 
 
 def main():
-	# Load the data
-	train, test, _ = load_train_test_valid_data()
+	# Load the data, with the feature lists parsed by prepare_data
+	(train, train_features), (test, test_features), _ = load_train_test_valid_data(with_feature_matrix=True)
 	X_train, y_train = train.drop(columns=TARGET).reset_index(drop=True), train[TARGET].reset_index(drop=True)
 	X_test, y_test = test.drop(columns=TARGET).reset_index(drop=True), test[TARGET].reset_index(drop=True)
 	
 	# Append the rows in X_test to X_train
+	feature_matrix_train = FeatureMatrix.concat([train_features, test_features], index=pd.RangeIndex(len(X_train) + len(X_test)))
+	feature_matrix_test = FeatureMatrix.concat([test_features], index=X_test.index)
 	X_train = pd.concat([X_train, X_test], ignore_index=True)
 	y_train = pd.concat([y_train, y_test], ignore_index=True)
 	
-	# Initialize the models
-	catboost_model = CatBoostRegModel(transform_target=True)
-	lightgbm_model = LightGBMRegModel(transform_target=True)
-	
-	# Fit the models
-	print('Fitting the models...')
-	print('CatBoost')
-	catboost_model.fit(X_train, y_train)
-	print('LightGBM')
-	lightgbm_model.fit(X_train, y_train)
-	
-	# Predict
-	print('Predicting...')
-	catboost_preds = catboost_model.predict(X_test)
-	lightgbm_preds = lightgbm_model.predict(X_test)
+	# Fit the models at the same time and predict
+	print('Fitting the models and predicting...')
+	ensemble = fit_ensemble(
+		X_train, y_train, X_test, feature_matrix_train=feature_matrix_train, feature_matrix_test=feature_matrix_test)
+	print(f'Fitted transformers cache: {get_fit_cache(FIT_CACHE_DIR_PATH).stats()}')
+	catboost_model, catboost_preds = ensemble['catboost']
+	lightgbm_model, lightgbm_preds = ensemble['lightgbm']
 	combined_preds = (catboost_preds + lightgbm_preds) / 2
 	# Evaluate
 	catboost_scores = {
@@ -176,8 +373,8 @@ def main():
 	# Save the models
 	print('Saving the models...')
 	file_ext = datetime.datetime.now().strftime(SAVE_DATE_TIME_FORMAT)
-	catboost_model.save_model(path=os.path.join(MODEL_DIR_PATH, f'catboost_pipeline_{file_ext}.pkl'))
-	lightgbm_model.save_model(path=os.path.join(MODEL_DIR_PATH, f'lightgbm_pipeline_{file_ext}.pkl'))
+	catboost_model.save_model(path=os.path.join(MODEL_DIR_PATH, f'catboost_model_{file_ext}'))
+	lightgbm_model.save_model(path=os.path.join(MODEL_DIR_PATH, f'lightgbm_model_{file_ext}'))
 	print('Done!')
 
 
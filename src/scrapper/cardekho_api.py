@@ -1,83 +1,174 @@
 from __future__ import annotations
 
+import asyncio
 from typing import Any
 
 import httpx
-from params import url_for_details, url as url_for_list
-
-async def get_cars(url: str = None, query_params: dict = None) -> list[dict] | None:
-	# We need a URL to make a request
-	# The API structure needs a query parameter
-	url = url or url_for_list
-	if query_params is None:
-		raise CarDekhoAPIException("No query parameters provided")
-	
-	try:
-		async with httpx.AsyncClient() as client:
-			response = await client.get(url, params=query_params)
-			
-			# If the request is successful, we get a 200 status code
-			if response.status_code == 200:
-				# print("Success")
-				data = response.json()
-				cars = data["data"]["cars"]
-				return cars
-			
-			# !200 status code -> request failed
-			else:
-				failed_data = response.json()
-				raise CarDekhoAPIException("Bad Request", failed_data)
-	except Exception as e:
-		raise CarDekhoAPIException("API Request failed ", e)
-
-
-async def get_car_details(used_car_id: str) -> dict[str, Any]:
-	# Used car ID is required to get the details
-	if used_car_id is None:
-		raise CarDekhoAPIException("No used car id provided")
-	
-	url = url_for_details
-	query_params = {
-		"city_id": "",
-		"lang_code": "en",
-		"regionId": 0,
-		"otherinfo": "detailinfo",
-		"usedcarid": used_car_id,
-		# "device": "Web",
-		# "pageType": "cls",
-		# "devicePlatform": "pwa",
-		# "pageLoadType": "client",
-	}
-	
-	try:
-		async with httpx.AsyncClient() as client:
-			response = await client.get(url, params=query_params)
-			
+
+try:
+	import params
+except ImportError:
+	# Imported as src.scrapper.cardekho_api instead of run from src/scrapper
+	from src.scrapper import params
+
+
+class CarDekhoSession:
+	"""
+	One pooled httpx.AsyncClient shared by all the list and detail calls, so the connections (and their TCP and TLS
+	handshakes) are kept alive and reused instead of opened for every request. Close it with aclose() or use it as
+	an async context manager.
+
+	Parameters
+	----------
+		max_connections: int
+			The maximum number of concurrent connections, the other requests wait for a free one
+		max_keepalive_connections: int
+			The maximum number of idle connections kept open
+		keepalive_expiry: float
+			How long an idle connection is kept open, in seconds
+		timeout: float
+			The timeout of reading, writing and waiting for a connection of the pool, in seconds
+		connect_timeout: float
+			The timeout of opening a connection, in seconds
+		transport: httpx.AsyncBaseTransport
+			A custom transport, e.g. httpx.MockTransport
+	"""
+
+	def __init__(
+			self,
+			max_connections: int = params.max_connections,
+			max_keepalive_connections: int = params.max_keepalive_connections,
+			keepalive_expiry: float = params.keepalive_expiry,
+			timeout: float = params.timeout,
+			connect_timeout: float = params.connect_timeout,
+			transport: httpx.AsyncBaseTransport = None,
+	):
+		self.client = httpx.AsyncClient(
+			limits=httpx.Limits(
+				max_connections=max_connections,
+				max_keepalive_connections=max_keepalive_connections,
+				keepalive_expiry=keepalive_expiry,
+			),
+			timeout=httpx.Timeout(timeout, connect=connect_timeout),
+			transport=transport,
+		)
+		# The requests beyond the pool wait here: the httpx pool scans all its connections for every waiting request
+		# whenever a request ends, which gets slow with the hundreds of requests gathered by the scripts
+		self._slots = asyncio.Semaphore(max_connections)
+
+	@property
+	def is_closed(self) -> bool:
+		return self.client.is_closed
+
+	async def aclose(self) -> None:
+		await self.client.aclose()
+
+	async def __aenter__(self) -> CarDekhoSession:
+		return self
+
+	async def __aexit__(self, *args) -> None:
+		await self.aclose()
+
+	async def _get(self, url: str, query_params: dict, extract: callable):
+		# The value extracted from the JSON of the response, every failure raises a CarDekhoAPIException
+		try:
+			async with self._slots:
+				response = await self.client.get(url, params=query_params)
+
 			# If the request is successful, we get a 200 status code
 			if response.status_code == 200:
-				# print("Success")
-				data = response.json()
-				car = {
-					"overview": data["data"]["dataLayer"],
-					"features": data["data"]["carFeatures"],
-					"specifications": data["data"]["carSpecification"],
-				}
-				return car
-			
+				return extract(response.json())
+
 			# !200 status code -> request failed
 			else:
-				failed_data = response.json()
-				raise CarDekhoAPIException("Bad Request", failed_data)
-	except Exception as e:
-		raise CarDekhoAPIException("API Request failed ", e)
+				try:
+					failed_data = response.json()
+				except ValueError:
+					failed_data = response.text
+				raise CarDekhoAPIException("Bad Request", failed_data, status_code=response.status_code)
+		except Exception as e:
+			raise CarDekhoAPIException("API Request failed ", e, status_code=getattr(e, "status_code", None))
+
+	async def get_cars(self, url: str = None, query_params: dict = None) -> list[dict] | None:
+		# We need a URL to make a request
+		# The API structure needs a query parameter
+		url = url or params.url
+		if query_params is None:
+			raise CarDekhoAPIException("No query parameters provided")
+
+		return await self._get(url, query_params, lambda data: data["data"]["cars"])
+
+	async def get_car_details(self, used_car_id: str, url: str = None) -> dict[str, Any]:
+		# Used car ID is required to get the details
+		if used_car_id is None:
+			raise CarDekhoAPIException("No used car id provided")
+
+		url = url or params.url_for_details
+		query_params = {
+			"city_id": "",
+			"lang_code": "en",
+			"regionId": 0,
+			"otherinfo": "detailinfo",
+			"usedcarid": used_car_id,
+			# "device": "Web",
+			# "pageType": "cls",
+			# "devicePlatform": "pwa",
+			# "pageLoadType": "client",
+		}
+
+		return await self._get(url, query_params, lambda data: {
+			"overview": data["data"]["dataLayer"],
+			"features": data["data"]["carFeatures"],
+			"specifications": data["data"]["carSpecification"],
+		})
+
+
+# The session of the calls which are not given one, created on the first call
+_default_session: CarDekhoSession | None = None
+
+
+def get_default_session() -> CarDekhoSession:
+	global _default_session
+	if _default_session is None or _default_session.is_closed:
+		_default_session = CarDekhoSession()
+	return _default_session
+
+
+async def close_default_session() -> None:
+	"""
+	Close the connections of the default session, at the end of the scraping
+	"""
+	if _default_session is not None:
+		await _default_session.aclose()
+
+
+async def get_cars(url: str = None, query_params: dict = None, session: CarDekhoSession = None) -> list[dict] | None:
+	session = session or get_default_session()
+	return await session.get_cars(url, query_params)
+
+
+async def get_car_details(used_car_id: str, session: CarDekhoSession = None) -> dict[str, Any]:
+	session = session or get_default_session()
+	return await session.get_car_details(used_car_id)
 
 
 # Make an Exception class to handle errors
 class CarDekhoAPIException(Exception):
-	def __init__(self, message: str, data=None):
+	def __init__(self, message: str, data=None, status_code: int = None):
 		self.message = message
 		self.data = data
+		self.status_code = status_code
 		super().__init__(self.message)
-	
+
+	@property
+	def throttled(self) -> bool:
+		# The API is rate limiting or overloaded
+		return self.status_code is not None and (self.status_code == 429 or self.status_code >= 500)
+
+	@property
+	def retryable(self) -> bool:
+		# Throttled, or the connection failed or timed out
+		return self.throttled or isinstance(self.data, httpx.TransportError)
+
 	def __str__(self):
 		return f"{self.message}"
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+
+try:
+	import params
+	from cardekho_api import CarDekhoAPIException
+except ImportError:
+	# Imported as src.scrapper.crawl_scheduler instead of run from src/scrapper
+	from src.scrapper import params
+	from src.scrapper.cardekho_api import CarDekhoAPIException
+
+
+class TokenBucket:
+	"""
+	Lets through rate calls per second on average, with bursts of up to one second of calls. The rate can be changed
+	at any time. The callers waiting for a token are served in order.
+	"""
+
+	def __init__(self, rate: float):
+		self.rate = rate
+		self.tokens = self.capacity
+		self.updated = time.monotonic()
+		self.lock = asyncio.Lock()
+
+	@property
+	def capacity(self) -> float:
+		return max(1.0, self.rate)
+
+	def _refill(self) -> None:
+		now = time.monotonic()
+		self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+		self.updated = now
+
+	async def acquire(self) -> None:
+		async with self.lock:
+			self._refill()
+			while self.tokens < 1:
+				await asyncio.sleep((1 - self.tokens) / self.rate)
+				self._refill()
+			self.tokens -= 1
+
+
+class CrawlScheduler:
+	"""
+	Runs the API calls of the crawl with at most max_concurrency of them at a time, at a rate limited by a token bucket.
+	The rate adapts like TCP congestion control: it starts slowly and doubles every second until the first throttled call
+	(429 or 5xx), then every successful call adds rate_increase / rate to it, so about rate_increase per second (additive
+	increase), and a throttled call multiplies it by rate_decrease, at most once per second (multiplicative decrease).
+	The calls which fail on a retryable error are retried after a random backoff (full jitter), up to max_retries times.
+
+	Parameters
+	----------
+		max_concurrency: int
+			The maximum number of calls running at the same time
+		rate: float
+			The starting rate, in calls per second
+		min_rate, max_rate: float
+			The bounds of the rate
+		rate_increase: float
+			How much the rate grows per second without throttling, in calls per second
+		rate_decrease: float
+			The factor applied to the rate when a call is throttled
+		max_retries: int
+			How many times a call is retried before its error is raised
+		retry_base_delay, retry_max_delay: float
+			The backoff of the n-th retry is random, up to retry_base_delay * 2 ** n seconds and at most retry_max_delay
+	"""
+
+	def __init__(
+			self,
+			max_concurrency: int = params.crawl_max_concurrency,
+			rate: float = params.crawl_rate,
+			min_rate: float = params.crawl_min_rate,
+			max_rate: float = params.crawl_max_rate,
+			rate_increase: float = params.crawl_rate_increase,
+			rate_decrease: float = params.crawl_rate_decrease,
+			max_retries: int = params.crawl_max_retries,
+			retry_base_delay: float = params.crawl_retry_base_delay,
+			retry_max_delay: float = params.crawl_retry_max_delay,
+	):
+		self.semaphore = asyncio.Semaphore(max_concurrency)
+		self.bucket = TokenBucket(rate)
+		self.min_rate = min_rate
+		self.max_rate = max_rate
+		self.rate_increase = rate_increase
+		self.rate_decrease = rate_decrease
+		self.max_retries = max_retries
+		self.retry_base_delay = retry_base_delay
+		self.retry_max_delay = retry_max_delay
+		self.last_decrease = -float("inf")
+		self.slow_start = True
+		self.started = time.monotonic()
+		self.stats = {"calls": 0, "succeeded": 0, "throttled": 0, "retried": 0, "failed": 0, "rate_decreases": 0}
+
+	@property
+	def rate(self) -> float:
+		return self.bucket.rate
+
+	def _on_success(self) -> None:
+		# In the slow start every call adds 1, so rate calls per second double the rate
+		increase = 1 if self.slow_start else self.rate_increase / self.bucket.rate
+		self.bucket.rate = min(self.max_rate, self.bucket.rate + increase)
+
+	def _on_throttled(self) -> None:
+		# The calls already running when the API starts throttling fail together, count them as one signal
+		self.slow_start = False
+		now = time.monotonic()
+		if now - self.last_decrease >= 1:
+			self.bucket.rate = max(self.min_rate, self.bucket.rate * self.rate_decrease)
+			self.last_decrease = now
+			self.stats["rate_decreases"] += 1
+
+	def _get_backoff(self, attempt: int) -> float:
+		return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+	async def run(self, call: callable, *args, **kwargs):
+		"""
+		Await call(*args, **kwargs) within the limits of the scheduler, retrying it on retryable CarDekhoAPIException
+		"""
+		for attempt in range(self.max_retries + 1):
+			async with self.semaphore:
+				await self.bucket.acquire()
+				self.stats["calls"] += 1
+				try:
+					result = await call(*args, **kwargs)
+				except CarDekhoAPIException as e:
+					if e.throttled:
+						self.stats["throttled"] += 1
+						self._on_throttled()
+					if not e.retryable or attempt == self.max_retries:
+						self.stats["failed"] += 1
+						raise
+				else:
+					self.stats["succeeded"] += 1
+					self._on_success()
+					return result
+			# Wait outside of the semaphore, so the other calls can go on
+			self.stats["retried"] += 1
+			await asyncio.sleep(self._get_backoff(attempt))
+
+	def get_stats(self) -> dict:
+		elapsed = time.monotonic() - self.started
+		return {
+			**self.stats,
+			"rate": self.rate,
+			"succeeded_per_second": self.stats["succeeded"] / elapsed if elapsed > 0 else 0.0,
+		}
@@ -0,0 +1,126 @@
+from __future__ import annotations
+
+import random
+import sqlite3
+import time
+
+try:
+	import params
+except ImportError:
+	# Imported as src.scrapper.detail_queue instead of run from src/scrapper
+	from src.scrapper import params
+
+PENDING = "pending"
+DONE = "done"
+FAILED = "failed"
+
+
+class DetailWorkQueue:
+	"""
+	A durable queue of the used car IDs whose details are fetched, in a SQLite file, so a run which stops resumes
+	where it was: the done IDs are skipped, and the failed ones are retried after an exponential backoff with jitter,
+	up to max_attempts times.
+
+	Parameters
+	----------
+		path: str
+			The SQLite file, created if it does not exist
+		max_attempts: int
+			How many times an ID is fetched before it is left failed
+		retry_base_delay, retry_max_delay: float
+			The n-th retry of an ID waits between half and all of retry_base_delay * 2 ** (n - 1) seconds, at most retry_max_delay
+	"""
+
+	def __init__(
+			self,
+			path: str = params.details_queue_path,
+			max_attempts: int = params.details_max_attempts,
+			retry_base_delay: float = params.details_retry_base_delay,
+			retry_max_delay: float = params.details_retry_max_delay,
+	):
+		self.max_attempts = max_attempts
+		self.retry_base_delay = retry_base_delay
+		self.retry_max_delay = retry_max_delay
+		self.connection = sqlite3.connect(path)
+		# The write-ahead log keeps the file consistent if the process is killed during a commit
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS cars ("
+			"used_car_id TEXT PRIMARY KEY, status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+			"next_attempt REAL NOT NULL DEFAULT 0, error TEXT)"
+		)
+		self.connection.execute("CREATE INDEX IF NOT EXISTS cars_status ON cars (status, next_attempt)")
+		self.connection.commit()
+
+	def add(self, used_car_ids: list[str]) -> int:
+		"""
+		Queue the IDs which are not in the queue yet, the others keep their status. Returns the number of new IDs.
+		"""
+		before = self.connection.total_changes
+		with self.connection:
+			self.connection.executemany(
+				"INSERT OR IGNORE INTO cars (used_car_id, status) VALUES (?, ?)",
+				((str(used_car_id), PENDING) for used_car_id in used_car_ids),
+			)
+		return self.connection.total_changes - before
+
+	def requeue(self, used_car_ids: list[str]) -> None:
+		"""
+		Fetch the IDs again whatever their status, e.g. the listings which changed since their details were fetched
+		"""
+		with self.connection:
+			self.connection.executemany(
+				"UPDATE cars SET status = ?, attempts = 0, next_attempt = 0, error = NULL WHERE used_car_id = ?",
+				((PENDING, str(used_car_id)) for used_car_id in used_car_ids),
+			)
+
+	def get_batch(self, size: int) -> list[str]:
+		"""
+		The next IDs to fetch: the pending ones, then the failed ones whose backoff is over
+		"""
+		rows = self.connection.execute(
+			"SELECT used_car_id FROM cars WHERE status = ? OR (status = ? AND attempts < ? AND next_attempt <= ?) "
+			"ORDER BY status = ? DESC, rowid LIMIT ?",
+			(PENDING, FAILED, self.max_attempts, time.time(), PENDING, size),
+		)
+		return [used_car_id for used_car_id, in rows]
+
+	def get_next_retry_delay(self) -> float | None:
+		"""
+		The seconds until the next failed ID can be retried, None if there is none left to retry
+		"""
+		next_attempt, = self.connection.execute(
+			"SELECT MIN(next_attempt) FROM cars WHERE status = ? AND attempts < ?", (FAILED, self.max_attempts)
+		).fetchone()
+		return None if next_attempt is None else max(0.0, next_attempt - time.time())
+
+	def mark_done(self, used_car_ids: list[str]) -> None:
+		with self.connection:
+			self.connection.executemany(
+				"UPDATE cars SET status = ?, attempts = attempts + 1, error = NULL WHERE used_car_id = ?",
+				((DONE, str(used_car_id)) for used_car_id in used_car_ids),
+			)
+
+	def mark_failed(self, used_car_ids: list[str], error: str = None) -> None:
+		now = time.time()
+		with self.connection:
+			for used_car_id in used_car_ids:
+				attempts, = self.connection.execute(
+					"SELECT attempts FROM cars WHERE used_car_id = ?", (str(used_car_id),)
+				).fetchone()
+				delay = min(self.retry_max_delay, self.retry_base_delay * 2 ** attempts)
+				self.connection.execute(
+					"UPDATE cars SET status = ?, attempts = ?, next_attempt = ?, error = ? WHERE used_car_id = ?",
+					(FAILED, attempts + 1, now + random.uniform(delay / 2, delay), error, str(used_car_id)),
+				)
+
+	def get_counts(self) -> dict[str, int]:
+		counts = {PENDING: 0, DONE: 0, FAILED: 0}
+		counts.update(self.connection.execute("SELECT status, COUNT(*) FROM cars GROUP BY status"))
+		counts["given_up"], = self.connection.execute(
+			"SELECT COUNT(*) FROM cars WHERE status = ? AND attempts >= ?", (FAILED, self.max_attempts)
+		).fetchone()
+		return counts
+
+	def close(self) -> None:
+		self.connection.close()
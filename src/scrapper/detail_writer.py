@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import csv
+import json
+import os
+
+try:
+	import params
+except ImportError:
+	# Imported as src.scrapper.detail_writer instead of run from src/scrapper
+	from src.scrapper import params
+
+# The first columns of the details, the keys of the specifications and the overview follow in the order they are first seen
+LEADING_COLUMNS = [
+	"usedCarSkuId", "top_features", "comfort_features", "interior_features", "exterior_features", "safety_features",
+]
+OUTPUT_FORMATS = ["csv", "parquet"]
+
+
+def _to_cell(value) -> str | None:
+	# The text of a value like pandas writes it to a CSV, the feature lists as their Python representation
+	if value is None:
+		return None
+	if isinstance(value, str):
+		return value
+	return str(value)
+
+
+class DetailWriter:
+	"""
+	Appends the details of the cars, one batch at a time, to an append-only JSON lines log which survives a crash,
+	and builds the final file from it in two streaming passes, without ever holding all the cars in memory:
+	the first pass finds the columns (the union of the keys of the cars) and the last line of every car,
+	the second one writes the rows with that fixed schema, in chunks (row groups for Parquet).
+
+	Parameters
+	----------
+		path: str
+			The JSON lines log, appended to if it exists, after dropping the partial last line of a crashed run
+	"""
+
+	def __init__(self, path: str = params.details_results_path):
+		self.path = path
+		self._truncate_torn_line()
+		self.file = open(path, "a")
+
+	def _truncate_torn_line(self) -> None:
+		# A process killed while writing a batch leaves a partial last line, the next batch would be appended to it
+		if not os.path.exists(self.path):
+			return
+		with open(self.path, "rb+") as f:
+			end = f.seek(0, os.SEEK_END)
+			# Look for the last newline from the end, one block at a time
+			position = end
+			while position > 0:
+				step = min(4096, position)
+				f.seek(position - step)
+				newline = f.read(step).rfind(b"\n")
+				if newline != -1:
+					position = position - step + newline + 1
+					break
+				position -= step
+			if position < end:
+				print(f"Dropped the partial last line of {self.path}, {end - position} bytes written by a crashed run")
+				f.truncate(position)
+
+	def write_batch(self, cars: list[dict]) -> None:
+		"""
+		Append the cars and flush them to the disk
+		"""
+		self.file.write("".join(json.dumps(car) + "\n" for car in cars))
+		self.file.flush()
+		os.fsync(self.file.fileno())
+
+	def close(self) -> None:
+		self.file.close()
+
+	def __enter__(self) -> DetailWriter:
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback) -> None:
+		self.close()
+
+	def _read_lines(self):
+		with open(self.path) as f:
+			for i, line in enumerate(f):
+				if line.strip():
+					yield i, json.loads(line)
+
+	def get_schema(self) -> tuple[list[str], dict[str, int]]:
+		"""
+		The columns of the cars, and the line of the last details of every car: a car fetched again after a crash
+		is in the log twice
+		"""
+		columns = dict.fromkeys(LEADING_COLUMNS)
+		last_lines = {}
+		for i, car in self._read_lines():
+			columns.update(dict.fromkeys(car))
+			last_lines[car["usedCarSkuId"]] = i
+		return list(columns), last_lines
+
+	def _iter_rows(self, columns: list[str], last_lines: dict[str, int]):
+		for i, car in self._read_lines():
+			if last_lines[car["usedCarSkuId"]] == i:
+				yield [_to_cell(car.get(column)) for column in columns]
+
+	def export(self, output_path: str, output_format: str = "csv", chunk_size: int = params.details_step_size) -> int:
+		"""
+		Write the cars of the log to output_path, once each, and return their number
+		"""
+		if output_format not in OUTPUT_FORMATS:
+			raise ValueError(f"Unknown output format {output_format}, should be one of {OUTPUT_FORMATS}")
+		self.file.flush()
+		columns, last_lines = self.get_schema()
+		rows = self._iter_rows(columns, last_lines)
+
+		if output_format == "csv":
+			with open(output_path, "w", newline="") as f:
+				writer = csv.writer(f)
+				writer.writerow(columns)
+				writer.writerows(rows)
+			return len(last_lines)
+
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+		# All the columns are text, like in the CSV, so every row group has the same schema
+		schema = pa.schema([(column, pa.string()) for column in columns])
+		with pq.ParquetWriter(output_path, schema) as writer:
+			def write_row_group(chunk: list[list]) -> None:
+				writer.write_table(pa.Table.from_arrays([pa.array(values, pa.string()) for values in zip(*chunk)], schema=schema))
+
+			chunk = []
+			for row in rows:
+				chunk.append(row)
+				if len(chunk) == chunk_size:
+					write_row_group(chunk)
+					chunk = []
+			if chunk:
+				write_row_group(chunk)
+		return len(last_lines)
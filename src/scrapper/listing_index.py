@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import time
+
+try:
+	import params
+except ImportError:
+	# Imported as src.scrapper.listing_index instead of run from src/scrapper
+	from src.scrapper import params
+
+NEW = "new"
+CHANGED = "changed"
+
+
+def get_content_hash(car: dict, volatile_keys: list[str] = params.listing_volatile_keys) -> str:
+	"""
+	The hash of the content of a listing, without its volatile keys which change without the car changing
+	"""
+	content = {key: value for key, value in car.items() if key not in volatile_keys}
+	return hashlib.sha1(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class ListingIndex:
+	"""
+	The listings seen by the previous scrapes, with the hash of their content, in a SQLite file, for the incremental
+	scrapes which only keep the new and changed listings.
+
+	Parameters
+	----------
+		path: str
+			The SQLite file, created if it does not exist
+	"""
+
+	def __init__(self, path: str = params.listing_index_path):
+		self.connection = sqlite3.connect(path)
+		self.connection.execute(
+			"CREATE TABLE IF NOT EXISTS listings ("
+			"used_car_id TEXT PRIMARY KEY, content_hash TEXT NOT NULL, first_seen REAL NOT NULL, last_seen REAL NOT NULL)"
+		)
+		self.connection.commit()
+
+	def _get_hashes(self, used_car_ids: list[str]) -> dict[str, str]:
+		hashes = {}
+		# SQLite limits the number of parameters of a query
+		for i in range(0, len(used_car_ids), 500):
+			chunk = used_car_ids[i:i + 500]
+			hashes.update(self.connection.execute(
+				f"SELECT used_car_id, content_hash FROM listings WHERE used_car_id IN ({', '.join('?' * len(chunk))})", chunk
+			))
+		return hashes
+
+	def is_unchanged(self, cars: list[dict]) -> bool:
+		"""
+		Whether all the listings were already seen with the same content, e.g. a page past which the incremental scrape stops
+		"""
+		hashes = self._get_hashes([str(car["usedCarSkuId"]) for car in cars])
+		return all(hashes.get(str(car["usedCarSkuId"])) == get_content_hash(car) for car in cars)
+
+	def get_delta(self, cars: list[dict]) -> list[dict]:
+		"""
+		The new and changed listings, once each, with their "delta" (new or changed)
+		"""
+		cars = list({str(car["usedCarSkuId"]): car for car in cars}.values())
+		hashes = self._get_hashes([str(car["usedCarSkuId"]) for car in cars])
+		delta = []
+		for car in cars:
+			content_hash = hashes.get(str(car["usedCarSkuId"]))
+			if content_hash is None:
+				delta.append({**car, "delta": NEW})
+			elif content_hash != get_content_hash(car):
+				delta.append({**car, "delta": CHANGED})
+		return delta
+
+	def update(self, cars: list[dict]) -> None:
+		"""
+		Record the content of the listings, once they are saved
+		"""
+		now = time.time()
+		with self.connection:
+			self.connection.executemany(
+				"INSERT INTO listings (used_car_id, content_hash, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+				"ON CONFLICT (used_car_id) DO UPDATE SET content_hash = excluded.content_hash, last_seen = excluded.last_seen",
+				(
+					(str(car["usedCarSkuId"]), get_content_hash({k: v for k, v in car.items() if k != "delta"}), now, now)
+					for car in cars
+				),
+			)
+
+	def __len__(self) -> int:
+		return self.connection.execute("SELECT COUNT(*) FROM listings").fetchone()[0]
+
+	def close(self) -> None:
+		self.connection.close()
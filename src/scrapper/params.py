@@ -1,6 +1,51 @@
 url = "https://listing.cardekho.com/v5/srp/cardekho"
 url_for_details = "https://listing.cardekho.com/v2/vdp/detail"
 
+# The connection pool of the CarDekhoSession in cardekho_api.py, more connections cost more CPU per request in httpx
+max_connections = 20
+max_keepalive_connections = 20
+keepalive_expiry = 30  # seconds
+timeout = 30  # seconds
+connect_timeout = 10  # seconds
+
+# The CrawlScheduler of save_cars.py in crawl_scheduler.py, the rates are in calls per second
+crawl_max_concurrency = 20
+crawl_rate = 10
+crawl_min_rate = 1
+crawl_max_rate = 100
+crawl_rate_increase = 1
+crawl_rate_decrease = 0.5
+crawl_max_retries = 5
+crawl_retry_base_delay = 0.5  # seconds
+crawl_retry_max_delay = 30  # seconds
+
+# The resumable detail fetching of save_car_details.py, see detail_queue.py
+# The listings whose details are fetched, e.g. the delta file of an incremental scrape of save_cars.py
+details_ids_path = "../data/cardekho_all_cars.csv"
+details_queue_path = "../data/car_details_queue.sqlite"
+details_results_path = "../data/car_details.jsonl"
+details_output_path = "../data/car_details.csv"
+details_output_format = "csv"  # or "parquet", see detail_writer.py
+details_step_size = 200
+details_max_attempts = 5
+details_retry_base_delay = 30  # seconds
+details_retry_max_delay = 600  # seconds
+
+# The incremental scrapes of save_cars.py, which only save the new and changed listings, see listing_index.py
+listing_incremental = False
+listing_index_path = "../data/listing_index.sqlite"
+# The keys of the listings which change without the car changing, left out of their content hash
+listing_volatile_keys = []
+
+# The adaptive partitioning of the searches of save_cars.py, see search_partitioner.py
+# One sort order of a search lists at most this many cars, see the pagination in cardekho-api-info.txt
+partition_result_cap = 1760
+# The facets the searches over the cap are split by, in order. The owners and the cities are only the common ones, the
+# searches are not split by them, which would leave out the cars of the others
+partition_facets = ["fuel_type", "body_type", "brand", "transmission_type"]
+partition_tree_path = "../data/partition_tree.json"
+partition_reprobe_fraction = 0.8
+
 common_cities = [
     "Ahmedabad",  # base
     "Bangalore",
@@ -5,16 +5,25 @@ from typing import Any
 import pandas as pd
 import asyncio
 
-from cardekho_api import get_car_details, CarDekhoAPIException
+from cardekho_api import get_car_details, close_default_session, CarDekhoAPIException
+from detail_queue import DetailWorkQueue
+from detail_writer import DetailWriter
+from listing_index import CHANGED
+import params
 
 
 async def main():
+    # The IDs already done in a previous run are skipped, the failed ones are retried
+    queue = DetailWorkQueue()
     # Read the used card ID from a CSV file
-    cars_list_df = pd.read_csv("../data/cardekho_all_cars.csv")
-    used_car_ids = cars_list_df["usedCarSkuId"].tolist()
-    all_car_details_df = pd.DataFrame()
+    cars_list_df = pd.read_csv(params.details_ids_path, usecols=lambda column: column in ("usedCarSkuId", "delta"))
+    new_ids = queue.add(cars_list_df["usedCarSkuId"].tolist())
+    # The delta of an incremental scrape has the changed cars, their details are fetched again
+    if "delta" in cars_list_df:
+        queue.requeue(cars_list_df.loc[cars_list_df["delta"] == CHANGED, "usedCarSkuId"].tolist())
     # Delete car_list_df to free up memory
     del cars_list_df
+    print(f"{new_ids} new cars queued. Queue: {queue.get_counts()}")
 
     # Create a function to get the car details
     async def get_transformed_car_details(used_car_id: str) -> dict[str, Any] | None:
@@ -24,39 +33,40 @@ async def main():
 
     count = 0
     failed = 0
-    step_size = 200
-    # Break the task into smaller tasks
-    for i in range(0, len(used_car_ids), step_size):
-        tasks = []
-        for used_car_id in used_car_ids[i:i+step_size]:
-            tasks.append(get_transformed_car_details(used_car_id))
-
-        cars_details_tasks_result = await asyncio.gather(*tasks)
-        cars_details = [
-            car for car in cars_details_tasks_result if car is not None]
-        count += len(cars_details)
-        failed += len(tasks) - len(cars_details)
-
-        # Append the details to a CSV file
-        cars_details_df = pd.DataFrame(cars_details)
-        all_car_details_df = pd.concat([all_car_details_df, cars_details_df])
-        
-        # cars_details_df.to_csv("../data/cardekho_all_cars_details.csv", mode="a", header=False, index=False)
-        print(f"{len(cars_details)} successful, {len(tasks) - len(cars_details)} failed.  Total successful: {count}, total failed: {failed}. \t Dataframe size: {all_car_details_df.shape[0]}")
-
-    # Do the remaining cars manually
-    for used_car_id in used_car_ids[count:]:
-        car = await get_transformed_car_details(used_car_id)
-        cars_details = car_api_transform(car, used_car_id)
-        if cars_details is None:
-            continue
-        cars_list_df = pd.DataFrame(cars_details)
-        all_car_details_df = pd.concat([all_car_details_df, cars_details_df])
-        # cars_list_df.to_csv("cardekho_all_cars_details_last.csv", header=True, index=False)
-        count += 1
-
-    all_car_details_df.to_csv("../data/car_details.csv", index=False)
-    print(f"Exiting the program. Total cars fetched: {count}, total failed: {failed}")
+    # The details are appended to the results file as they arrive, a run which stops loses nothing it has fetched
+    with DetailWriter() as writer:
+        while True:
+            used_car_ids = queue.get_batch(params.details_step_size)
+            if not used_car_ids:
+                # Only failed cars are left, wait for the end of their backoff
+                retry_delay = queue.get_next_retry_delay()
+                if retry_delay is None:
+                    break
+                print(f"Retrying the failed cars in {retry_delay:.0f}s...")
+                await asyncio.sleep(retry_delay)
+                continue
+
+            cars_details = await asyncio.gather(*[get_transformed_car_details(used_car_id) for used_car_id in used_car_ids])
+            done_ids = [used_car_id for used_car_id, car in zip(used_car_ids, cars_details) if car is not None]
+            failed_ids = [used_car_id for used_car_id, car in zip(used_car_ids, cars_details) if car is None]
+
+            # Write the details before marking their IDs done: a crash in between fetches them again instead of losing them
+            writer.write_batch([car for car in cars_details if car is not None])
+            queue.mark_done(done_ids)
+            queue.mark_failed(failed_ids, error="API call or transform failed")
+
+            count += len(done_ids)
+            failed += len(failed_ids)
+            print(f"{len(done_ids)} successful, {len(failed_ids)} failed.  Total successful: {count}, total failed: {failed}.")
+
+        # All the calls share the connections of the default session
+        await close_default_session()
+        print(f"Queue: {queue.get_counts()}")
+        queue.close()
+
+        # Streamed from the log of the details, the cars are never all in memory
+        n_cars = writer.export(params.details_output_path, params.details_output_format)
+    print(f"Exiting the program. Cars fetched in this run: {count}, failed: {failed}. Total cars saved: {n_cars}")
 
 
 async def call_cardekho_details_api(used_car_id: str) -> dict[str, Any] | None:
@@ -6,9 +6,17 @@ import logging
 
 import pandas as pd
 
-from cardekho_api import get_cars, CarDekhoAPIException
+from cardekho_api import get_cars, close_default_session, CarDekhoAPIException
+from crawl_scheduler import CrawlScheduler
+from listing_index import ListingIndex
+from search_partitioner import SearchPartitioner
 import params
 
+# All the searches share the limits on the concurrent calls and on the rate of the API calls
+crawl_scheduler = CrawlScheduler()
+# The incremental scrapes only keep the listings which are new or changed since the previous scrapes
+listing_index = ListingIndex() if params.listing_incremental else None
+
 
 async def call_cardekho_api(city_id: int, search_string: str, pageFrom: int, pagination: str, sort_order: str = "desc") -> dict | None:
     query_params = {
@@ -29,7 +37,7 @@ async def call_cardekho_api(city_id: int, search_string: str, pageFrom: int, pag
     }
 
     try:
-        result = await get_cars(params.url, query_params)
+        result = await crawl_scheduler.run(get_cars, params.url, query_params)
         return result
     except CarDekhoAPIException as e:
         # Log the error in a file
@@ -39,7 +47,7 @@ async def call_cardekho_api(city_id: int, search_string: str, pageFrom: int, pag
         return None
 
 
-async def get_all_cars(city_id: int | None, search_string: str) -> list:
+async def get_all_cars(city_id: int | None, search_string: str, sort_orders: tuple[str, ...] = ("desc", "asc")) -> list:
     count = 0
     pageFrom = 20
     best = 14
@@ -50,7 +58,9 @@ async def get_all_cars(city_id: int | None, search_string: str) -> list:
 
     results = []
 
-    for sort_order in ["desc", "asc"]:
+    for sort_order in sort_orders:
+        # In an incremental scrape, the pages after a page of unchanged listings were seen by the previous scrapes
+        up_to_date = False
         # Get the first batch of cars
         while True:
             pagination = '{"best":' + str(best) + ',"normal":' + str(normal) + ',"ftIndv":' + str(
@@ -59,8 +69,15 @@ async def get_all_cars(city_id: int | None, search_string: str) -> list:
             # Get the cars from the API
             result = await call_cardekho_api(city_id, search_string, pageFrom, pagination, sort_order=sort_order)
             
+            # The call failed even after the retries of the scheduler, the rest of this search is lost
+            if result is None:
+                print(f"Stopped the search {search_string} at page {pageFrom} after failed API calls")
+                break
             # If there are no more cars, break the loop
-            if result is None or len(result) == 0:
+            if len(result) == 0:
+                break
+            if listing_index is not None and listing_index.is_unchanged(result):
+                up_to_date = True
                 break
             results.extend(result)  # Add the cars to the results
             # If there are less than 20 cars, that means we have reached the end of the list
@@ -78,15 +95,22 @@ async def get_all_cars(city_id: int | None, search_string: str) -> list:
         ftDl = 7
         ftPosMod = 1
 
-        while True:
+        while not up_to_date:
             pagination = '{"best":' + str(best) + ',"normal":' + str(normal) + ',"ftIndv":' + str(
                 ftIndv) + ',"ftDl":' + str(ftDl) + ',"ftPosMod":' + str(ftPosMod) + '}'
 
             # Get the cars from the API
             result = await call_cardekho_api(city_id, search_string, pageFrom, pagination, sort_order=sort_order)
 
+            # The call failed even after the retries of the scheduler, the rest of this search is lost
+            if result is None:
+                print(f"Stopped the search {search_string} at page {pageFrom} after failed API calls")
+                break
             # If there are no more cars, break the loop
-            if result is None or len(result) == 0:
+            if len(result) == 0:
+                break
+            if listing_index is not None and listing_index.is_unchanged(result):
+                up_to_date = True
                 break
             results.extend(result)  # Add the cars to the results
             # If there are less than 20 cars, that means we have reached the end of the list
@@ -103,6 +127,40 @@ async def get_all_cars(city_id: int | None, search_string: str) -> list:
     return results
 
 
+def get_search(filters: dict[str, str]) -> tuple[int | None, str]:
+    # The city ID and the search string of a partition, the whole country when it has no city
+    city = filters.get("city")
+    city_id = params.common_city_ids.get(city) if city is not None else None
+    # used-cars+in+india+sedan+automatic+first-owner+honda+petrol
+    search_string = "+".join(
+        value.replace(" ", "-").lower()
+        for value in ["used-cars", "in", city or "india", *(filters.get(facet) for facet in ["body_type", "transmission_type", "owner", "brand", "fuel_type"])]
+        if value is not None
+    )
+    return city_id, search_string
+
+
+async def probe_search(filters: dict[str, str]) -> bool:
+    # The last page one sort order lists, see cardekho-api-info.txt: a full page means the search has more cars than the cap
+    page_from = params.partition_result_cap - 20
+    page = (page_from - 460) // 20
+    pagination = '{"best":439,"normal":' + str(12 + 15 * page) + ',"ftIndv":' + str(min(2 + page, 7)) + ',"ftDl":' + str(
+        7 + 5 * page) + ',"ftPosMod":1}'
+    result = await call_cardekho_api(*get_search(filters), page_from, pagination)
+    # A failed probe splits the search, its partitions still cover it
+    return result is None or len(result) == 20
+
+
+async def fetch_search(filters: dict[str, str], capped: bool) -> list[dict]:
+    # One sort order lists all the cars of a search under the cap, the other one adds the cars past its last page
+    return await get_all_cars(*get_search(filters), sort_orders=("desc", "asc") if capped else ("desc",))
+
+
+def make_partitioner(**kwargs) -> SearchPartitioner:
+    # The incremental scrapes stop at the first unchanged page, they do not count the cars of the partitions
+    return SearchPartitioner(probe_search, fetch_search, complete_fetches=listing_index is None, **kwargs)
+
+
 async def search_cars(
       cities: list[str] = None,
       brands: list[str] = None,
@@ -111,163 +169,61 @@ async def search_cars(
       body_types: list[str] = None,
       owners: list[str] = None,
 ) -> list[dict]:
-        
-    tasks = []
-    all_cars = []
+    # The given facets limit the search space, the others are only split where the searches are over the cap
+    restricted = {
+        facet: values
+        for facet, values in [
+            ("city", cities), ("brand", brands), ("fuel_type", fuel_types),
+            ("transmission_type", transmission_types), ("body_type", body_types), ("owner", owners),
+        ]
+        if values is not None
+    }
     print("Searching for cars in the following cases: ")
-    print(f"Cities: {cities}")
-    print(f"Brands: {brands}")
-    print(f"Fuel Types: {fuel_types}")
-    print(f"Transmission Types: {transmission_types}")
-    print(f"Body Types: {body_types}")
-    print(f"Owners: {owners}")
-    print(f"Total number of cases: {len(cities) * len(brands) * len(fuel_types) * len(transmission_types) * len(body_types) * len(owners)}")
-    
+    for facet, values in restricted.items():
+        print(f"{facet}: {values}")
+
     print("\n\n------------------------------------\n\n")
-    
-    for city in cities:
-        city_id = params.common_city_ids.get(city)
-        city = city.replace(" ", "-").lower()
 
-        for brand in brands:
-            brand = brand.replace(" ", "-").lower()
-            
-            for fuel_type in fuel_types:
-                fuel_type = fuel_type.replace(" ", "-").lower()
-                
-                for transmission_type in transmission_types:
-                    transmission_type = transmission_type.replace(" ", "-").lower()
-                    
-                    for body_type in body_types:
-                        body_type = body_type.replace(" ", "-").lower()
-                        
-                        for owner in owners:
-                            owner = owner.replace(" ", "-").lower()
-                            # used-cars+in+india+sedan+automatic+first-owner+honda+petrol
-                            search_string = f"used-cars+in+{city}+{body_type}+{transmission_type}+{owner}+{brand}+{fuel_type}"
-                            # all_cars.extend(await get_all_cars(city_id, search_string))
-                            tasks.append(asyncio.create_task(get_all_cars(city_id, search_string)))
-    
-    all_cars_lists = await asyncio.gather(*tasks)
-    
-    # Flatten the list of lists into a single list of cars
-    all_cars = [car for cars_list in all_cars_lists for car in cars_list]
-    
+    # The partition tree of a restricted search is not the one of the whole listing, it is not recorded
+    partitioner = make_partitioner(restricted=restricted, tree_path=None)
+    all_cars = await partitioner.crawl()
+    print(f"Partitions: {partitioner.get_stats()}")
     return all_cars
 
 
+def save_cars_file(cars: list[dict], name: str) -> str:
+    # In an incremental scrape, only the new and changed cars are saved, with their delta, to a cardekho_<name>_delta file
+    if listing_index is not None:
+        seen_cars = cars
+        cars = listing_index.get_delta(seen_cars)
+        name = f"{name}_delta"
+        print(f"{len(cars)} new or changed cars out of {len(seen_cars)}")
+
+    df = pd.DataFrame(cars)
+    # Make the file name have the current date and time
+    filename = f"cardekho_{name}_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
+    df.to_csv(f"../data/{filename}", index=False)
+
+    # The cars are only recorded as seen once they are saved
+    if listing_index is not None:
+        listing_index.update(seen_cars)
+    return filename
+
+
 async def main():
-    base_case_tasks = []
-    
-    # BASE CASES
-    # Definition: Base cases are the cars less than 3500 in number in the Cardekho listing for the entire country
-    # 1. All fuel types except Petrol and Diesel
-    # 2. All body types except SUV, Sedan and Hatchback
-    # 3. All car brands except Maruti, Hyundai, Honda, Mahindra, and Tata
-    # 4. All base case cities defined in params.py
-    non_base_case_fuel_types = ["Petrol", "Diesel"]
-    base_case_fuel_types = [fuel for fuel in params.fuel_types if fuel not in non_base_case_fuel_types]
-    non_base_case_body_types = ["SUV", "Sedan", "Hatchback"]
-    base_case_body_types = [body for body in params.body_types if body not in non_base_case_body_types]
-    non_base_case_brands = ["Maruti", "Hyundai", "Honda", "Mahindra", "Tata"]
-    base_case_brands = [brand for brand in params.brands if brand not in non_base_case_brands]
-    base_case_cities = params.common_base_cities
-    non_base_case_cities = [city for city in params.common_cities if city not in base_case_cities]
-    
-    async def get_and_save_base_case_cars():
-        print("Base Cases: ")
-        print("Fuel Types: ", base_case_fuel_types)
-        print("Body Types: ", base_case_body_types)
-        print("Brands: ", base_case_brands)
-        print("Cities: ", base_case_cities)
-        
-        # Get all the cars except the base cases
-        
-        # 1. Get the except base case fuel types
-        for fuel_type in base_case_fuel_types:
-            fuel_type = fuel_type.replace(" ", "-").lower()
-            base_case_tasks.append(asyncio.create_task(get_all_cars(
-                city_id=None,
-                # Sample search string: used-cars+in+india+petrol
-                search_string=f"used-cars+in+india+{fuel_type}"
-            )))
-        
-        # 2. Get the except base case body types
-        for body_type in base_case_body_types:
-            body_type = body_type.replace(" ", "-").lower()
-            base_case_tasks.append(asyncio.create_task(get_all_cars(
-                city_id=None,
-                # Sample search string: used-cars+in+india+muv
-                search_string=f"used-cars+in+india+{body_type}"
-            )))
-        
-        # 3. Get the except base case brands
-        for brand in base_case_brands:
-            brand = brand.replace(" ", "-").lower()
-            base_case_tasks.append(asyncio.create_task(get_all_cars(
-                city_id=None,
-                # Sample search string: used-cars+in+india+maruti
-                search_string=f"used-cars+in+india+{brand}"
-            )))
-        
-        # 4. Get the base case cities
-        for city in base_case_cities:
-            city_id = params.common_city_ids.get(city)
-            city = city.replace(" ", "-").lower()
-            base_case_tasks.append(asyncio.create_task(get_all_cars(
-                city_id=city_id,
-                # Sample search string: used-cars+in+delhi
-                search_string=f"used-cars+in+{city}"
-            )))
-        
-        all_base_case_results = await asyncio.gather(*base_case_tasks)
-        
-        # Flatten the list of lists into a single list of cars
-        all_base_case_cars = [car for cars_list in all_base_case_results for car in cars_list]
-        
-        print(f"Saving all {len(all_base_case_cars)} base case cars to a file...")
-        # Save the base case cars to a file
-        df_base = pd.DataFrame(all_base_case_cars)
-        # Make the file name have the current date and time
-        filename = f"cardekho_base_case_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
-        df_base.to_csv(f"../data/{filename}", index=False)
-        print(f"Saved all the base cars to a file: {filename}")
-    
-    async def get_and_save_rest_cars():
-        tasks = []
-        for city in non_base_case_cities:
-            city_id = params.common_city_ids.get(city)
-            city = city.replace(" ", "-").lower()
-            for brand in non_base_case_brands:
-                brand = brand.replace(" ", "-").lower()
-                for fuel_type in non_base_case_fuel_types:
-                    fuel_type = fuel_type.replace(" ", "-").lower()
-                    search_string = f"used-cars+in+{city}+{brand}+{fuel_type}"
-                    # all_cars.extend(await get_all_cars(city_id, search_string))
-                    tasks.append(asyncio.create_task(get_all_cars(city_id, search_string)))
-        
-        all_results = await asyncio.gather(*tasks)
-        # Flatten the list of lists into a single list of cars
-        all_non_base_case_cars = [car for cars_list in all_results for car in cars_list]
-        
-        df_non_base = pd.DataFrame(all_non_base_case_cars)
-        # Make the file name have the current date and time
-        filename = f"cardekho_non_base_case_{datetime.datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.csv"
-        df_non_base.to_csv(f"../data/{filename}", index=False)
-    
-    print("Please enter one of the following options:")
-    print("1. Get and save base case cars")
-    print("2. Get and save non base case cars")
-    
-    option = input("Enter your option: ")
-    if option == "1":
-        await get_and_save_base_case_cars()
-    elif option == "2":
-        await get_and_save_rest_cars()
-    else:
-        print("Invalid option. Exiting...")
-        exit(1)
-       
+    # The search space is split into partitions the API lists entirely, the partition tree of the previous run is reused
+    partitioner = make_partitioner()
+    try:
+        all_cars = await partitioner.crawl()
+        print(f"Saving all {len(all_cars)} cars to a file...")
+        filename = save_cars_file(all_cars, "all_cars")
+        print(f"Saved all the cars to a file: {filename}")
+    finally:
+        # All the calls share the connections of the default session
+        await close_default_session()
+        print(f"API calls: {crawl_scheduler.get_stats()}")
+        print(f"Partitions: {partitioner.get_stats()}")
+
 
 if __name__ == "__main__":
     asyncio.run(main())
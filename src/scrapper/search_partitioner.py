@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+
+try:
+	import params
+except ImportError:
+	# Imported as src.scrapper.search_partitioner instead of run from src/scrapper
+	from src.scrapper import params
+
+# The values of every facet the searches can be split by
+FACET_VALUES = {
+	"fuel_type": params.fuel_types,
+	"body_type": params.body_types,
+	"brand": params.brands,
+	"transmission_type": params.transmission_types,
+	"owner": params.owners,
+	"city": params.common_cities,
+}
+
+
+class SearchPartitioner:
+	"""
+	Splits the search space of the listing into partitions which the API lists entirely: a partition is probed with one
+	cheap call, the ones under the result cap are fetched in one go, and only the ones over it are split by the next facet,
+	recursively. A partition still over the cap once all the facets are used is fetched anyway, as far as the API lists it.
+
+	The values of a facet are the known ones, the API cannot search for the others. So the listing of every split search is
+	fetched too, and its cars missing from the partitions make a remainder partition. The listing is capped, so the cars of
+	the remainder past the cap are not found; their number is unknown, the size of every remainder is printed.
+
+	The partition tree is recorded to tree_path, and the next run reuses it: the split partitions are split again without
+	probing them, and the leaves are fetched without probing them, unless their last count was close to the cap.
+
+	Parameters
+	----------
+		probe: callable
+			async probe(filters) -> bool, whether the search of the filters has more cars than the cap
+		fetch: callable
+			async fetch(filters, capped) -> list[dict], the cars of the search of the filters, capped when it is over the cap
+		facets: list[str]
+			The facets of FACET_VALUES the partitions are split by, in order
+		restricted: dict[str, list[str]]
+			The facets whose values are limited to the given ones, always split first, without probing
+		result_cap: int
+			The number of cars the API lists for a search
+		tree_path: str | None
+			The JSON file of the partition tree, None to not record it
+		reprobe_fraction: float
+			The leaves of the recorded tree with at least reprobe_fraction * result_cap cars are probed again
+		complete_fetches: bool
+			Whether fetch returns all the cars of a partition, not the case of the incremental scrapes which stop at the first
+			unchanged page; the counts of the leaves are then unknown and they are all probed again
+	"""
+
+	def __init__(
+			self,
+			probe: callable,
+			fetch: callable,
+			facets: list[str] = params.partition_facets,
+			restricted: dict[str, list[str]] = None,
+			result_cap: int = params.partition_result_cap,
+			tree_path: str | None = params.partition_tree_path,
+			reprobe_fraction: float = params.partition_reprobe_fraction,
+			complete_fetches: bool = True,
+	):
+		self.probe = probe
+		self.fetch = fetch
+		restricted = restricted or {}
+		self.restricted = list(restricted)
+		self.facets = {
+			**restricted,
+			**{facet: FACET_VALUES[facet] for facet in facets if facet not in restricted},
+		}
+		self.result_cap = result_cap
+		self.tree_path = tree_path
+		self.reprobe_fraction = reprobe_fraction
+		self.complete_fetches = complete_fetches
+		self.stats = {"probes": 0, "fetches": 0, "splits": 0, "capped": 0, "reused": 0, "remainders": 0, "remainder_cars": 0}
+
+	def _get_facet_items(self) -> list[list]:
+		# The facets in their order, which JSON objects do not keep
+		return [[facet, values] for facet, values in self.facets.items()]
+
+	def load_tree(self) -> dict | None:
+		if self.tree_path is None or not os.path.exists(self.tree_path):
+			return None
+		with open(self.tree_path) as f:
+			tree = json.load(f)
+		# A tree recorded with other facets or another cap does not partition the same way
+		if tree.get("facets") != self._get_facet_items() or tree.get("result_cap") != self.result_cap:
+			return None
+		return tree["root"]
+
+	def save_tree(self, root: dict) -> None:
+		if self.tree_path is None:
+			return
+		# Replace the previous tree only once the new one is written entirely
+		with open(f"{self.tree_path}.tmp", "w") as f:
+			json.dump({"facets": self._get_facet_items(), "result_cap": self.result_cap, "root": root}, f)
+		os.replace(f"{self.tree_path}.tmp", self.tree_path)
+
+	def _get_next_facet(self, filters: dict[str, str]) -> str | None:
+		return next((facet for facet in self.facets if facet not in filters), None)
+
+	def _should_reprobe(self, node: dict) -> bool:
+		return not self.complete_fetches or node.get("cars", self.result_cap) >= self.reprobe_fraction * self.result_cap
+
+	async def _split(
+			self,
+			filters: dict[str, str],
+			facet: str,
+			node: dict | None,
+			listing: list[dict] | None = None,
+	) -> tuple[dict, list[dict]]:
+		self.stats["splits"] += 1
+		# The children recorded by the previous run, by the value of the facet
+		children = {child["filters"][facet]: child for child in node["children"]} if node and node.get("facet") == facet else {}
+		results = await asyncio.gather(*[
+			self._crawl({**filters, facet: value}, children.get(value)) for value in self.facets[facet]
+		])
+		cars = [car for _, cars in results for car in cars]
+		split_node = {"filters": filters, "facet": facet, "children": [child for child, _ in results]}
+		# The values of a restricted facet are all the ones wanted
+		if facet not in self.restricted:
+			remainder = await self._get_remainder(filters, facet, cars, listing)
+			split_node["remainder"] = len(remainder)
+			cars.extend(remainder)
+		return split_node, cars
+
+	async def _get_remainder(
+			self,
+			filters: dict[str, str],
+			facet: str,
+			cars: list[dict],
+			listing: list[dict] | None = None,
+	) -> list[dict]:
+		# The cars of the capped listing of the split search which none of its partitions has, i.e. with another value
+		# of the facet than the known ones
+		self.stats["remainders"] += 1
+		if listing is None:
+			self.stats["fetches"] += 1
+			listing = await self.fetch(filters, True)
+		seen = {car["usedCarSkuId"] for car in cars}
+		remainder = [car for car in listing if car["usedCarSkuId"] not in seen]
+		n_cars = len({car["usedCarSkuId"] for car in remainder})
+		self.stats["remainder_cars"] += n_cars
+		if n_cars:
+			print(
+				f"{n_cars} cars of the search {filters} are in none of its partitions by {facet}, e.g. with another value "
+				f"than {self.facets[facet]}, only the ones of its capped listing are found"
+			)
+		return remainder
+
+	async def _crawl(self, filters: dict[str, str], node: dict | None) -> tuple[dict, list[dict]]:
+		facet = self._get_next_facet(filters)
+		if facet in self.restricted:
+			return await self._split(filters, facet, node)
+
+		if node is not None and "children" in node and facet is not None:
+			self.stats["reused"] += 1
+			return await self._split(filters, facet, node)
+		if node is not None and "children" not in node and not self._should_reprobe(node):
+			self.stats["reused"] += 1
+			over_cap = node.get("capped", False)
+		else:
+			self.stats["probes"] += 1
+			over_cap = await self.probe(filters)
+
+		if over_cap and facet is not None:
+			return await self._split(filters, facet, node)
+
+		self.stats["fetches"] += 1
+		self.stats["capped"] += over_cap
+		cars = await self.fetch(filters, over_cap)
+		n_cars = len({car["usedCarSkuId"] for car in cars})
+		# A reused leaf which grew over the cap is split, its children fetch its cars again and its cars are the listing
+		# of the remainder
+		if not over_cap and n_cars >= self.result_cap and facet is not None:
+			return await self._split(filters, facet, None, cars)
+		if over_cap:
+			print(f"The search {filters} is over the cap with all the facets, some of its cars may be missing")
+		return {"filters": filters, "cars": n_cars, "capped": over_cap}, cars
+
+	async def crawl(self) -> list[dict]:
+		"""
+		All the cars of the search space, reusing and then recording the partition tree
+		"""
+		root, cars = await self._crawl({}, self.load_tree())
+		self.save_tree(root)
+		return cars
+
+	def get_stats(self) -> dict:
+		return dict(self.stats)
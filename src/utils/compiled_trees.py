@@ -0,0 +1,495 @@
+from __future__ import annotations
+
+import json
+import os
+import struct
+import tempfile
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+# Upper bound on rows * trees evaluated at once, so the node and leaf index matrices stay small
+TRAVERSAL_CHUNK_SIZE = 2 ** 18
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+_K0 = 0xc3a5c85c97cb3127
+_K1 = 0xb492b66fbe98f273
+_K2 = 0x9ae16a3b2f90404f
+_K3 = 0xc949d7c7509e6557
+
+
+def _fetch64(s: bytes, i: int) -> int:
+	return struct.unpack_from('<Q', s, i)[0]
+
+
+def _fetch32(s: bytes, i: int) -> int:
+	return struct.unpack_from('<I', s, i)[0]
+
+
+def _rotate(value: int, shift: int) -> int:
+	return value if shift == 0 else ((value >> shift) | (value << (64 - shift))) & _MASK64
+
+
+def _shift_mix(value: int) -> int:
+	return value ^ (value >> 47)
+
+
+def _hash_len_16(u: int, v: int) -> int:
+	k_mul = 0x9ddfea08eb382d69
+	a = ((u ^ v) * k_mul) & _MASK64
+	a ^= a >> 47
+	b = ((v ^ a) * k_mul) & _MASK64
+	b ^= b >> 47
+	return (b * k_mul) & _MASK64
+
+
+def _hash_len_0_to_16(s: bytes, n: int) -> int:
+	if n > 8:
+		a, b = _fetch64(s, 0), _fetch64(s, n - 8)
+		return _hash_len_16(a, _rotate((b + n) & _MASK64, n)) ^ b
+	if n >= 4:
+		return _hash_len_16((n + (_fetch32(s, 0) << 3)) & _MASK64, _fetch32(s, n - 4))
+	if n > 0:
+		y = (s[0] + (s[n >> 1] << 8)) & 0xFFFFFFFF
+		z = (n + (s[n - 1] << 2)) & 0xFFFFFFFF
+		return (_shift_mix((y * _K2 ^ z * _K3) & _MASK64) * _K2) & _MASK64
+	return _K2
+
+
+def _hash_len_17_to_32(s: bytes, n: int) -> int:
+	a = (_fetch64(s, 0) * _K1) & _MASK64
+	b = _fetch64(s, 8)
+	c = (_fetch64(s, n - 8) * _K2) & _MASK64
+	d = (_fetch64(s, n - 16) * _K0) & _MASK64
+	return _hash_len_16(
+		(_rotate((a - b) & _MASK64, 43) + _rotate(c, 30) + d) & _MASK64,
+		(a + _rotate(b ^ _K3, 20) - c + n) & _MASK64
+	)
+
+
+def _weak_hash_len_32_with_seeds(s: bytes, i: int, a: int, b: int) -> tuple[int, int]:
+	w, x, y, z = _fetch64(s, i), _fetch64(s, i + 8), _fetch64(s, i + 16), _fetch64(s, i + 24)
+	a = (a + w) & _MASK64
+	b = _rotate((b + a + z) & _MASK64, 21)
+	c = a
+	a = (a + x + y) & _MASK64
+	b = (b + _rotate(a, 44)) & _MASK64
+	return (a + z) & _MASK64, (b + c) & _MASK64
+
+
+def _hash_len_33_to_64(s: bytes, n: int) -> int:
+	z = _fetch64(s, 24)
+	a = (_fetch64(s, 0) + (n + _fetch64(s, n - 16)) * _K0) & _MASK64
+	b = _rotate((a + z) & _MASK64, 52)
+	c = _rotate(a, 37)
+	a = (a + _fetch64(s, 8)) & _MASK64
+	c = (c + _rotate(a, 7)) & _MASK64
+	a = (a + _fetch64(s, 16)) & _MASK64
+	vf, vs = (a + z) & _MASK64, (b + _rotate(a, 31) + c) & _MASK64
+	a = (_fetch64(s, 16) + _fetch64(s, n - 32)) & _MASK64
+	z = _fetch64(s, n - 8)
+	b = _rotate((a + z) & _MASK64, 52)
+	c = _rotate(a, 37)
+	a = (a + _fetch64(s, n - 24)) & _MASK64
+	c = (c + _rotate(a, 7)) & _MASK64
+	a = (a + _fetch64(s, n - 16)) & _MASK64
+	wf, ws = (a + z) & _MASK64, (b + _rotate(a, 31) + c) & _MASK64
+	r = _shift_mix(((vf + ws) * _K2 + (wf + vs) * _K0) & _MASK64)
+	return (_shift_mix((r * _K0 + vs) & _MASK64) * _K2) & _MASK64
+
+
+def city_hash64(s: bytes) -> int:
+	"""
+	CityHash64 (v1.0), the hash CatBoost applies to the values of the categorical features
+	"""
+	n = len(s)
+	if n <= 16:
+		return _hash_len_0_to_16(s, n)
+	if n <= 32:
+		return _hash_len_17_to_32(s, n)
+	if n <= 64:
+		return _hash_len_33_to_64(s, n)
+
+	x = _fetch64(s, 0)
+	y = _fetch64(s, n - 16) ^ _K1
+	z = _fetch64(s, n - 56) ^ _K0
+	v = _weak_hash_len_32_with_seeds(s, n - 64, n, y)
+	w = _weak_hash_len_32_with_seeds(s, n - 32, (n * _K1) & _MASK64, _K0)
+	z = (z + _shift_mix(v[1]) * _K1) & _MASK64
+	x = (_rotate((z + x) & _MASK64, 39) * _K1) & _MASK64
+	y = (_rotate(y, 33) * _K1) & _MASK64
+	for i in range(0, (n - 1) & ~63, 64):
+		x = (_rotate((x + y + v[0] + _fetch64(s, i + 16)) & _MASK64, 37) * _K1) & _MASK64
+		y = (_rotate((y + v[1] + _fetch64(s, i + 48)) & _MASK64, 42) * _K1) & _MASK64
+		x ^= w[1]
+		y ^= v[0]
+		z = _rotate(z ^ w[0], 33)
+		v = _weak_hash_len_32_with_seeds(s, i, (v[1] * _K1) & _MASK64, (x + w[0]) & _MASK64)
+		w = _weak_hash_len_32_with_seeds(s, i + 32, (z + w[1]) & _MASK64, y)
+		z, x = x, z
+	return _hash_len_16(
+		(_hash_len_16(v[0], w[0]) + _shift_mix(y) * _K1 + z) & _MASK64,
+		(_hash_len_16(v[1], w[1]) + x) & _MASK64
+	)
+
+
+@lru_cache(maxsize=65536)
+def catboost_cat_feature_hash(value) -> int:
+	"""
+	The hash of a categorical value in the CatBoost models: the lower 32 bits of the CityHash64 of its UTF-8 string,
+	as a signed integer like in the models exported by CatBoost
+	"""
+	hashed = city_hash64(str(value).encode()) & 0xFFFFFFFF
+	return hashed - (1 << 32) if hashed >= (1 << 31) else hashed
+
+
+def _chunks(n_rows: int, n_trees: int):
+	chunk_size = max(1, TRAVERSAL_CHUNK_SIZE // max(n_trees, 1))
+	for start in range(0, n_rows, chunk_size):
+		yield slice(start, min(start + chunk_size, n_rows))
+
+
+# The missing types of the LightGBM splits
+_MISSING_NONE, _MISSING_ZERO, _MISSING_NAN = 0, 1, 2
+_LIGHTGBM_MISSING_TYPES = {'None': _MISSING_NONE, 'Zero': _MISSING_ZERO, 'NaN': _MISSING_NAN}
+# LightGBM counts the values this close to 0 as zero
+_LIGHTGBM_ZERO_THRESHOLD = float(np.float32(1e-35))
+
+
+class CompiledLightGBM:
+	"""
+	A LightGBM booster as flat arrays of nodes (feature, threshold, children, missing value handling and leaf value),
+	evaluated on a batch of rows by moving every (row, tree) pair down one level at a time with NumPy.
+	The categorical splits are rows of a table of the categories going left, category_set is the row of every node
+	and -1 for the numerical splits. Use from_booster to build it. The leaves point to themselves.
+	"""
+
+	def __init__(
+			self,
+			feature: np.ndarray,
+			threshold: np.ndarray,
+			left: np.ndarray,
+			right: np.ndarray,
+			default_left: np.ndarray,
+			missing_type: np.ndarray,
+			value: np.ndarray,
+			roots: np.ndarray,
+			max_depth: int,
+			category_set: np.ndarray = None,
+			categories_left: np.ndarray = None,
+	):
+		self.feature = feature
+		self.threshold = threshold
+		self.left = left
+		self.right = right
+		self.default_left = default_left
+		self.missing_type = missing_type
+		self.value = value
+		self.roots = roots
+		self.max_depth = max_depth
+		self.category_set = category_set if category_set is not None else np.full(len(left), -1, dtype=np.int64)
+		self.categories_left = categories_left if categories_left is not None else np.zeros((0, 1), dtype=bool)
+		self.is_leaf = left == np.arange(len(left))
+
+	@classmethod
+	def from_booster(cls, booster) -> 'CompiledLightGBM':
+		"""
+		Flatten a lightgbm.Booster, or the booster_ of a fitted LGBMRegressor
+		"""
+		booster = getattr(booster, 'booster_', booster)
+		nodes = {
+			name: [] for name in
+			['feature', 'threshold', 'left', 'right', 'default_left', 'missing_type', 'value', 'category_set']
+		}
+		category_sets = []
+		roots = []
+		max_depth = 0
+
+		def add_node(node: dict, depth: int) -> int:
+			nonlocal max_depth
+			max_depth = max(max_depth, depth)
+			position = len(nodes['feature'])
+			for values in nodes.values():
+				values.append(0)
+			nodes['category_set'][position] = -1
+			if 'leaf_value' in node:
+				nodes['left'][position] = nodes['right'][position] = position
+				nodes['value'][position] = node['leaf_value']
+				return position
+			if node['decision_type'] == '==':
+				# The threshold of a categorical split is the list of the categories going left, e.g. '0||7||14'
+				nodes['category_set'][position] = len(category_sets)
+				category_sets.append([int(category) for category in str(node['threshold']).split('||')])
+			elif node['decision_type'] == '<=':
+				nodes['threshold'][position] = node['threshold']
+			else:
+				raise ValueError(f'The {node["decision_type"]} splits cannot be compiled')
+			nodes['feature'][position] = node['split_feature']
+			nodes['default_left'][position] = node['default_left']
+			nodes['missing_type'][position] = _LIGHTGBM_MISSING_TYPES[node['missing_type']]
+			nodes['left'][position] = add_node(node['left_child'], depth + 1)
+			nodes['right'][position] = add_node(node['right_child'], depth + 1)
+			return position
+
+		for tree in booster.dump_model()['tree_info']:
+			roots.append(add_node(tree['tree_structure'], 0))
+
+		n_categories = max((max(categories) for categories in category_sets), default=0) + 1
+		categories_left = np.zeros((len(category_sets), n_categories), dtype=bool)
+		for i, categories in enumerate(category_sets):
+			categories_left[i, categories] = True
+		return cls(
+			feature=np.array(nodes['feature'], dtype=np.int64),
+			threshold=np.array(nodes['threshold'], dtype=np.float64),
+			left=np.array(nodes['left'], dtype=np.int64),
+			right=np.array(nodes['right'], dtype=np.int64),
+			default_left=np.array(nodes['default_left'], dtype=bool),
+			missing_type=np.array(nodes['missing_type'], dtype=np.int8),
+			value=np.array(nodes['value'], dtype=np.float64),
+			roots=np.array(roots, dtype=np.int64),
+			max_depth=max_depth,
+			category_set=np.array(nodes['category_set'], dtype=np.int64),
+			categories_left=categories_left,
+		)
+
+	def _predict_chunk(self, X: np.ndarray) -> np.ndarray:
+		# The (row, tree) pairs flattened, only the ones which are not in a leaf yet move down a level
+		node = np.tile(self.roots, len(X))
+		rows = np.repeat(np.arange(len(X)), len(self.roots))
+		active = np.flatnonzero(~self.is_leaf[node])
+		while len(active):
+			current = node[active]
+			values = X[rows[active], self.feature[current]]
+			missing_type = self.missing_type[current]
+			is_nan = np.isnan(values)
+			# Same decision as LightGBM: NaN is 0 unless the missing type is NaN, and the missing values take the default side
+			values = np.where(is_nan & (missing_type != _MISSING_NAN), 0.0, values)
+			use_default = (
+				((missing_type == _MISSING_ZERO) & (np.abs(values) <= _LIGHTGBM_ZERO_THRESHOLD))
+				| ((missing_type == _MISSING_NAN) & is_nan)
+			)
+			go_left = np.where(use_default, self.default_left[current], values <= self.threshold[current])
+			category_set = self.category_set[current]
+			is_categorical = category_set >= 0
+			if is_categorical.any():
+				go_left[is_categorical] = self._categorical_go_left(
+					X[rows[active[is_categorical]], self.feature[current[is_categorical]]], category_set[is_categorical])
+			current = np.where(go_left, self.left[current], self.right[current])
+			node[active] = current
+			active = active[~self.is_leaf[current]]
+		return self.value[node].reshape(len(X), len(self.roots)).sum(axis=1)
+
+	def _categorical_go_left(self, values: np.ndarray, category_set: np.ndarray) -> np.ndarray:
+		# Same decision as LightGBM: the category is the integer part of the value, and goes left if it is in the set.
+		# NaN, the negative categories and the ones above all the sets go right
+		values = np.trunc(values)
+		is_valid = (values >= 0) & (values < self.categories_left.shape[1])
+		categories = np.where(is_valid, values, 0).astype(np.int64)
+		return is_valid & self.categories_left[category_set, categories]
+
+	def predict(self, X: np.ndarray | pd.DataFrame) -> np.ndarray:
+		"""
+		The raw predictions, the sum of the leaf values of the trees, like lightgbm.Booster.predict
+		"""
+		X = np.asarray(X, dtype=np.float64)
+		if X.ndim == 1:
+			X = X.reshape(1, -1)
+		if len(self.roots) == 0:
+			return np.zeros(len(X))
+		return np.concatenate([self._predict_chunk(X[rows]) for rows in _chunks(len(X), len(self.roots))])
+
+
+def _calc_hash(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+	# The combination of the hashes of a CatBoost projection, with the uint64 overflow of the C++ code
+	magic = np.uint64(0x4906ba494954cb65)
+	return magic * (a + magic * b)
+
+
+class CompiledCatBoost:
+	"""
+	A CatBoost model as flat arrays: every distinct split of the oblivious trees is a bit computed for the whole batch
+	(float feature above a border, one-hot value, or CTR above a border), and the leaf of every tree is the number made of
+	the bits of its splits. The CTRs of the categorical features are computed from the hashes of their values and the
+	CTR tables of the model, like the Python applier exported by CatBoost. Use from_model to build it.
+	"""
+
+	def __init__(self, model_json: dict):
+		features_info = model_json['features_info']
+		float_features = sorted(features_info.get('float_features', []), key=lambda feature: feature['feature_index'])
+		cat_features = sorted(features_info.get('categorical_features', []), key=lambda feature: feature['feature_index'])
+		self.float_columns = np.array([feature['flat_feature_index'] for feature in float_features], dtype=np.int64)
+		self.cat_columns = [feature['flat_feature_index'] for feature in cat_features]
+		self.nan_as_true = np.array([feature.get('nan_value_treatment') == 'AsTrue' for feature in float_features], dtype=bool)
+		self.ctrs = [self._compile_ctr(ctr, model_json['ctr_data']) for ctr in features_info.get('ctrs', [])]
+
+		# The split indexes number the float borders, then the one-hot values, then the CTR borders
+		n_float_splits = sum(len(feature.get('borders', [])) for feature in float_features)
+		n_one_hot_splits = sum(len(feature.get('values', [])) for feature in cat_features)
+		ctr_of_split = [i for i, ctr in enumerate(features_info.get('ctrs', [])) for _ in ctr['borders']]
+
+		self.splits = []
+		split_ids = {}
+		trees = []
+		for tree in model_json['oblivious_trees']:
+			tree_splits = []
+			# A tree without any split is a single leaf, exported with null splits
+			for split in tree['splits'] or []:
+				if split['split_type'] == 'FloatFeature':
+					key = ('float', split['float_feature_index'], np.float32(split['border']))
+				elif split['split_type'] == 'OneHotFeature':
+					key = ('one_hot', split['cat_feature_index'], split['value'])
+				elif split['split_type'] == 'OnlineCtr':
+					key = ('ctr', ctr_of_split[split['split_index'] - n_float_splits - n_one_hot_splits], np.float32(split['border']))
+				else:
+					raise ValueError(f'The {split["split_type"]} splits cannot be compiled')
+				if key not in split_ids:
+					split_ids[key] = len(self.splits)
+					self.splits.append(key)
+				tree_splits.append(split_ids[key])
+			trees.append((tree_splits, tree['leaf_values']))
+
+		# The splits of a kind are evaluated together: their positions among the bits, their feature (or CTR) and border (or value)
+		self.split_groups = {}
+		for kind, dtype in (('float', np.float32), ('one_hot', np.uint64), ('ctr', np.float32)):
+			positions = [i for i, key in enumerate(self.splits) if key[0] == kind]
+			self.split_groups[kind] = (
+				np.array(positions, dtype=np.int64),
+				np.array([self.splits[i][1] for i in positions], dtype=np.int64),
+				np.array([self.splits[i][2] for i in positions], dtype=np.int64 if kind == 'one_hot' else dtype).astype(dtype),
+			)
+
+		# Trees shallower than the deepest one are padded with a split which is always false, the last bit
+		self.max_depth = max((len(tree_splits) for tree_splits, _ in trees), default=0)
+		self.tree_splits = np.full((len(trees), self.max_depth), len(self.splits), dtype=np.int64)
+		self.leaf_values = np.zeros((len(trees), 2 ** self.max_depth))
+		for i, (tree_splits, leaf_values) in enumerate(trees):
+			if len(leaf_values) != 2 ** len(tree_splits):
+				raise ValueError('Only the models with one prediction per object can be compiled')
+			self.tree_splits[i, :len(tree_splits)] = tree_splits
+			self.leaf_values[i, :len(leaf_values)] = leaf_values
+		scale, biases = model_json.get('scale_and_bias', [1, [0]])
+		self.scale = scale
+		self.bias = biases[0] if biases else 0
+
+	@staticmethod
+	def _compile_ctr(ctr: dict, ctr_data: dict) -> dict:
+		if ctr['ctr_type'] not in ('Borders', 'Buckets', 'Counter', 'FeatureFreq'):
+			raise ValueError(f'The {ctr["ctr_type"]} CTRs cannot be compiled')
+		table = ctr_data[ctr['identifier']]
+		stride = table['hash_stride']
+		hash_map = np.array([int(value) for value in table['hash_map']], dtype=object).reshape(-1, stride)
+		keys = hash_map[:, 0].astype(np.uint64)
+		counts = hash_map[:, 1:].astype(np.float64)
+		# The empty buckets of the hash table have the largest key
+		used = keys != np.uint64(_MASK64)
+		order = np.argsort(keys[used])
+
+		elements = json.loads(ctr['identifier'])['identifier']
+		return {
+			'type': ctr['ctr_type'],
+			'cat_features': [element['cat_feature_index'] for element in elements if element['combination_element'] == 'cat_feature_value'],
+			'binarized': [element for element in elements if element['combination_element'] != 'cat_feature_value'],
+			'keys': keys[used][order],
+			'counts': counts[used][order],
+			'counter_denominator': table.get('counter_denominator', 0),
+			'target_border_idx': ctr['target_border_idx'],
+			'prior_numerator': np.float32(ctr['prior_numerator']),
+			'prior_denominator': np.float32(ctr['prior_denomerator']),
+			'shift': np.float32(ctr['shift']),
+			'scale': np.float32(ctr['scale']),
+		}
+
+	@classmethod
+	def from_model(cls, model) -> 'CompiledCatBoost':
+		"""
+		Flatten a fitted CatBoost model, through its JSON export
+		"""
+		with tempfile.TemporaryDirectory() as tmp_dir:
+			path = os.path.join(tmp_dir, 'model.json')
+			model.save_model(path, format='json')
+			with open(path) as f:
+				return cls(json.load(f))
+
+	def _float_bit(self, floats: np.ndarray, feature: int, border: np.float32) -> np.ndarray:
+		values = floats[:, feature]
+		return np.where(np.isnan(values), self.nan_as_true[feature], values > border)
+
+	def _calc_ctr(self, ctr: dict, floats: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+		keys = np.zeros(len(floats), dtype=np.uint64)
+		for cat_feature in ctr['cat_features']:
+			keys = _calc_hash(keys, hashes[:, cat_feature])
+		for element in ctr['binarized']:
+			if element['combination_element'] == 'float_feature':
+				bit = self._float_bit(floats, element['float_feature_index'], np.float32(element['border']))
+			else:
+				bit = hashes[:, element['cat_feature_index']] == np.int64(element['value']).astype(np.uint64)
+			keys = _calc_hash(keys, bit.astype(np.uint64))
+
+		positions = np.minimum(np.searchsorted(ctr['keys'], keys), max(len(ctr['keys']) - 1, 0))
+		found = ctr['keys'][positions] == keys if len(ctr['keys']) else np.zeros(len(keys), dtype=bool)
+		counts = ctr['counts'][positions] if len(ctr['keys']) else np.zeros((len(keys), 1))
+		if ctr['type'] in ('Counter', 'FeatureFreq'):
+			good, total = counts[:, 0], np.full(len(keys), ctr['counter_denominator'], dtype=np.float64)
+		elif ctr['type'] == 'Buckets':
+			good, total = counts[:, ctr['target_border_idx']], counts.sum(axis=1)
+		else:
+			good, total = counts[:, ctr['target_border_idx'] + 1:].sum(axis=1), counts.sum(axis=1)
+		# The values which are not in the table only get the prior
+		good = np.where(found, good, 0).astype(np.float32)
+		total = np.where(found, total, 0).astype(np.float32)
+		return ((good + ctr['prior_numerator']) / (total + ctr['prior_denominator']) + ctr['shift']) * ctr['scale']
+
+	def _predict_chunk(self, floats: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+		n_rows = len(floats)
+		# One row of bits per distinct split, plus the always false one used to pad the trees
+		bits = np.zeros((len(self.splits) + 1, n_rows), dtype=np.int64)
+		positions, features, borders = self.split_groups['float']
+		if len(positions):
+			values = floats[:, features].T
+			bits[positions] = np.where(np.isnan(values), self.nan_as_true[features][:, None], values > borders[:, None])
+		positions, features, values = self.split_groups['one_hot']
+		if len(positions):
+			bits[positions] = hashes[:, features].T == values[:, None]
+		positions, ctrs, borders = self.split_groups['ctr']
+		if len(positions):
+			ctr_values = np.zeros((len(self.ctrs), n_rows), dtype=np.float32)
+			for ctr in np.unique(ctrs):
+				ctr_values[ctr] = self._calc_ctr(self.ctrs[ctr], floats, hashes)
+			bits[positions] = ctr_values[ctrs] > borders[:, None]
+
+		leaves = np.zeros((len(self.tree_splits), n_rows), dtype=np.int64)
+		for depth in range(self.max_depth):
+			leaves |= bits[self.tree_splits[:, depth]] << depth
+		# Summed tree by tree, in the order of the trees like CatBoost
+		leaf_values = self.leaf_values[np.arange(len(self.tree_splits))[:, None], leaves]
+		return self.scale * leaf_values.sum(axis=0) + self.bias
+
+	def predict(self, data: list | np.ndarray | pd.DataFrame) -> np.ndarray | float:
+		"""
+		The raw predictions like CatBoost.predict: data is a batch of rows holding the float and categorical features
+		in the order of the training data, or a single row as a list, which returns a single value
+		"""
+		single = isinstance(data, list) and len(data) > 0 and not isinstance(data[0], (list, tuple, np.ndarray))
+		rows = np.array([data] if single else data, dtype=object) if not isinstance(data, pd.DataFrame) else data.to_numpy(dtype=object)
+		# CatBoost compares the float features as float32
+		floats = rows[:, self.float_columns].astype(np.float64).astype(np.float32) if len(self.float_columns) else np.empty((len(rows), 0), dtype=np.float32)
+		hashes = np.array(
+			[[catboost_cat_feature_hash(value) for value in row] for row in rows[:, self.cat_columns]], dtype=np.int64
+		).reshape(len(rows), len(self.cat_columns)).astype(np.uint64)
+
+		predictions = np.concatenate([
+			self._predict_chunk(floats[chunk], hashes[chunk]) for chunk in _chunks(len(rows), max(len(self.tree_splits), 1))
+		]) if len(rows) else np.empty(0)
+		return float(predictions[0]) if single else predictions
+
+
+def compile_booster(booster):
+	"""
+	The compiled version of a CatBoost model or a LightGBM booster, with the same predict
+	"""
+	if hasattr(booster, 'dump_model') or hasattr(booster, 'booster_'):
+		return CompiledLightGBM.from_booster(booster)
+	if type(booster).__module__.startswith('catboost'):
+		return CompiledCatBoost.from_model(booster)
+	raise ValueError(f'Cannot compile the model {type(booster).__name__}')
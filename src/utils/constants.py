@@ -16,6 +16,21 @@ TEST_FILE_BEGIN = 'test'
 VALIDATION_DIR_PATH = '../../data/validation/'
 VALIDATION_FILE_BEGIN = 'validation'
 MODEL_DIR_PATH = '../../data/models/'
+FIT_CACHE_DIR_PATH = '../../data/cache/'  # Fitted transformers shared between the models, see src/utils/fit_cache.py
+FIT_CACHE_MAX_AGE_DAYS = 30
+FIT_CACHE_MAX_SIZE_MB = 1024
+FEATURE_LIST_COLS = ['top_features', 'comfort_features', 'interior_features', 'exterior_features', 'safety_features']
+FEATURE_MATRIX_EXTENSION = '.features.npz'  # Saved next to the datasets, see src/feature_engineering/feature_matrix.py
+SERVER_HOST = '127.0.0.1'  # The prediction server, see src/model_training/prediction_server.py
+SERVER_PORT = 8000
+PREDICTION_P99_TARGET_MS = 10
+BATCH_MAX_WAIT_MS = 2  # The micro-batching of the concurrent predictions, see src/utils/micro_batching.py
+BATCH_MAX_SIZE = 64
+COMPILED_TREES = False  # Serve with the NumPy version of the boosters, see src/utils/compiled_trees.py
+PREDICTION_CACHE_SIZE = 10000  # The cache of the predictions of the server, see src/utils/prediction_cache.py
+PREDICTION_CACHE_TTL_SECONDS = 3600
+PREDICTION_CACHE_BUCKETS = {'km_driven': 5000, 'myear': 1}
+STORAGE_FORMAT = 'csv'  # One of 'csv', 'parquet' or 'feather', see src/utils/storage.py
 
 SAVE_DATE_TIME_FORMAT = '%Y-%m-%d_%H-%M-%S'
 RAW_SAVE_DATE_TIME_FORMAT = '%Y_%m_%d_%H_%M_%S'  # The raw data is saved in this format
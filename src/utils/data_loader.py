@@ -1,16 +1,22 @@
+from __future__ import annotations
+
 import os
 import datetime
 
-from src.utils.constants import SAVE_DATE_TIME_FORMAT, RAW_DIR_PATH, RAW_SAVE_DATE_TIME_FORMAT
+from src.utils.constants import SAVE_DATE_TIME_FORMAT, RAW_DIR_PATH, RAW_SAVE_DATE_TIME_FORMAT, FEATURE_MATRIX_EXTENSION
+from src.utils.storage import get_storage
 
 
 class DataLoader:
 	def __init__(
 			self,
 			dir_path: str,
-			raw_format: bool = False
+			raw_format: bool = False,
+			storage_format: str | None = None
 	):
 		self.dir_path = dir_path
+		# Only look at the files saved in this format, any format if None
+		self.extension = get_storage(storage_format).extension if storage_format else None
 		if self.dir_path == RAW_DIR_PATH or raw_format:
 			self.save_date_time_format = RAW_SAVE_DATE_TIME_FORMAT
 		else:
@@ -24,14 +30,20 @@ class DataLoader:
 		
 		# Get the list of files in the directory
 		files = os.listdir(self.dir_path)
+		# Do not return the file found by a previous call with another begins_with
+		self.latest_file = None
 		
 		# If the latest file is not found, then find it
 		latest_file_time = None
 		for file in files:
-			if file.startswith(begins_with):
+			# The feature matrices saved next to the datasets are not datasets themselves
+			if file.endswith(FEATURE_MATRIX_EXTENSION):
+				continue
+			file_name, extension = os.path.splitext(file)
+			if file.startswith(begins_with) and (self.extension is None or extension == self.extension):
 				# Get the file time
 				file_time = datetime.datetime.strptime(
-					file[len(begins_with) + 1:-4], self.save_date_time_format)
+					file_name[len(begins_with) + 1:], self.save_date_time_format)
 				if latest_file_time is None or latest_file_time < file_time:
 					self.latest_file = file
 					latest_file_time = file_time
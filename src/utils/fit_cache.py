@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import glob
+import hashlib
+import inspect
+import os
+import sys
+import time
+from functools import lru_cache
+
+import joblib
+import pandas as pd
+from sklearn.base import BaseEstimator, TransformerMixin, clone
+from sklearn.utils.validation import check_is_fitted
+
+from src.utils.constants import FIT_CACHE_MAX_AGE_DAYS, FIT_CACHE_MAX_SIZE_MB
+
+# How long a process waits for another one fitting the same transformer before fitting it itself,
+# a lock older than that was left by a process which died
+LOCK_TIMEOUT_SECONDS = 600
+
+
+@lru_cache(maxsize=None)
+def _get_code_version(module_name: str) -> str:
+	# The source of the module of the transformer, so the transformers fitted by older code are not reused,
+	# or the version of the package it comes from if the source is not available
+	module = sys.modules.get(module_name)
+	try:
+		return hashlib.sha256(inspect.getsource(module).encode()).hexdigest()
+	except (OSError, TypeError):
+		package = sys.modules.get(module_name.split('.')[0])
+		return str(getattr(package, '__version__', None))
+
+
+class FitCache:
+	"""
+	Content addressed cache of fitted transformers. A transformer is stored under a hash of its class, the source of its
+	module, its parameters and the data it was fitted on, so fitting the same transformer on the same data again returns
+	the stored one. The files of cache_dir older than max_age_days are removed, then the oldest ones until the files
+	take less than max_size_mb.
+
+	Parameters
+	----------
+		cache_dir: str
+			Where to save the fitted transformers so they are reused across runs, only kept in memory if None
+		max_age_days: float
+			How long a saved transformer is kept after it was last used
+		max_size_mb: float
+			The size of cache_dir above which the transformers used the longest time ago are removed
+	"""
+
+	def __init__(self, cache_dir: str = None, max_age_days: float = FIT_CACHE_MAX_AGE_DAYS, max_size_mb: float = FIT_CACHE_MAX_SIZE_MB):
+		self.cache_dir = cache_dir
+		self.max_age_days = max_age_days
+		self.max_size_mb = max_size_mb
+		self.fitted = {}
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def get_key(transformer: BaseEstimator, X: pd.DataFrame, y: pd.Series = None) -> str:
+		key = hashlib.sha256()
+		key.update(f'{type(transformer).__module__}.{type(transformer).__qualname__}'.encode())
+		key.update(_get_code_version(type(transformer).__module__).encode())
+		key.update(repr(sorted(transformer.get_params(deep=True).items())).encode())
+		for data in (X, y):
+			if data is None:
+				key.update(b'None')
+				continue
+			# The names and dtypes are part of the key, hash_pandas_object only hashes the values and the index
+			key.update(repr(data.dtypes.to_dict() if isinstance(data, pd.DataFrame) else (data.name, data.dtype)).encode())
+			key.update(pd.util.hash_pandas_object(data, index=True).to_numpy().tobytes())
+		return key.hexdigest()
+
+	def _get_path(self, key: str) -> str:
+		return os.path.join(self.cache_dir, f'{key}.joblib')
+
+	def get(self, key: str) -> BaseEstimator | None:
+		fitted = self.fitted.get(key)
+		if fitted is None and self.cache_dir is not None and os.path.exists(self._get_path(key)):
+			fitted = joblib.load(self._get_path(key))
+			self.fitted[key] = fitted
+			# The time of the last use, which the eviction goes by
+			os.utime(self._get_path(key))
+
+		if fitted is None:
+			self.misses += 1
+		else:
+			self.hits += 1
+		print(f"Fit cache {'hit' if fitted is not None else 'miss'} for {key[:12]}, stats: {self.stats()}")
+		return fitted
+
+	def put(self, key: str, fitted: BaseEstimator) -> None:
+		self.fitted[key] = fitted
+		if self.cache_dir is not None:
+			os.makedirs(self.cache_dir, exist_ok=True)
+			# Written under another name first, so other processes never load a half written file
+			temp_path = f'{self._get_path(key)}.{os.getpid()}.tmp'
+			joblib.dump(fitted, temp_path)
+			os.replace(temp_path, self._get_path(key))
+			self.evict()
+	
+	def evict(self) -> None:
+		"""
+		Remove the saved transformers not used for max_age_days, then the ones used the longest time ago
+		until cache_dir holds less than max_size_mb
+		"""
+		if self.cache_dir is None:
+			return
+		files = []
+		for path in glob.glob(os.path.join(self.cache_dir, '*.joblib')):
+			try:
+				files.append((os.path.getmtime(path), os.path.getsize(path), path))
+			except FileNotFoundError:
+				continue
+		
+		oldest_allowed = time.time() - self.max_age_days * 24 * 3600
+		size = sum(file_size for _, file_size, _ in files)
+		for last_used, file_size, path in sorted(files):
+			if last_used >= oldest_allowed and size <= self.max_size_mb * 1024 ** 2:
+				break
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				# Removed by another process at the same time
+				pass
+			size -= file_size
+	
+	def get_or_fit(self, key: str, fit: callable) -> BaseEstimator:
+		"""
+		Get the fitted transformer of key, or fit it with fit() and store it.
+		With a cache_dir, processes fitting the same key at the same time (e.g. the models trained concurrently)
+		wait for the first one instead of fitting it again.
+		"""
+		fitted = self.get(key)
+		if fitted is not None:
+			return fitted
+		if self.cache_dir is None:
+			fitted = fit()
+			self.put(key, fitted)
+			return fitted
+		
+		os.makedirs(self.cache_dir, exist_ok=True)
+		lock_path = f'{self._get_path(key)}.lock'
+		while True:
+			try:
+				os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL))
+				break
+			except FileExistsError:
+				try:
+					stale = time.time() - os.path.getmtime(lock_path) > LOCK_TIMEOUT_SECONDS
+				except FileNotFoundError:
+					# Released in the meantime
+					continue
+				if stale:
+					# The process holding it died or is stuck, take the lock over
+					print(f'Fit cache lock {lock_path} timed out, removing it')
+					try:
+						os.remove(lock_path)
+					except FileNotFoundError:
+						pass
+					continue
+				time.sleep(0.1)
+		
+		try:
+			# Another process may have stored it while this one was waiting for the lock
+			if os.path.exists(self._get_path(key)):
+				return self.get(key)
+			fitted = fit()
+			self.put(key, fitted)
+			return fitted
+		finally:
+			os.remove(lock_path)
+
+	def stats(self) -> dict:
+		return {'hits': self.hits, 'misses': self.misses, 'size': len(self.fitted)}
+
+
+FIT_CACHES = {}
+
+
+def get_fit_cache(cache_dir: str = None) -> FitCache:
+	"""
+	Get the cache shared by every transformer using cache_dir, the in memory cache if it is None
+	"""
+	if cache_dir not in FIT_CACHES:
+		FIT_CACHES[cache_dir] = FitCache(cache_dir)
+	return FIT_CACHES[cache_dir]
+
+
+class CachedTransformer(BaseEstimator, TransformerMixin):
+	"""
+	Wraps a transformer so that fitting it on data it was already fitted on reuses the fitted transformer from the cache,
+	e.g. the feature engineering shared by the CatBoost and LightGBM pipelines.
+
+	Parameters
+	----------
+		transformer: BaseEstimator
+			The transformer to fit, it is left unfitted and the fitted one is in fitted_transformer_
+		cache_dir: str
+			The cache_dir of the FitCache to use
+	"""
+
+	def __init__(self, transformer: BaseEstimator, cache_dir: str = None):
+		self.transformer = transformer
+		self.cache_dir = cache_dir
+
+	def fit(self, X: pd.DataFrame, y: pd.Series = None, **fit_params) -> 'CachedTransformer':
+		cache = get_fit_cache(self.cache_dir)
+		key = cache.get_key(self.transformer, X, y)
+		self.fitted_transformer_ = cache.get_or_fit(key, lambda: clone(self.transformer).fit(X, y, **fit_params))
+		return self
+
+	def fit_transform(self, X: pd.DataFrame, y: pd.Series = None, **fit_params) -> pd.DataFrame:
+		# The fit params are about the rows of X, like the feature_matrix of FeatureEngineeringTransformations,
+		# so the transform of the same rows takes them too
+		return self.fit(X, y, **fit_params).transform(X, **fit_params)
+
+	def transform(self, X: pd.DataFrame, **transform_params) -> pd.DataFrame:
+		check_is_fitted(self, 'fitted_transformer_')
+		return self.fitted_transformer_.transform(X, **transform_params)
@@ -16,6 +16,7 @@ class MatchingImputerArguments:
 	copy: bool = False  # Whether to copy the dataset or impute in place
 	match_level: int = 0
 	match_level_array: list[int] = None
+	strategies: dict[str, callable] = None  # Strategy of each target column when imputing several, categorical columns use the mode by default
 
 
 @dataclass
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from src.utils.constants import BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS
+
+
+class Histogram:
+	"""
+	Counts of values in power of two buckets, e.g. the sizes of the batches. A bucket counts the values up to its bound.
+	"""
+
+	def __init__(self):
+		self.counts = {}
+		self.lock = threading.Lock()
+
+	def add(self, value: float) -> None:
+		bound = 1 if value <= 1 else 2 ** int(np.ceil(np.log2(value)))
+		with self.lock:
+			self.counts[bound] = self.counts.get(bound, 0) + 1
+
+	def to_dict(self) -> dict:
+		with self.lock:
+			return {f'<={bound}': count for bound, count in sorted(self.counts.items())}
+
+
+class MicroBatcher:
+	"""
+	Collects the items submitted by concurrent callers for up to max_wait_ms or max_batch_size items, runs predict_batch once
+	on all of them in a worker thread, and hands every caller back its own result.
+
+	Parameters
+	----------
+		predict_batch: callable
+			Takes the list of items of a batch and returns the list of their results, in the same order
+		max_wait_ms: float
+			How long the first item of a batch waits for more items
+		max_batch_size: int
+			The maximum number of items in a batch
+	"""
+
+	def __init__(self, predict_batch: callable, max_wait_ms: float = BATCH_MAX_WAIT_MS, max_batch_size: int = BATCH_MAX_SIZE):
+		self.predict_batch = predict_batch
+		self.max_wait_ms = max_wait_ms
+		self.max_batch_size = max_batch_size
+		self.queue = queue.Queue()
+		self.batch_sizes = Histogram()
+		self.queue_depths = Histogram()
+		self.wait_ms = Histogram()
+		self._closed = False
+		self._worker = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+		self._worker.start()
+
+	def submit(self, item) -> Future:
+		"""
+		Queue an item, the returned future gets its result once its batch has run
+		"""
+		if self._closed:
+			raise RuntimeError('The batcher is closed')
+		future = Future()
+		self.queue.put((item, future, time.perf_counter()))
+		return future
+
+	def predict(self, item):
+		return self.submit(item).result()
+
+	def _collect_batch(self) -> list | None:
+		first = self.queue.get()
+		if first is None:
+			return None
+		self.queue_depths.add(self.queue.qsize() + 1)
+		batch = [first]
+		deadline = time.perf_counter() + self.max_wait_ms / 1000
+		while len(batch) < self.max_batch_size:
+			remaining = deadline - time.perf_counter()
+			try:
+				# Take what is already queued without waiting, then wait for more until the deadline
+				item = self.queue.get_nowait() if remaining <= 0 else self.queue.get(timeout=remaining)
+			except queue.Empty:
+				break
+			if item is None:
+				# Closed while collecting, run this batch first
+				self.queue.put(None)
+				break
+			batch.append(item)
+		return batch
+
+	def _run(self) -> None:
+		while True:
+			batch = self._collect_batch()
+			if batch is None:
+				return
+			self.batch_sizes.add(len(batch))
+			started = time.perf_counter()
+			for _, _, submitted in batch:
+				self.wait_ms.add((started - submitted) * 1000)
+
+			try:
+				results = self.predict_batch([item for item, _, _ in batch])
+			except Exception:
+				# One bad item should not fail the whole batch, run them one by one to find which ones fail
+				for item, future, _ in batch:
+					try:
+						future.set_result(self.predict_batch([item])[0])
+					except Exception as e:
+						future.set_exception(e)
+				continue
+			for (_, future, _), result in zip(batch, results):
+				future.set_result(result)
+
+	def get_stats(self) -> dict:
+		return {
+			'max_wait_ms': self.max_wait_ms,
+			'max_batch_size': self.max_batch_size,
+			'queue_depth': self.queue.qsize(),
+			'batch_sizes': self.batch_sizes.to_dict(),
+			'queue_depths': self.queue_depths.to_dict(),
+			'wait_ms': self.wait_ms.to_dict(),
+		}
+
+	def close(self) -> None:
+		"""
+		Run the items already queued and stop the worker
+		"""
+		if not self._closed:
+			self._closed = True
+			self.queue.put(None)
+			self._worker.join()
@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from sklearn import pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import MinMaxScaler, OneHotEncoder
+
+from src.feature_engineering.feature_matrix import FeatureMatrix, _parse_feature_list
+from src.utils.fit_cache import CachedTransformer
+
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+# The model file of every booster, in its native format
+BOOSTER_FILES = {
+	'catboost': 'model.cbm',
+	'lightgbm': 'model.txt',
+}
+# The inverse transforms of the target which can be saved by name
+INVERSE_TRANSFORMS = {
+	'exp': np.exp,
+	'expm1': np.expm1,
+}
+# The types of the numbers of a car, bool is an int but never a valid number
+NUMBER_TYPES = (int, float, np.number)
+# Key of the missing values in the one-hot lookups of predict_one, NaN cannot be looked up in a dict
+MISSING = object()
+
+
+def _to_json_value(value):
+	# The categories are numpy scalars or python objects, and NaN is not valid JSON
+	if isinstance(value, float) and np.isnan(value):
+		return None
+	return value.item() if isinstance(value, np.generic) else value
+
+
+def _from_json_values(values: list) -> np.ndarray:
+	return np.array([np.nan if value is None else value for value in values], dtype=object)
+
+
+def _is_missing(value) -> bool:
+	return value is None or (isinstance(value, float) and value != value)
+
+
+def _get_value_types(values: list) -> tuple:
+	# The types of the valid values of a column with these known values, numbers of any type or text
+	types = set()
+	for value in values:
+		if not _is_missing(value):
+			types.update(NUMBER_TYPES if isinstance(value, NUMBER_TYPES) and not isinstance(value, bool) else (type(value),))
+	return tuple(types)
+
+
+def _save_step(step, arrays: dict, prefix: str) -> dict:
+	# The fitted parameters of a step of the column transformer, the arrays are saved as .npy files
+	if isinstance(step, MinMaxScaler):
+		if step.clip:
+			raise ValueError('The MinMaxScaler with clip=True cannot be saved')
+		arrays[f'{prefix}scale'] = step.scale_
+		arrays[f'{prefix}min'] = step.min_
+		return {'kind': 'min_max_scaler'}
+	if isinstance(step, SimpleImputer):
+		if step.add_indicator:
+			raise ValueError('The SimpleImputer with add_indicator=True cannot be saved')
+		return {'kind': 'simple_imputer', 'statistics': [_to_json_value(value) for value in step.statistics_]}
+	if isinstance(step, OneHotEncoder):
+		if step.drop_idx_ is not None or step.handle_unknown != 'ignore' or step._infrequent_enabled:
+			raise ValueError('Only the OneHotEncoder with handle_unknown="ignore", no drop and no infrequent categories can be saved')
+		return {
+			'kind': 'one_hot_encoder',
+			'categories': [[_to_json_value(value) for value in categories] for categories in step.categories_],
+		}
+	raise ValueError(f'Cannot save the step {type(step).__name__}, add it to src/utils/model_artifacts.py')
+
+
+def _apply_step(step: dict, values: np.ndarray, arrays: dict, prefix: str) -> np.ndarray:
+	if step['kind'] == 'min_max_scaler':
+		# Same operations as the MinMaxScaler, so the values are exactly the same
+		values = values.astype(np.float64)
+		values *= arrays[f'{prefix}scale']
+		values += arrays[f'{prefix}min']
+		return values
+	if step['kind'] == 'simple_imputer':
+		values = values.copy()
+		for i, statistic in enumerate(_from_json_values(step['statistics'])):
+			values[pd.isna(values[:, i]), i] = statistic
+		return values
+	if step['kind'] == 'one_hot_encoder':
+		blocks = []
+		for i, categories in enumerate(step['categories']):
+			# The unknown categories are all zeros, like handle_unknown='ignore'
+			codes = pd.Index(_from_json_values(categories)).get_indexer(values[:, i])
+			block = np.zeros((len(values), len(categories)))
+			known = np.flatnonzero(codes != -1)
+			block[known, codes[known]] = 1.0
+			blocks.append(block)
+		return np.hstack(blocks) if blocks else np.empty((len(values), 0))
+	raise ValueError(f'Unknown step {step["kind"]}')
+
+
+def _save_preprocessor(preprocessor: pipeline.Pipeline, arrays: dict) -> dict:
+	# The preprocessors of src/model_selection: the feature engineering, then a column transformer of small pipelines
+	feature_engineering = preprocessor.named_steps['feature_engineering']
+	if isinstance(feature_engineering, CachedTransformer):
+		feature_engineering = feature_engineering.fitted_transformer_
+	arrays['feature_scores'] = feature_engineering.feature_scores_
+
+	column_transformer = preprocessor.named_steps['column_transformer']
+	if not isinstance(column_transformer, ColumnTransformer) or column_transformer.remainder != 'drop':
+		raise ValueError('Only a column transformer dropping the remaining columns can be saved')
+	transformers = []
+	for name, transformer, columns in column_transformer.transformers_:
+		if transformer == 'drop' or len(columns) == 0:
+			continue
+		steps = transformer.steps if isinstance(transformer, pipeline.Pipeline) else [(name, transformer)]
+		transformers.append({
+			'name': name,
+			'columns': list(columns),
+			'feature_names': transformer.get_feature_names_out(columns).tolist(),
+			'steps': [
+				{'name': step_name, **_save_step(step, arrays, f'{name}__{step_name}__')} for step_name, step in steps
+			],
+		})
+
+	return {
+		'object_cols': list(feature_engineering.object_cols),
+		'vocabulary': list(feature_engineering.vocabulary_),
+		'transformers': transformers,
+	}
+
+
+def _save_booster(model, path: str) -> str:
+	# The libraries are imported in the functions, so loading an artifact only imports the one of its booster
+	from catboost import CatBoostRegressor
+	from lightgbm import LGBMRegressor
+
+	if isinstance(model, CatBoostRegressor):
+		model.save_model(os.path.join(path, BOOSTER_FILES['catboost']), format='cbm')
+		return 'catboost'
+	if isinstance(model, LGBMRegressor):
+		model.booster_.save_model(os.path.join(path, BOOSTER_FILES['lightgbm']))
+		return 'lightgbm'
+	raise ValueError(f'Cannot save the model {type(model).__name__}')
+
+
+def _load_booster(booster: str, path: str):
+	if booster == 'catboost':
+		from catboost import CatBoostRegressor
+		return CatBoostRegressor().load_model(os.path.join(path, BOOSTER_FILES['catboost']), format='cbm')
+	if booster == 'lightgbm':
+		from lightgbm import Booster
+		return Booster(model_file=os.path.join(path, BOOSTER_FILES['lightgbm']))
+	raise ValueError(f'Unknown booster {booster}, should be one of {list(BOOSTER_FILES.keys())}')
+
+
+def save_model_artifact(model_pipeline: pipeline.Pipeline, path: str, inverse_transform: callable = None) -> str:
+	"""
+	Save a fitted ('preprocessor', 'model') pipeline of src/model_training/training.py as a directory holding
+	the booster in its native format, the fitted parameters of the preprocessor in a JSON manifest, and their arrays
+	as .npy files which are memory-mapped when loaded. Unlike a pickle, it does not depend on the versions of sklearn or pandas.
+
+	Parameters
+	----------
+		model_pipeline: pipeline.Pipeline
+			The fitted pipeline
+		path: str
+			The directory to save to, created if needed
+		inverse_transform: callable
+			The inverse of the transform of the target applied to the predictions, one of INVERSE_TRANSFORMS
+
+	Returns
+	-------
+		str
+			The path of the artifact
+	"""
+	inverse_transform_name = None
+	if inverse_transform is not None:
+		names = [name for name, function in INVERSE_TRANSFORMS.items() if function is inverse_transform]
+		if not names:
+			raise ValueError(f'Cannot save the inverse transform {inverse_transform}, should be one of {list(INVERSE_TRANSFORMS.keys())}')
+		inverse_transform_name = names[0]
+
+	os.makedirs(path, exist_ok=True)
+	arrays = {}
+	manifest = {
+		'format_version': ARTIFACT_FORMAT_VERSION,
+		'preprocessor': _save_preprocessor(model_pipeline.named_steps['preprocessor'], arrays),
+		'booster': _save_booster(model_pipeline.named_steps['model'], path),
+		'inverse_transform': inverse_transform_name,
+		'arrays': list(arrays.keys()),
+	}
+	for name, array in arrays.items():
+		np.save(os.path.join(path, f'{name}.npy'), np.ascontiguousarray(array))
+	with open(os.path.join(path, MANIFEST_FILE), 'w') as f:
+		json.dump(manifest, f)
+	return path
+
+
+class ModelArtifact:
+	"""
+	A model loaded from a directory saved by save_model_artifact, which preprocesses and predicts like the pipeline did.
+	Use load_model_artifact to load it.
+	"""
+
+	def __init__(self, manifest: dict, arrays: dict[str, np.ndarray], booster):
+		self.manifest = manifest
+		self.arrays = arrays
+		self.booster = booster
+		self.preprocessor = manifest['preprocessor']
+		self.feature_names_out = [
+			f'{transformer["name"]}__{name}'
+			for transformer in self.preprocessor['transformers'] for name in transformer['feature_names']
+		]
+		self._compile_row_layout()
+	
+	def _compile_row_layout(self) -> None:
+		# Work out once where every value of a car goes in the input row of the booster, for predict_one
+		self._feature_index = {feature: i for i, feature in enumerate(self.preprocessor['vocabulary'])}
+		self._feature_scores = np.asarray(self.arrays['feature_scores']).tolist()
+		self._layout = []
+		# The types of the values of the car, for check_car: the feature lists are text or lists, the categorical
+		# columns have the types of their categories and the scaled ones are numbers
+		self._value_types = {col: (str, list) for col in self.preprocessor['object_cols']}
+		score_columns = {f'{col}_score' for col in self.preprocessor['object_cols']}
+		position = 0
+		for transformer in self.preprocessor['transformers']:
+			for j, column in enumerate(transformer['columns']):
+				write, width = self._compile_column(transformer, j, position)
+				self._layout.append((column, write))
+				position += width
+				if column not in self._value_types and column not in score_columns:
+					self._value_types[column] = self._get_column_types(transformer, j)
+		self._row_buffers = threading.local()
+	
+	def _get_column_types(self, transformer: dict, j: int) -> tuple:
+		for step in transformer['steps']:
+			if step['kind'] == 'one_hot_encoder':
+				return _get_value_types(step['categories'][j])
+			if step['kind'] == 'min_max_scaler':
+				return NUMBER_TYPES
+		# A column which is only imputed, like the categories of CatBoost, has the type of its fill value
+		statistics = [step['statistics'][j] for step in transformer['steps'] if step['kind'] == 'simple_imputer']
+		return _get_value_types(statistics) or (object,)
+	
+	@property
+	def input_columns(self) -> list[str]:
+		"""
+		The columns of the data the model reads: the feature lists and the columns of the column transformer
+		"""
+		return list(self._value_types)
+	
+	def check_car(self, car: dict) -> None:
+		"""
+		Raise a TypeError if a value of the car does not have the type of its column, e.g. a number for a categorical
+		column, which would be predicted as an unknown category. The missing values are always valid.
+		"""
+		for column, types in self._value_types.items():
+			value = car.get(column)
+			if not _is_missing(value) and (not isinstance(value, types) or (isinstance(value, bool) and bool not in types)):
+				expected = sorted({'number' if t in NUMBER_TYPES else t.__name__ for t in types})
+				raise TypeError(f'{column} should be a {" or a ".join(expected)}, not {type(value).__name__} {value!r}')
+	
+	def _compile_column(self, transformer: dict, j: int, position: int) -> tuple[callable, int]:
+		# A function writing the j-th column of the transformer into the row, and the number of values it writes
+		maps = []
+		for step in transformer['steps']:
+			prefix = f'{transformer["name"]}__{step["name"]}__'
+			if step['kind'] == 'min_max_scaler':
+				scale, min_ = float(self.arrays[f'{prefix}scale'][j]), float(self.arrays[f'{prefix}min'][j])
+				maps.append(lambda value, scale=scale, min_=min_: np.nan if _is_missing(value) else float(value) * scale + min_)
+			elif step['kind'] == 'simple_imputer':
+				fill = _from_json_values(step['statistics'])[j]
+				maps.append(lambda value, fill=fill: fill if _is_missing(value) else value)
+			elif step['kind'] == 'one_hot_encoder':
+				categories = _from_json_values(step['categories'][j])
+				lookup = {
+					MISSING if _is_missing(category) else category: position + k for k, category in enumerate(categories)
+				}
+				
+				def write_one_hot(value, row, maps=tuple(maps), lookup=lookup):
+					for map_value in maps:
+						value = map_value(value)
+					k = lookup.get(MISSING if _is_missing(value) else value)
+					if k is not None:
+						row[k] = 1.0
+				return write_one_hot, len(categories)
+			else:
+				raise ValueError(f'Unknown step {step["kind"]}')
+		
+		def write(value, row, maps=tuple(maps)):
+			for map_value in maps:
+				value = map_value(value)
+			row[position] = value
+		return write, 1
+	
+	def _get_row_buffer(self) -> list | np.ndarray:
+		# LightGBM takes a float array, allocated once per thread and zeroed for the one-hot encodings
+		if self.manifest['booster'] != 'lightgbm':
+			return [None] * len(self.feature_names_out)
+		row = getattr(self._row_buffers, 'row', None)
+		if row is None:
+			row = self._row_buffers.row = np.zeros(len(self.feature_names_out))
+		else:
+			row.fill(0.0)
+		return row
+	
+	def _fill_row(self, car: dict, row: list | np.ndarray) -> None:
+		scores = {f'{col}_score': self._score_one(car.get(col)) for col in self.preprocessor['object_cols']}
+		for column, write in self._layout:
+			write(scores[column] if column in scores else car.get(column), row)
+	
+	def feature_vector_bytes(self, car: dict) -> bytes:
+		"""
+		The input row of the booster for the car as bytes, equal for the cars the booster cannot tell apart
+		"""
+		row = self._get_row_buffer()
+		self._fill_row(car, row)
+		# repr writes the floats exactly, and the missing values the same way
+		return row.tobytes() if isinstance(row, np.ndarray) else repr([float(value) if isinstance(value, np.floating) else value for value in row]).encode()
+	
+	def _score_one(self, feature_list: str | list | None) -> float:
+		# The score of FeatureEngineeringTransformations for one car, a missing list scores like an empty one
+		if _is_missing(feature_list):
+			return np.nan
+		features = _parse_feature_list(feature_list) if isinstance(feature_list, str) else feature_list
+		score = 0.0
+		for feature in features:
+			i = self._feature_index.get(feature)
+			if i is not None:
+				score += self._feature_scores[i]
+		return np.nan if score == 0 else score
+	
+	def _feature_engineering(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
+		# The scores of FeatureEngineeringTransformations, from the saved feature matrix of the rows of X if there is one
+		object_cols = self.preprocessor['object_cols']
+		if feature_matrix is None:
+			feature_matrix = FeatureMatrix.from_frame(X, object_cols, vocabulary=self.preprocessor['vocabulary'])
+		else:
+			if not feature_matrix.index.equals(X.index):
+				feature_matrix = feature_matrix.take(X.index)
+			feature_matrix = feature_matrix.reindex(self.preprocessor['vocabulary'])
+		scores = {
+			f'{col}_score': pd.Series(feature_matrix.matrices[col] @ self.arrays['feature_scores'], index=X.index).replace(0, np.nan)
+			for col in object_cols
+		}
+		return pd.concat([X.drop(columns=object_cols), pd.DataFrame(scores, index=X.index)], axis=1)
+
+	def transform(self, X: pd.DataFrame, feature_matrix: FeatureMatrix = None) -> pd.DataFrame:
+		"""
+		The input of the booster, the same as the output of the fitted preprocessor. feature_matrix is the FeatureMatrix
+		of the rows of X saved with the dataset, if it was loaded.
+		"""
+		X = self._feature_engineering(X, feature_matrix)
+		blocks = []
+		for transformer in self.preprocessor['transformers']:
+			values = X[transformer['columns']].to_numpy()
+			for step in transformer['steps']:
+				values = _apply_step(step, values, self.arrays, f'{transformer["name"]}__{step["name"]}__')
+			columns = [f'{transformer["name"]}__{name}' for name in transformer['feature_names']]
+			blocks.append(pd.DataFrame(values, index=X.index, columns=columns))
+		return pd.concat(blocks, axis=1)
+
+	def _inverse_transform(self, y_preds):
+		if self.manifest['inverse_transform'] is not None:
+			y_preds = INVERSE_TRANSFORMS[self.manifest['inverse_transform']](y_preds)
+		return y_preds
+
+	def predict(self, X: pd.DataFrame, raw: bool = False, feature_matrix: FeatureMatrix = None) -> np.ndarray:
+		"""
+		The predictions of the pipeline, or the raw predictions of the booster (e.g. the log-prices) before the inverse transform
+		"""
+		y_preds = self.booster.predict(self.transform(X, feature_matrix))
+		return y_preds if raw else self._inverse_transform(y_preds)
+	
+	def predict_one(self, car: dict) -> float:
+		"""
+		Predict the price of a single car given as a dict of its columns, without building any dataframe.
+		The feature list columns can be lists or stringified lists, the missing columns are missing values.
+		"""
+		row = self._get_row_buffer()
+		self._fill_row(car, row)
+		
+		if self.manifest['booster'] == 'lightgbm':
+			y_pred = self.booster.predict(row.reshape(1, -1))[0]
+		else:
+			# CatBoost predicts a single object given as a list of its values
+			y_pred = self.booster.predict(row)
+		return float(self._inverse_transform(y_pred))
+	
+	def predict_many(self, cars: list[dict], raw: bool = False) -> np.ndarray:
+		"""
+		Predict the prices of several cars like predict_one, with a single call to the booster.
+		With raw, the predictions of the booster before the inverse transform.
+		"""
+		if self.manifest['booster'] == 'lightgbm':
+			rows = np.zeros((len(cars), len(self.feature_names_out)))
+		else:
+			rows = [[None] * len(self.feature_names_out) for _ in cars]
+		for car, row in zip(cars, rows):
+			self._fill_row(car, row)
+		
+		y_preds = self.booster.predict(rows)
+		return y_preds if raw else self._inverse_transform(y_preds)
+
+
+def load_model_artifact(path: str, mmap: bool = True, compiled: bool = False) -> ModelArtifact:
+	"""
+	Load a model saved by save_model_artifact, memory-mapping its arrays unless mmap is False.
+	With compiled, the booster is replaced by its flat array version from src/utils/compiled_trees.py, evaluated with NumPy.
+	"""
+	with open(os.path.join(path, MANIFEST_FILE)) as f:
+		manifest = json.load(f)
+	if manifest['format_version'] != ARTIFACT_FORMAT_VERSION:
+		raise ValueError(f'Unsupported model artifact version {manifest["format_version"]}, expected {ARTIFACT_FORMAT_VERSION}')
+
+	arrays = {
+		name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r' if mmap else None)
+		for name in manifest['arrays']
+	}
+	booster = _load_booster(manifest['booster'], path)
+	if compiled:
+		from src.utils.compiled_trees import compile_booster
+		booster = compile_booster(booster)
+	return ModelArtifact(manifest, arrays, booster)
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import numbers
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from src.utils.constants import PREDICTION_CACHE_BUCKETS, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL_SECONDS
+
+
+def _get_size(value) -> int:
+	# Approximate memory of a cached value, the dicts of prices and the keys
+	if isinstance(value, dict):
+		return sys.getsizeof(value) + sum(_get_size(k) + _get_size(v) for k, v in value.items())
+	return sys.getsizeof(value)
+
+
+class PredictionCache:
+	"""
+	A bounded LRU cache of the predictions with a time to live, safe to share between the threads of the server.
+	The cars are bucketed before they are keyed and predicted, so close cars share the same entry.
+
+	Parameters
+	----------
+		max_size: int
+			The maximum number of predictions kept, the least recently used ones are evicted first
+		ttl_seconds: float
+			How long a prediction is kept, None keeps them until they are evicted
+		buckets: dict
+			The bucket width of numerical columns, e.g. {'km_driven': 5000} rounds the km to the nearest 5000
+	"""
+
+	def __init__(
+			self,
+			max_size: int = PREDICTION_CACHE_SIZE,
+			ttl_seconds: float | None = PREDICTION_CACHE_TTL_SECONDS,
+			buckets: dict[str, float] = None,
+	):
+		self.max_size = max_size
+		self.ttl_seconds = ttl_seconds
+		self.buckets = dict(PREDICTION_CACHE_BUCKETS if buckets is None else buckets)
+		self.entries = OrderedDict()
+		self.lock = threading.Lock()
+		self.memory_bytes = 0
+		self.hits = self.misses = self.evictions = self.expirations = self.invalidations = 0
+
+	def bucket(self, car: dict) -> dict:
+		"""
+		The car with its bucketed columns rounded to the nearest multiple of their bucket width
+		"""
+		bucketed = None
+		for column, width in self.buckets.items():
+			value = car.get(column)
+			if width and isinstance(value, numbers.Real) and not math.isnan(value):
+				if bucketed is None:
+					bucketed = dict(car)
+				bucketed[column] = round(value / width) * width
+		return car if bucketed is None else bucketed
+
+	@staticmethod
+	def make_key(feature_vectors: list[bytes]) -> bytes:
+		"""
+		Canonical key of the preprocessed feature vectors of a car, see ModelArtifact.feature_vector_bytes
+		"""
+		digest = hashlib.blake2b(digest_size=16)
+		for feature_vector in feature_vectors:
+			digest.update(len(feature_vector).to_bytes(8, 'little'))
+			digest.update(feature_vector)
+		return digest.digest()
+
+	def get(self, key: bytes):
+		"""
+		The cached prediction, or None if it is not cached or has expired
+		"""
+		with self.lock:
+			entry = self.entries.get(key)
+			if entry is not None and self.ttl_seconds is not None and time.monotonic() - entry[1] > self.ttl_seconds:
+				self._remove(key)
+				self.expirations += 1
+				entry = None
+			if entry is None:
+				self.misses += 1
+				return None
+			self.entries.move_to_end(key)
+			self.hits += 1
+			return entry[0]
+
+	def put(self, key: bytes, value) -> None:
+		if self.max_size <= 0:
+			return
+		size = _get_size(key) + _get_size(value)
+		with self.lock:
+			if key in self.entries:
+				self._remove(key)
+			self.entries[key] = (value, time.monotonic(), size)
+			self.memory_bytes += size
+			while len(self.entries) > self.max_size:
+				self._remove(next(iter(self.entries)))
+				self.evictions += 1
+
+	def _remove(self, key: bytes) -> None:
+		self.memory_bytes -= self.entries.pop(key)[2]
+
+	def clear(self) -> None:
+		"""
+		Drop all the predictions, e.g. when new models are loaded
+		"""
+		with self.lock:
+			self.entries.clear()
+			self.memory_bytes = 0
+			self.invalidations += 1
+
+	def get_stats(self) -> dict:
+		with self.lock:
+			lookups = self.hits + self.misses
+			return {
+				'size': len(self.entries),
+				'max_size': self.max_size,
+				'ttl_seconds': self.ttl_seconds,
+				'buckets': self.buckets,
+				'hits': self.hits,
+				'misses': self.misses,
+				'hit_rate': self.hits / lookups if lookups else 0.0,
+				'evictions': self.evictions,
+				'expirations': self.expirations,
+				'invalidations': self.invalidations,
+				'memory_bytes': self.memory_bytes + sys.getsizeof(self.entries),
+			}
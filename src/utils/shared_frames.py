@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+
+def frame_to_shared_memory(df: pd.DataFrame) -> tuple[str, int]:
+	"""
+	Write the dataframe as an Arrow IPC stream into a new shared memory block, so it can be handed to another
+	process without pickling it. The caller of frame_from_shared_memory is responsible for unlinking the block.
+
+	Returns
+	-------
+		(str, int)
+			The name of the shared memory block and the number of bytes written to it
+	"""
+	import pyarrow as pa
+
+	table = pa.Table.from_pandas(df, preserve_index=True)
+	
+	# Measure the stream first, so it can be written straight into the shared memory block without a copy
+	sizer = pa.MockOutputStream()
+	with pa.ipc.new_stream(sizer, table.schema) as writer:
+		writer.write_table(table)
+	size = sizer.size()
+	
+	shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+	_write_stream(table, pa.FixedSizeBufferWriter(pa.py_buffer(shm.buf)))
+	name = shm.name
+	shm.close()
+	return name, size
+
+
+def _write_stream(table, sink) -> None:
+	# Kept in its own function so every reference to the shared memory buffer is gone once it returns
+	import pyarrow as pa
+
+	with pa.ipc.new_stream(sink, table.schema) as writer:
+		writer.write_table(table)
+	sink.close()
+
+
+def frame_from_shared_memory(name: str, size: int, unlink: bool = False) -> pd.DataFrame:
+	"""
+	Read back a dataframe written by frame_to_shared_memory, optionally unlinking the shared memory block after
+	"""
+	import pyarrow as pa
+
+	shm = shared_memory.SharedMemory(name=name)
+	try:
+		df = _read_stream(pa.py_buffer(shm.buf[:size]))
+	finally:
+		shm.close()
+		if unlink:
+			shm.unlink()
+	return df
+
+
+def _read_stream(buffer) -> pd.DataFrame:
+	# Same as _write_stream, no reference to the shared memory buffer outlives this function
+	import pyarrow as pa
+
+	with pa.ipc.open_stream(buffer) as reader:
+		table = reader.read_all()
+	# to_pandas copies the data into new blocks, so the dataframe never points into the shared memory block
+	return table.to_pandas()
+
+
+def unlink_shared_memory(name: str) -> None:
+	"""
+	Free a shared memory block which was read with unlink=False, e.g. by several processes
+	"""
+	shm = shared_memory.SharedMemory(name=name)
+	shm.close()
+	shm.unlink()
+
+
+def arrays_to_shared_memory(df: pd.DataFrame) -> dict:
+	"""
+	Write a preprocessed dataframe into a new shared memory block, the numeric columns as one float64 matrix and the object
+	columns (e.g. the categories of CatBoost) as int32 codes, so other processes can use the matrix as numpy views instead
+	of copying it. The caller is responsible for unlinking the block with unlink_shared_memory.
+
+	Returns
+	-------
+		dict
+			The name of the shared memory block and what is needed to rebuild the dataframe from it, for arrays_from_shared_memory
+	"""
+	object_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
+	numeric_cols = [col for col in df.columns if col not in object_cols]
+	n_rows = len(df)
+	numeric_size = n_rows * len(numeric_cols) * np.dtype(np.float64).itemsize
+	codes_size = n_rows * len(object_cols) * np.dtype(np.int32).itemsize
+	
+	shm = shared_memory.SharedMemory(create=True, size=max(numeric_size + codes_size, 1))
+	try:
+		# Fortran order, so every column is contiguous like the blocks of a dataframe
+		numeric = np.ndarray((n_rows, len(numeric_cols)), dtype=np.float64, buffer=shm.buf, order='F')
+		numeric[:] = df[numeric_cols].to_numpy(dtype=np.float64)
+		codes = np.ndarray((n_rows, len(object_cols)), dtype=np.int32, buffer=shm.buf, offset=numeric_size, order='F')
+		categories = []
+		for i, col in enumerate(object_cols):
+			col_codes, col_categories = pd.factorize(df[col])
+			codes[:, i] = col_codes
+			# The missing values have the code -1, which picks the nan added at the end
+			categories.append(np.append(col_categories.to_numpy(dtype=object), np.nan))
+		del numeric, codes
+	finally:
+		shm.close()
+	
+	return {
+		'name': shm.name,
+		'index': df.index,
+		'columns': df.columns.tolist(),
+		'numeric_cols': numeric_cols,
+		'object_cols': object_cols,
+		'categories': categories,
+	}
+
+
+def arrays_from_shared_memory(block: dict) -> tuple[pd.DataFrame, shared_memory.SharedMemory]:
+	"""
+	Rebuild a dataframe written by arrays_to_shared_memory. The numeric columns are views over the shared memory block,
+	only the object columns are decoded into new arrays.
+
+	Returns
+	-------
+		(pd.DataFrame, SharedMemory)
+			The dataframe, and the block it points into, to be closed once the dataframe is no longer used
+	"""
+	shm = shared_memory.SharedMemory(name=block['name'])
+	n_rows = len(block['index'])
+	numeric_cols, object_cols = block['numeric_cols'], block['object_cols']
+	numeric = np.ndarray((n_rows, len(numeric_cols)), dtype=np.float64, buffer=shm.buf, order='F')
+	codes = np.ndarray(
+		(n_rows, len(object_cols)), dtype=np.int32, buffer=shm.buf, offset=numeric.nbytes, order='F'
+	)
+	
+	# A dataframe of a 2D array keeps it as its block without copying it
+	df = pd.DataFrame(numeric, index=block['index'], columns=numeric_cols, copy=False)
+	positions = {col: i for i, col in enumerate(block['columns'])}
+	for i, col in sorted(enumerate(object_cols), key=lambda item: positions[item[1]]):
+		df.insert(positions[col], col, block['categories'][i][codes[:, i]])
+	return df, shm
@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import json
+import os
+
+import pandas as pd
+
+from src.utils.constants import INDEX, STORAGE_FORMAT
+
+
+class Storage:
+	"""
+	Base class for the file formats used to save the data between the pipeline stages.
+
+	Parameters
+	----------
+		extension: str
+			The file extension used by the format, including the dot
+	"""
+	extension: str = None
+
+	def save(self, df: pd.DataFrame, file_path: str) -> str:
+		raise NotImplementedError
+
+	def load(self, file_path: str, columns: list[str] = None, index_col: str | None = INDEX) -> pd.DataFrame:
+		raise NotImplementedError
+
+	def open_writer(self, file_path: str) -> 'StorageWriter':
+		"""
+		Open a writer which appends dataframes with the same columns to file_path, one chunk at a time
+		"""
+		raise NotImplementedError
+
+
+class StorageWriter:
+	"""
+	Appends chunks of a dataframe to a single file. Use it as a context manager so the file is always closed.
+	"""
+
+	def __init__(self, file_path: str):
+		self.file_path = file_path
+		self.columns = None
+
+	def write(self, df: pd.DataFrame) -> None:
+		# Every chunk is written with the columns of the first one
+		if self.columns is None:
+			self.columns = df.columns.tolist()
+		self._write(df[self.columns])
+
+	def _write(self, df: pd.DataFrame) -> None:
+		raise NotImplementedError
+
+	def close(self) -> None:
+		pass
+
+	def __enter__(self) -> 'StorageWriter':
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback) -> None:
+		self.close()
+
+
+class CSVStorageWriter(StorageWriter):
+	def __init__(self, file_path: str):
+		super().__init__(file_path)
+		self.header_written = False
+
+	def _write(self, df: pd.DataFrame) -> None:
+		# Only the first chunk writes the header
+		df.to_csv(self.file_path, index=True, mode='a' if self.header_written else 'w', header=not self.header_written)
+		self.header_written = True
+
+
+class ArrowStorageWriter(StorageWriter):
+	"""
+	Writes every chunk with the schema of the first one, where the object columns are text, whatever their values, and the
+	ints are floats, which can get NaNs. A column typed as a number which gets text in a later chunk (e.g. a raw column empty
+	in the first chunk) is turned into text, and the chunks already written are written again with the new schema, one
+	record batch at a time so the memory used stays bounded by the size of a chunk.
+	"""
+
+	def __init__(self, file_path: str, open_file: callable, iter_batches: callable):
+		super().__init__(file_path)
+		self.open_file = open_file
+		self.iter_batches = iter_batches
+		self.schema = None
+		self.writer = None
+		# The chunks are written to a temporary file once the schema was widened, which replaces file_path when closed
+		self.write_path = file_path
+		self.n_rewrites = 0
+
+	@staticmethod
+	def _to_text(s: pd.Series) -> pd.Series:
+		# The missing values stay missing
+		return s.astype(object).where(s.isna(), s.astype(str))
+
+	def _get_schema(self, df: pd.DataFrame):
+		import pyarrow as pa
+
+		df = df.copy(deep=False)
+		for col in df.columns[df.dtypes == object]:
+			df[col] = self._to_text(df[col])
+		schema = pa.Schema.from_pandas(df, preserve_index=True)
+		index_columns = schema.pandas_metadata.get('index_columns', [])
+		# Widen the types which might not fit the later chunks: ints which can get NaNs and all null columns
+		for i, field in enumerate(schema):
+			if field.name in index_columns:
+				continue
+			if pa.types.is_integer(field.type):
+				schema = schema.set(i, field.with_type(pa.float64()))
+			elif pa.types.is_null(field.type):
+				schema = schema.set(i, field.with_type(pa.string()))
+		return schema
+
+	def _to_table(self, df: pd.DataFrame):
+		import pyarrow as pa
+
+		df = df.copy(deep=False)
+		for field in self.schema:
+			if field.name in df.columns and pa.types.is_string(field.type):
+				df[field.name] = self._to_text(df[field.name])
+		return pa.Table.from_pandas(df, schema=self.schema, preserve_index=True)
+
+	def _widen_schema(self, df: pd.DataFrame) -> list[str]:
+		import pyarrow as pa
+
+		# The columns of the schema which the values of df do not fit are turned into text
+		schema = self.schema
+		widened = []
+		for i, field in enumerate(schema):
+			if field.name not in df.columns or pa.types.is_string(field.type):
+				continue
+			try:
+				pa.array(df[field.name], type=field.type, from_pandas=True)
+			except (pa.ArrowInvalid, pa.ArrowTypeError):
+				schema = schema.set(i, field.with_type(pa.string()))
+				widened.append(field.name)
+		
+		# The pandas metadata of the columns would still give their old dtype
+		pandas_metadata = schema.pandas_metadata
+		for column in pandas_metadata['columns']:
+			if column['name'] in widened:
+				column.update(pandas_type='unicode', numpy_type='object')
+		self.schema = schema.with_metadata({b'pandas': json.dumps(pandas_metadata).encode()})
+		return widened
+
+	def _rewrite(self) -> None:
+		# Write the chunks written so far again with the widened schema, to a new temporary file
+		self.writer.close()
+		self.n_rewrites += 1
+		previous_path, self.write_path = self.write_path, f'{self.file_path}.{self.n_rewrites}.tmp'
+		self.writer = self.open_file(self.write_path, self.schema)
+		for batch in self.iter_batches(previous_path):
+			# Through pandas, so the numbers turned into text are written like the ones of the next chunks
+			self.writer.write_table(self._to_table(batch.to_pandas()))
+		if previous_path != self.file_path:
+			os.remove(previous_path)
+
+	def _write(self, df: pd.DataFrame) -> None:
+		import pyarrow as pa
+
+		if self.writer is None:
+			self.schema = self._get_schema(df)
+			self.writer = self.open_file(self.write_path, self.schema)
+		try:
+			table = self._to_table(df)
+		except (pa.ArrowInvalid, pa.ArrowTypeError):
+			widened = self._widen_schema(df)
+			if not widened:
+				raise
+			print(f'The columns {widened} have text in a later chunk of {self.file_path}, they are saved as text')
+			self._rewrite()
+			table = self._to_table(df)
+		self.writer.write_table(table)
+
+	def close(self) -> None:
+		if self.writer is not None:
+			self.writer.close()
+			self.writer = None
+		if self.write_path != self.file_path:
+			os.replace(self.write_path, self.file_path)
+			self.write_path = self.file_path
+
+
+class CSVStorage(Storage):
+	"""
+	Plain CSV files. Dtypes are inferred again on every read.
+	"""
+	extension = '.csv'
+
+	def save(self, df: pd.DataFrame, file_path: str) -> str:
+		df.to_csv(file_path, index=True)
+		return file_path
+
+	def load(self, file_path: str, columns: list[str] = None, index_col: str | None = INDEX) -> pd.DataFrame:
+		usecols = None
+		if columns is not None:
+			usecols = list(columns) + ([index_col] if index_col is not None and index_col not in columns else [])
+		return pd.read_csv(file_path, index_col=index_col, usecols=usecols)
+
+	def open_writer(self, file_path: str) -> StorageWriter:
+		return CSVStorageWriter(file_path)
+
+
+class ArrowStorage(Storage):
+	"""
+	Base class for the columnar formats written with pyarrow.
+	The index and dtypes (categoricals, bools, nullable ints) are kept in the pandas metadata of the file,
+	and only the requested columns are read from disk.
+	"""
+
+	def _write_table(self, table, file_path: str) -> None:
+		raise NotImplementedError
+
+	def _read_table(self, file_path: str, columns: list[str] | None):
+		raise NotImplementedError
+
+	def _read_schema(self, file_path: str):
+		raise NotImplementedError
+
+	def save(self, df: pd.DataFrame, file_path: str) -> str:
+		import pyarrow as pa
+
+		self._write_table(pa.Table.from_pandas(df, preserve_index=True), file_path)
+		return file_path
+
+	def load(self, file_path: str, columns: list[str] = None, index_col: str | None = INDEX) -> pd.DataFrame:
+		if columns is not None:
+			# The index is stored as a regular column, so it has to be requested explicitly
+			schema = self._read_schema(file_path)
+			pandas_metadata = schema.pandas_metadata or {}
+			index_columns = [col for col in pandas_metadata.get('index_columns', []) if isinstance(col, str)]
+			columns = index_columns + [col for col in columns if col not in index_columns]
+			if index_col is not None and index_col not in columns and index_col in schema.names:
+				columns.append(index_col)
+
+		df = self._read_table(file_path, columns).to_pandas()
+		if index_col is not None and index_col in df.columns:
+			df = df.set_index(index_col)
+		return df
+
+
+class ParquetStorage(ArrowStorage):
+	extension = '.parquet'
+
+	def _write_table(self, table, file_path: str) -> None:
+		import pyarrow.parquet as pq
+
+		pq.write_table(table, file_path)
+
+	def open_writer(self, file_path: str) -> StorageWriter:
+		import pyarrow.parquet as pq
+
+		# Every chunk is written as a row group
+		return ArrowStorageWriter(file_path, open_file=pq.ParquetWriter, iter_batches=self._iter_batches)
+
+	def _iter_batches(self, file_path: str):
+		import pyarrow.parquet as pq
+
+		# Every chunk was written as a row group
+		parquet_file = pq.ParquetFile(file_path)
+		for i in range(parquet_file.num_row_groups):
+			yield parquet_file.read_row_group(i)
+
+	def _read_table(self, file_path: str, columns: list[str] | None):
+		import pyarrow.parquet as pq
+
+		return pq.read_table(file_path, columns=columns, memory_map=True)
+
+	def _read_schema(self, file_path: str):
+		import pyarrow.parquet as pq
+
+		return pq.read_schema(file_path)
+
+
+class FeatherStorage(ArrowStorage):
+	extension = '.feather'
+
+	def _write_table(self, table, file_path: str) -> None:
+		import pyarrow.feather as feather
+
+		feather.write_feather(table, file_path)
+
+	def open_writer(self, file_path: str) -> StorageWriter:
+		import pyarrow as pa
+
+		# Feather v2 is the Arrow IPC file format, so every chunk is written as record batches
+		return ArrowStorageWriter(file_path, open_file=pa.ipc.new_file, iter_batches=self._iter_batches)
+
+	def _iter_batches(self, file_path: str):
+		import pyarrow as pa
+
+		with pa.memory_map(file_path) as source:
+			reader = pa.ipc.open_file(source)
+			for i in range(reader.num_record_batches):
+				yield reader.get_batch(i)
+
+	def _read_table(self, file_path: str, columns: list[str] | None):
+		import pyarrow.feather as feather
+
+		return feather.read_table(file_path, columns=columns, memory_map=True)
+
+	def _read_schema(self, file_path: str):
+		import pyarrow as pa
+
+		with pa.memory_map(file_path) as source:
+			return pa.ipc.open_file(source).schema
+
+
+STORAGES = {
+	'csv': CSVStorage,
+	'parquet': ParquetStorage,
+	'feather': FeatherStorage,
+}
+
+
+def get_storage(storage_format: str = None, file_path: str = None) -> Storage:
+	"""
+	Get the storage for a format name like 'parquet', or for the extension of file_path if it is given
+	"""
+	if file_path is not None:
+		extension = os.path.splitext(file_path)[1]
+		for storage in STORAGES.values():
+			if storage.extension == extension:
+				return storage()
+		raise ValueError(f'Unrecognized file extension {extension} for {file_path}')
+
+	storage_format = storage_format or STORAGE_FORMAT
+	if storage_format not in STORAGES:
+		raise ValueError(f'Unrecognized storage format {storage_format}, should be one of {list(STORAGES.keys())}')
+	return STORAGES[storage_format]()
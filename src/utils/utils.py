@@ -1,6 +1,8 @@
 import os
 import datetime
 
+import pandas as pd
+
 
 class Utility:
     """
@@ -38,6 +40,35 @@ class Utility:
     def get_begin_float(x: str):
         return Utility.convert_to_number(x, 'float')
     
+    @staticmethod
+    def convert_series_to_number(s: pd.Series, conv: str = 'float') -> pd.Series:
+        """
+        Column-level version of `convert_to_number`.
+        Commas and underscores are skipped, the prefix stops at the first character that is not
+        an ascii digit or at the second '.', and an empty prefix becomes NaN.
+        """
+        # Dropping every ',' and '_' up front gives the same prefix as skipping them while scanning
+        prefix = s.astype(str).str.replace(r'[,_]', '', regex=True).str.extract(
+            r'^([0-9]*\.?[0-9]*)', expand=False)
+        prefix = prefix.mask(prefix == '')
+        
+        if conv == 'int':
+            # Same as int('12.5') failing in `convert_to_number`
+            has_decimal = prefix.str.contains('.', regex=False, na=False)
+            if has_decimal.any():
+                raise ValueError(f"invalid literal for int() with base 10: {prefix[has_decimal].iloc[0]!r}")
+            return pd.to_numeric(prefix).astype('Int64')
+        
+        return pd.to_numeric(prefix).astype(float)
+    
+    @staticmethod
+    def get_begin_number_series(s: pd.Series) -> pd.Series:
+        return Utility.convert_series_to_number(s, 'int')
+    
+    @staticmethod
+    def get_begin_float_series(s: pd.Series) -> pd.Series:
+        return Utility.convert_series_to_number(s, 'float')
+    
 
 if __name__ == "__main__":
     print(Utility.get_begin_number('120-litres'))
\ No newline at end of file
@@ -0,0 +1,98 @@
+import numpy as np
+import pandas as pd
+
+from src.data.cleaning import COLUMNS_TO_KEEP, Cleaning, run_cleaning_process, run_cleaning_steps
+from src.data.normalization import CategoricalNormalizer
+from src.utils.constants import INDEX
+
+# Values in the formats of the scraped columns, the other columns get a plain string
+RAW_VALUES = {
+    'myear': ['2015', '2018'], 'km': ['45,000 km', '1,20,000 kms'], 'pu': ['5,50,000', '3,25,000'],
+    'mileage_new': ['18.9 kmpl', '21.1 km/kg'], 'Max Power': ['88.50bhp@6000rpm', '67.04bhp@5000-6000rpm'],
+    'Max Torque': ['113Nm@4400rpm', '250Nm@1500-2500rpm'], 'BoreX Stroke': ['69 x 72 mm', '73x74.5'],
+    'Turbo Charger': ['yes', 'no'], 'Super Charger': ['no', 'no'], 'Length': ['3599mm', '3,995 mm'],
+    'Width': ['1495mm', '1,735'], 'Height': ['1700mm', '1485'], 'Wheel Base': ['2400mm', '2,520'],
+    'Front Tread': ['1295mm', '1,479.5'], 'Rear Tread': ['1295mm', '1490 mm'], 'Kerb Weight': ['960kg', '1185'],
+    'Gross Weight': ['1350kg', '1540'], 'Turning Radius': ['4.6 metres', '5.2m'], 'Top Speed': ['137 kmph', '180'],
+    'Acceleration': ['13.5 seconds', '9.8s'], 'Cargo Volumn': ['300 litres', '256'],
+    'Compression Ratio': ['10.0:1', '11.5'], 'Alloy Wheel Size': ['15', 'R16'],
+    'Ground Clearance Unladen': ['170mm', '165 mm'],
+    'Gear Box': ['5-speed', 'a new gearbox'], 'Drive Type': ['fwd', 'a new drive'],
+    'Steering Type': ['power', 'a new steering'], 'Front Brake Type': ['disc', 'a new brake'],
+    'Rear Brake Type': ['drum', 'another new brake'], 'Tyre Type': ['tubeless', 'a new tyre'],
+    'Value Configuration': ['dohc', 'a new configuration'], 'Fuel Suppy System': ['mpfi', 'a new injection'],
+}
+
+
+def _make_raw(n_rows: int) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        col: rng.choice(RAW_VALUES.get(col, [f'{col} a', f'{col} b']), n_rows) for col in COLUMNS_TO_KEEP
+    })
+    for col in ['top_features', 'comfort_features', 'interior_features', 'exterior_features', 'safety_features']:
+        df[col] = "['Heater']"
+    # Every row is different, so none is dropped as a duplicate
+    df[INDEX] = np.arange(n_rows)
+    return df.set_index(INDEX)
+
+
+def _get_report(n_jobs: int) -> pd.DataFrame:
+    cdc = Cleaning(filepath=None, df=_make_raw(400), index=INDEX)
+    run_cleaning_steps(cdc, n_jobs=n_jobs)
+    return cdc.get_unmapped_values()
+
+
+def test_unmapped_values_are_merged_across_partitions():
+    expected = _get_report(n_jobs=1)
+    assert expected['count'].sum() > 0
+    pd.testing.assert_frame_equal(_get_report(n_jobs=3), expected)
+
+
+def test_unmapped_values_are_merged_across_chunks(tmp_path, monkeypatch):
+    import src.data.cleaning as cleaning
+
+    raw_path = tmp_path / 'raw.csv'
+    _make_raw(400).to_csv(raw_path)
+    monkeypatch.setattr(cleaning, 'CLEAN_DIR_PATH', str(tmp_path))
+    normalizer = CategoricalNormalizer()
+    run_cleaning_process(filepath=str(raw_path), chunksize=150, storage_format='csv', normalizer=normalizer)
+
+    cdc = Cleaning(filepath=None, df=pd.read_csv(raw_path), index=INDEX)
+    run_cleaning_steps(cdc)
+    pd.testing.assert_frame_equal(normalizer.unmapped_report(), cdc.get_unmapped_values())
+
+
+def test_chunks_are_parsed_like_the_whole_file(tmp_path, monkeypatch):
+    import src.data.cleaning as cleaning
+
+    # The last chunk only has numbers and NaNs in Height, pandas would read it as floats
+    raw = _make_raw(300)
+    raw['Height'] = raw['Height'].astype(object)
+    raw.iloc[-100:, raw.columns.get_loc('Height')] = '1485'
+    raw.iloc[-1, raw.columns.get_loc('Height')] = np.nan
+    raw_path = tmp_path / 'raw.csv'
+    raw.to_csv(raw_path)
+    monkeypatch.setattr(cleaning, 'CLEAN_DIR_PATH', str(tmp_path))
+    save_path = run_cleaning_process(filepath=str(raw_path), chunksize=200, storage_format='csv')
+
+    expected = run_cleaning_process(df=pd.read_csv(raw_path), save_to_file=False)
+    chunked = pd.read_csv(save_path, index_col=0)
+    pd.testing.assert_series_equal(chunked['Height'], expected['Height'], check_index=False)
+
+
+def test_parallel_cleaning_gives_the_serial_frame():
+    def clean(n_jobs: int) -> pd.DataFrame:
+        raw = _make_raw(400)
+        rng = np.random.default_rng(1)
+        # The columns cleaned to ints cannot be missing
+        for col in raw.columns.drop(['km', 'pu', 'myear']):
+            raw.loc[rng.random(len(raw)) < 0.1, col] = np.nan
+        cdc = Cleaning(filepath=None, df=raw, index=INDEX)
+        run_cleaning_steps(cdc, n_jobs=n_jobs)
+        return cdc.get_data()
+
+    serial = clean(n_jobs=1)
+    parallel = clean(n_jobs=3)
+    pd.testing.assert_frame_equal(serial, parallel)
+    # assert_frame_equal takes None for NaN, the missing values should be NaN in both
+    pd.testing.assert_frame_equal(serial.applymap(type), parallel.applymap(type))
@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+from catboost import CatBoostRegressor
+from lightgbm import LGBMRegressor
+
+from src.model_selection.catboost_model import CatBoostModel
+from src.model_selection.lightGBM_model import LightGBMModel
+from src.utils.compiled_trees import CompiledCatBoost, CompiledLightGBM
+
+
+def _fit_catboost_like_the_repo(n_rows: int = 1200, n_estimators: int = 200) -> tuple[CatBoostRegressor, pd.DataFrame]:
+	# The parameters of CatBoostModel (depth 5, MAE, Bernoulli subsample 0.5) on a mostly constant target, which
+	# leaves some trees without any split
+	rng = np.random.default_rng(0)
+	X = pd.DataFrame({
+		'km': rng.normal(size=n_rows),
+		'year': rng.integers(0, 5, n_rows).astype(float),
+		'fuel': rng.choice(['Petrol', 'Diesel', 'CNG'], n_rows),
+	})
+	y = np.where(rng.random(n_rows) < 0.7, 0.0, X['km'] + rng.normal(size=n_rows))
+	params = CatBoostModel().model.get_params()
+	params.pop('early_stopping_rounds')
+	params.update(n_estimators=n_estimators, verbose=0)
+	return CatBoostRegressor(**params, cat_features=['fuel']).fit(X, y), X
+
+
+def test_compiled_catboost_matches_native_with_the_repo_params(tmp_path):
+	model, X = _fit_catboost_like_the_repo()
+	path = tmp_path / 'model.json'
+	model.save_model(str(path), format='json')
+	with open(path) as f:
+		model_json = json.load(f)
+	assert any(not tree['splits'] for tree in model_json['oblivious_trees'])
+
+	compiled = CompiledCatBoost(model_json)
+	np.testing.assert_allclose(compiled.predict(X), model.predict(X), rtol=0, atol=1e-12)
+
+
+def _fit_lightgbm_like_the_repo(zero_as_missing: bool, categorical: bool, n_rows: int = 2000) -> tuple[LGBMRegressor, np.ndarray]:
+	# The parameters of LightGBMModel, on columns with NaNs and exact zeros, and a categorical column with NaNs
+	rng = np.random.default_rng(1)
+	X = np.column_stack([
+		rng.normal(size=n_rows),
+		np.where(rng.random(n_rows) < 0.3, 0.0, rng.normal(size=n_rows)),
+		rng.integers(0, 30, n_rows).astype(float),
+	])
+	X[rng.random(n_rows) < 0.1, 0] = np.nan
+	X[rng.random(n_rows) < 0.1, 1] = np.nan
+	X[rng.random(n_rows) < 0.1, 2] = np.nan
+	y = X[:, 0] + 3 * (X[:, 1] == 0) + np.where(np.isnan(X[:, 2]), -2, X[:, 2] % 7 == 0) + rng.normal(0, 0.1, n_rows)
+	y = np.nan_to_num(y)
+	params = LightGBMModel().model.get_params()
+	params.update(n_estimators=100, verbose=-1, n_jobs=1, zero_as_missing=zero_as_missing)
+	if categorical:
+		params.update(min_data_per_group=5, cat_smooth=1)
+	model = LGBMRegressor(**params).fit(X, y, categorical_feature=[2] if categorical else 'auto')
+	return model, X
+
+
+@pytest.mark.parametrize('zero_as_missing', [False, True])
+@pytest.mark.parametrize('categorical', [False, True])
+def test_compiled_lightgbm_matches_native(zero_as_missing, categorical):
+	model, X = _fit_lightgbm_like_the_repo(zero_as_missing, categorical)
+	splits = list(_iter_splits(model.booster_.dump_model()))
+	assert {node['decision_type'] for node in splits} == ({'<=', '=='} if categorical else {'<='})
+	assert any(node['missing_type'] == 'Zero' for node in splits) == zero_as_missing
+
+	# Categories with a fractional part, negative, unseen or far too large, and values close to zero
+	rng = np.random.default_rng(2)
+	X_test = np.vstack([X, X[:200]])
+	X_test[-200:, 2] = rng.choice([-3.0, -0.5, 2.7, 45.0, 1e12, np.nan], 200)
+	X_test[-100:, 1] = rng.choice([0.0, -0.0, 1e-40, -1e-40, np.nan], 100)
+	compiled = CompiledLightGBM.from_booster(model)
+	np.testing.assert_allclose(compiled.predict(X_test), model.booster_.predict(X_test), rtol=0, atol=1e-10)
+
+
+def _iter_splits(model_dump: dict):
+	nodes = [tree['tree_structure'] for tree in model_dump['tree_info']]
+	while nodes:
+		node = nodes.pop()
+		if 'split_feature' in node:
+			yield node
+			nodes.extend([node['left_child'], node['right_child']])
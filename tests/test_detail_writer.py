@@ -0,0 +1,39 @@
+import csv
+import json
+
+import pytest
+
+from src.scrapper.detail_writer import DetailWriter
+
+
+def _make_cars(ids: range) -> list[dict]:
+	return [{"usedCarSkuId": str(i), "top_features": "['Heater']", "Length": f"{3500 + i}mm"} for i in ids]
+
+
+@pytest.mark.parametrize("torn_line", ['{"usedCarSkuId": "9", "top_feat', '{"usedCarSkuId": "9"}'])
+def test_torn_last_line_is_dropped(torn_line, tmp_path):
+	log_path = str(tmp_path / "details.jsonl")
+	with DetailWriter(log_path) as writer:
+		writer.write_batch(_make_cars(range(3)))
+	# A process killed in the middle of write_batch, before the newline
+	with open(log_path, "a") as f:
+		f.write(torn_line)
+
+	output_path = str(tmp_path / "details.csv")
+	with DetailWriter(log_path) as writer:
+		writer.write_batch(_make_cars(range(3, 5)))
+		assert writer.export(output_path) == 5
+
+	with open(log_path) as f:
+		assert [json.loads(line)["usedCarSkuId"] for line in f] == ["0", "1", "2", "3", "4"]
+	with open(output_path, newline="") as f:
+		assert [row["usedCarSkuId"] for row in csv.DictReader(f)] == ["0", "1", "2", "3", "4"]
+
+
+def test_log_without_any_complete_line_is_emptied(tmp_path):
+	log_path = str(tmp_path / "details.jsonl")
+	with open(log_path, "w") as f:
+		f.write('{"usedCarSkuId": "0", ' * 1000)
+	with DetailWriter(log_path) as writer:
+		writer.write_batch(_make_cars(range(1)))
+		assert writer.export(str(tmp_path / "details.csv")) == 1
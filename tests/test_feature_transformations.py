@@ -0,0 +1,95 @@
+from ast import literal_eval
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_engineering.feature_matrix import FeatureMatrix
+from src.feature_engineering.feature_transformations import FeatureEngineeringTransformations
+
+OBJECT_COLS = ['top_features', 'comfort_features']
+FEATURES = ['Power Steering', 'Air Conditioner', 'Heater', 'Bluetooth', 'Sunroof', 'ABS', 'Airbags']
+
+
+def _make_listings(n_rows: int, seed: int, price_dtype: str) -> pd.DataFrame:
+	rng = np.random.default_rng(seed)
+	df = pd.DataFrame({
+		col: [str(list(rng.choice(FEATURES, rng.integers(0, 5)))) for _ in range(n_rows)] for col in OBJECT_COLS
+	})
+	df['km'] = rng.integers(0, 200000, n_rows)
+	prices = rng.integers(100000, 5000000, n_rows)
+	df['listed_price'] = prices if price_dtype == 'int' else prices * rng.random(n_rows)
+	return df
+
+
+def _reference_feature_prices(df: pd.DataFrame) -> dict:
+	# The python loop the scores were first computed with
+	unique_feature_scores = dict()
+	for col in OBJECT_COLS:
+		for _, row in df.iterrows():
+			for feature in literal_eval(row[col]):
+				if feature in unique_feature_scores.keys():
+					unique_feature_scores[feature][1] += 1
+					unique_feature_scores[feature][0] += row['listed_price']
+				else:
+					unique_feature_scores[feature] = [row['listed_price'], 1]
+	return unique_feature_scores
+
+
+@pytest.mark.parametrize('price_dtype', ['int', 'float'])
+def test_feature_prices_are_the_sums_of_the_python_loop(price_dtype):
+	df = _make_listings(500, 0, price_dtype)
+	transformer = FeatureEngineeringTransformations(object_cols=OBJECT_COLS, target='listed_price').fit(df)
+	expected = _reference_feature_prices(df)
+	# The same sums to the last bit, in the same order, not only close ones
+	assert list(transformer.feature_prices) == list(expected)
+	for feature, (total, count) in expected.items():
+		assert transformer.feature_prices[feature][0] == total
+		assert type(transformer.feature_prices[feature][0]) is type(total)
+		assert transformer.feature_prices[feature][1] == count
+
+
+@pytest.mark.parametrize('price_dtype', ['int', 'float'])
+def test_feature_prices_with_a_saved_feature_matrix(price_dtype, tmp_path):
+	train = _make_listings(400, 1, price_dtype)
+	test = _make_listings(100, 2, price_dtype)
+	train_features = FeatureMatrix.load(FeatureMatrix.from_frame(train, OBJECT_COLS).save(str(tmp_path / 'train.npz')))
+	test_features = FeatureMatrix.from_frame(test, OBJECT_COLS)
+	df = pd.concat([train, test], ignore_index=True)
+	feature_matrix = FeatureMatrix.concat([train_features, test_features], index=df.index)
+
+	transformer = FeatureEngineeringTransformations(object_cols=OBJECT_COLS, target='listed_price')
+	transformer.fit(df, feature_matrix=feature_matrix)
+	# The features are numbered by the matrices, so only the order of the keys can differ from the python loop
+	assert transformer.feature_prices == _reference_feature_prices(df)
+
+	without_matrix = FeatureEngineeringTransformations(object_cols=OBJECT_COLS, target='listed_price').fit(df)
+	pd.testing.assert_frame_equal(
+		transformer.transform(test, feature_matrix=test_features), without_matrix.transform(test)
+	)
+
+
+def test_fitted_attributes_only_exist_after_fit():
+	from sklearn.exceptions import NotFittedError
+
+	transformer = FeatureEngineeringTransformations(object_cols=OBJECT_COLS, target='listed_price')
+	assert not hasattr(transformer, 'vocabulary_')
+	with pytest.raises(NotFittedError):
+		transformer.transform(_make_listings(10, 3, 'int'))
+
+
+def test_transformer_pickled_before_the_vectorized_scores(tmp_path):
+	import joblib
+
+	train = _make_listings(400, 4, 'float')
+	test = _make_listings(100, 5, 'float')
+	transformer = FeatureEngineeringTransformations(object_cols=OBJECT_COLS, target='listed_price').fit(train)
+	expected = transformer.transform(test)
+
+	# The state of a transformer fitted by the python loop: the feature prices and the training rows
+	del transformer.vocabulary_, transformer.feature_scores_
+	transformer.df = train
+	joblib.dump(transformer, tmp_path / 'transformer.pkl')
+	loaded = joblib.load(tmp_path / 'transformer.pkl')
+	assert loaded.df is None
+	pd.testing.assert_frame_equal(loaded.transform(test), expected)
@@ -0,0 +1,57 @@
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import MinMaxScaler
+
+from src.utils import fit_cache
+from src.utils.fit_cache import FitCache
+
+
+def _make_frame(seed: int) -> pd.DataFrame:
+	return pd.DataFrame({'km': np.random.default_rng(seed).random(100)})
+
+
+def test_key_changes_with_the_code_of_the_transformer(monkeypatch):
+	X = _make_frame(0)
+	key = FitCache.get_key(MinMaxScaler(), X)
+	assert FitCache.get_key(MinMaxScaler(), X) == key
+	monkeypatch.setattr(fit_cache, '_get_code_version', lambda module_name: 'changed')
+	assert FitCache.get_key(MinMaxScaler(), X) != key
+
+
+def test_evict_removes_the_old_and_the_least_recently_used_files(tmp_path):
+	cache = FitCache(str(tmp_path), max_age_days=1, max_size_mb=1)
+	keys = []
+	for seed in range(3):
+		X = _make_frame(seed)
+		keys.append(FitCache.get_key(MinMaxScaler(), X))
+		cache.put(keys[-1], MinMaxScaler().fit(X))
+	old_path = cache._get_path(keys[0])
+	os.utime(old_path, (time.time() - 2 * 24 * 3600,) * 2)
+
+	cache.evict()
+	assert not os.path.exists(old_path)
+	assert all(os.path.exists(cache._get_path(key)) for key in keys[1:])
+
+	# Only the last used file fits in the size bound
+	cache.max_size_mb = os.path.getsize(cache._get_path(keys[1])) / 1024 ** 2
+	os.utime(cache._get_path(keys[2]), (time.time() - 60,) * 2)
+	cache.evict()
+	assert os.path.exists(cache._get_path(keys[1]))
+	assert not os.path.exists(cache._get_path(keys[2]))
+
+
+def test_stale_lock_is_removed(tmp_path):
+	cache = FitCache(str(tmp_path))
+	X = _make_frame(0)
+	key = FitCache.get_key(MinMaxScaler(), X)
+	lock_path = f'{cache._get_path(key)}.lock'
+	open(lock_path, 'w').close()
+	stale = time.time() - fit_cache.LOCK_TIMEOUT_SECONDS - 1
+	os.utime(lock_path, (stale, stale))
+
+	fitted = cache.get_or_fit(key, lambda: MinMaxScaler().fit(X))
+	assert fitted.data_max_[0] == X['km'].max()
+	assert not os.path.exists(lock_path)
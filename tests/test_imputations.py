@@ -0,0 +1,136 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn import config_context
+
+from src.feature_engineering.imputations import CustomIterativeImputer, CustomKNNImputer, CustomMatchingImputer, _grouped_mode
+from src.utils.imputation_stats import IterativeImputerArguments, KNNImputerArguments, MatchingImputerArguments
+
+MATCH_BY = ['oem', 'model', 'variant']
+
+
+def _make_cars(n_rows: int, seed: int, n_oems: int = 4) -> pd.DataFrame:
+	rng = np.random.default_rng(seed)
+	oems = rng.integers(0, n_oems, n_rows)
+	models = oems * 10 + rng.integers(0, 3, n_rows)
+	df = pd.DataFrame({
+		'oem': [f'oem {i}' for i in oems],
+		'model': [f'model {i}' for i in models],
+		'variant': [f'variant {i}' for i in models * 10 + rng.integers(0, 3, n_rows)],
+		'v': rng.normal(1000, 100, n_rows).round(1),
+		'w': rng.integers(1, 6, n_rows).astype(float),
+		'cat': rng.choice(['a', 'b', 'c'], n_rows).astype(object),
+	})
+	for col in ['v', 'w', 'cat']:
+		df.loc[rng.random(n_rows) < 0.3, col] = np.nan
+	return df
+
+
+def _reference_matching(fit_X: pd.DataFrame, X: pd.DataFrame, match_level: int) -> pd.DataFrame:
+	# The row by row matching the imputer was first written with
+	car_groups = fit_X.groupby(MATCH_BY)['v'].mean().reset_index()
+	match_level_array = [0] * match_level + [1] * (len(MATCH_BY) - match_level)
+	X = X.copy()
+	X['v_imputed'] = X['v'].isna().astype(int)
+	for index, row in X[X['v'].isna()].iterrows():
+		condition = True
+		for i, col in enumerate(MATCH_BY):
+			condition = condition & (car_groups[col] == row[col])
+			if match_level_array[i] == 1:
+				closest_match = car_groups[condition]['v'].mean()
+				if not np.isnan(closest_match):
+					X.loc[index, 'v'] = closest_match
+	return X
+
+
+@pytest.mark.parametrize('match_level', [0, 1, 2])
+def test_matching_imputer_falls_back_like_the_row_by_row_matching(match_level):
+	fit_X = _make_cars(300, 0)[MATCH_BY + ['v']]
+	# A fifth oem, and models and variants never seen in fit, which fall back to the coarser levels or stay missing
+	X = _make_cars(200, 1, n_oems=5)[MATCH_BY + ['v']]
+	X.loc[X.index[::7], 'variant'] = 'unseen variant'
+	X.loc[X.index[::11], 'model'] = 'unseen model'
+
+	imputer = CustomMatchingImputer('v', MatchingImputerArguments(columns=list(MATCH_BY), match_level=match_level))
+	imputed = imputer.fit(fit_X.copy()).transform(X.copy())
+	expected = _reference_matching(fit_X, X, match_level)
+	pd.testing.assert_frame_equal(imputed, expected)
+	# The cars of the unseen oem stay missing, the unseen variants are only filled from a coarser level
+	unseen_oem = X['oem'] == 'oem 4'
+	assert imputed.loc[unseen_oem & X['v'].isna(), 'v'].isna().all()
+	unseen_variant = (X['variant'] == 'unseen variant') & (X['model'] != 'unseen model') & ~unseen_oem & X['v'].isna()
+	assert imputed.loc[unseen_variant, 'v'].notna().all() if match_level < 2 else imputed.loc[unseen_variant, 'v'].isna().all()
+
+
+def test_batch_matching_imputer_equals_one_imputer_per_column():
+	fit_X = _make_cars(300, 2)
+	X = _make_cars(200, 3, n_oems=5)
+	arguments = {'columns': list(MATCH_BY), 'strategies': {'w': pd.Series.median}}
+
+	batch = CustomMatchingImputer(['v', 'w', 'cat'], MatchingImputerArguments(**arguments))
+	imputed = batch.fit(fit_X.copy()).transform(X.copy())
+	# The categorical column is imputed with its mode
+	assert batch.column_strategies['cat'] is pd.Series.mode
+
+	expected = X.copy()
+	for col in ['v', 'w', 'cat']:
+		single = CustomMatchingImputer(col, MatchingImputerArguments(**arguments)).fit(fit_X.copy())
+		expected = single.transform(expected)
+	pd.testing.assert_frame_equal(imputed, expected)
+
+
+def test_grouped_mode_keeps_the_smallest_of_the_most_frequent_values():
+	X = pd.DataFrame({
+		'model': ['m1'] * 4 + ['m2'] * 3 + ['m3'] * 2,
+		'cat': ['c', 'b', 'c', 'b', 'a', 'b', 'b', 'z', 'y'],
+	})
+	modes = _grouped_mode(X, ['model'], 'cat')
+	assert modes.to_dict() == {'m1': 'b', 'm2': 'b', 'm3': 'y'}
+	assert modes.to_dict() == {model: group.mode().iloc[0] for model, group in X.groupby('model')['cat']}
+
+
+def _make_numeric_cars(n_rows: int, seed: int) -> pd.DataFrame:
+	df = _make_cars(n_rows, seed)[['oem', 'model']]
+	rng = np.random.default_rng(seed)
+	base = rng.normal(size=(n_rows, 2))
+	values = np.hstack([base, base @ rng.normal(size=(2, 2)) + 0.1 * rng.normal(size=(n_rows, 2))])
+	for i in range(values.shape[1]):
+		df[f'x{i}'] = np.where(rng.random(n_rows) < 0.2, np.nan, values[:, i])
+	return df
+
+
+@pytest.mark.parametrize('neighbours', ['brute', 'partitioned', 'ball_tree'])
+def test_knn_imputer_in_batches_equals_all_at_once(neighbours):
+	X = _make_numeric_cars(500, 4)
+	columns = ['x0', 'x1', 'x2', 'x3']
+
+	def impute(batch_size: int | None, n_jobs: int) -> pd.DataFrame:
+		imputer = CustomKNNImputer(
+			'x0', KNNImputerArguments(columns=list(columns)), neighbours=neighbours, batch_size=batch_size, n_jobs=n_jobs
+		)
+		return imputer.fit(X).transform(X)
+
+	imputed = impute(None, 1)
+	# The missing values are filled and flagged in the indicator columns
+	assert imputed[columns].notna().all().all()
+	for col in columns:
+		assert (imputed[f'{col}_imputed'] == X[col].isna().astype(int)).all()
+	pd.testing.assert_frame_equal(imputed[columns].where(X[columns].notna()), X[columns])
+	pd.testing.assert_frame_equal(impute(64, 3), imputed)
+	with config_context(transform_output='pandas'):
+		pd.testing.assert_frame_equal(impute(64, 3), imputed)
+
+
+@pytest.mark.parametrize('mode', ['sequential', 'jacobi'])
+def test_iterative_imputer_in_batches_equals_all_at_once(mode):
+	X = _make_numeric_cars(500, 5).drop(columns=['oem', 'model'])
+
+	def impute(batch_size: int | None, n_jobs: int) -> pd.DataFrame:
+		imputer = CustomIterativeImputer(
+			IterativeImputerArguments(random_state=0), batch_size=batch_size, n_jobs=n_jobs, mode=mode
+		)
+		return imputer.fit(X, X['x0']).transform(X)
+
+	imputed = impute(None, 1)
+	assert imputed.notna().all().all()
+	pd.testing.assert_frame_equal(impute(64, 3), imputed)
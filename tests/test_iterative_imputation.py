@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.feature_engineering.imputations import CustomIterativeImputer
+from src.feature_engineering.iterative_imputation import JacobiIterativeImputer
+from src.utils.imputation_stats import IterativeImputerArguments
+
+
+@pytest.mark.parametrize('params', [
+	{'sample_posterior': True},
+	{'n_nearest_features': 3},
+	{'imputation_order': 'random'},
+])
+def test_unsupported_params_are_rejected(params):
+	with pytest.raises(ValueError):
+		JacobiIterativeImputer(**params)
+
+
+def _make_correlated(noise: float, seed: int = 0) -> tuple[pd.DataFrame, pd.DataFrame]:
+	# 5 columns which are linear combinations of 3 others, with noise, 20% of the values missing
+	rng = np.random.default_rng(seed)
+	base = rng.normal(size=(3000, 3))
+	X = np.hstack([base, base @ rng.normal(size=(3, 5)) + noise * rng.normal(size=(3000, 5))])
+	X = pd.DataFrame(X, columns=[f'x{i}' for i in range(X.shape[1])])
+	return X, X.mask(rng.random(X.shape) < 0.2)
+
+
+def _get_rmse(X: pd.DataFrame, X_missing: pd.DataFrame, mode: str, max_iter: int) -> float:
+	imputer = CustomIterativeImputer(
+		IterativeImputerArguments(max_iter=max_iter, random_state=0, add_indicator=False), mode=mode
+	)
+	imputed = imputer.fit(X_missing, X_missing['x0']).transform(X_missing)[X.columns]
+	missing = X_missing.isna().to_numpy()
+	return np.sqrt(np.mean((imputed.to_numpy() - X.to_numpy())[missing] ** 2))
+
+
+@pytest.mark.parametrize('noise', [0.1, 0.5, 1.0])
+def test_jacobi_mode_is_close_to_the_sequential_mode_on_correlated_columns(noise):
+	X, X_missing = _make_correlated(noise)
+	sequential = _get_rmse(X, X_missing, 'sequential', max_iter=10)
+	# The Jacobi rounds converge slower than the sequential ones, but they must not diverge with more of them
+	for max_iter in (30, 100):
+		assert _get_rmse(X, X_missing, 'jacobi', max_iter=max_iter) < 1.15 * sequential
+
+
+def test_jacobi_mode_with_pandas_output():
+	from sklearn import config_context
+
+	X, X_missing = _make_correlated(0.5)
+	expected = _get_rmse(X, X_missing, 'jacobi', max_iter=10)
+	with config_context(transform_output='pandas'):
+		assert _get_rmse(X, X_missing, 'jacobi', max_iter=10) == expected
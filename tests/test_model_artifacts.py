@@ -0,0 +1,37 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.benchmarks.model_artifact_benchmark import make_listings
+from src.benchmarks.prediction_server_benchmark import fit_ensemble_artifacts
+from src.model_selection.load_data import load_validation_data
+from src.utils.constants import INDEX, TARGET
+from src.utils.storage import get_storage
+
+
+@pytest.mark.parametrize('storage_format', ['csv', 'parquet'])
+def test_only_the_input_columns_of_the_models_are_loaded(storage_format, tmp_path):
+	X, y = make_listings(300)
+	# CatBoost writes its training logs to the working directory
+	cwd = os.getcwd()
+	os.chdir(tmp_path)
+	try:
+		models = fit_ensemble_artifacts(X, y, n_estimators=10)
+	finally:
+		os.chdir(cwd)
+
+	df = X.assign(**{TARGET: y, 'unused_text': 'text', 'unused_number': np.arange(len(X))})
+	df.index = pd.Index([f'car {i}' for i in range(len(df))], name=INDEX)
+	storage = get_storage(storage_format)
+	file_path = storage.save(df, str(tmp_path / f'validation{storage.extension}'))
+
+	columns = list(dict.fromkeys(models['catboost'].input_columns + models['lightgbm'].input_columns + [TARGET]))
+	assert set(columns) == set(X.columns) | {TARGET}
+	loaded, feature_matrix = load_validation_data(file_path, verbose=False, columns=columns, with_feature_matrix=True)
+	assert sorted(loaded.columns) == sorted(columns)
+	for model in models.values():
+		np.testing.assert_allclose(
+			model.predict(loaded.drop(columns=TARGET), feature_matrix=feature_matrix), model.predict(df.drop(columns=TARGET))
+		)
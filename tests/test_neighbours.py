@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from src.feature_engineering.neighbours import BallTreeSearch, BruteForceSearch, NeighbourImputer, NeighbourSearch
+
+
+def _make_data(n_rows: int, scales: np.ndarray, seed: int = 0) -> np.ndarray:
+	rng = np.random.default_rng(seed)
+	X = rng.normal(size=(n_rows, len(scales))) * scales
+	X[rng.random(X.shape) < 0.1] = np.nan
+	return X
+
+
+def _get_neighbour_sets(search, X: np.ndarray, donors: np.ndarray) -> list[set]:
+	search.fit(X)
+	neighbour_sets = [None] * len(X)
+	for positions, _, neighbours in search.kneighbors(X, donors, 5):
+		for position, row_neighbours in zip(positions, neighbours):
+			neighbour_sets[position] = set(row_neighbours.tolist())
+	return neighbour_sets
+
+
+def test_neighbour_search_is_abstract():
+	with pytest.raises(TypeError):
+		NeighbourSearch()
+
+
+def test_ball_tree_candidates_do_not_depend_on_the_scales_of_the_columns():
+	X = _make_data(500, np.ones(4))
+	donors = np.arange(0, 500, 2)
+	# Without oversampling, the neighbours are the candidates of the tree
+	expected = _get_neighbour_sets(BallTreeSearch(oversampling=1), X, donors)
+	scaled = _get_neighbour_sets(BallTreeSearch(oversampling=1), X * np.array([1, 1e5, 1e-3, 50]), donors)
+	assert scaled == expected
+
+
+def test_ball_tree_with_all_the_donors_as_candidates_is_exact():
+	X = _make_data(300, np.array([1, 10, 0.1, 5]))
+	imputed = NeighbourImputer(BallTreeSearch(oversampling=100)).fit_transform(X)
+	np.testing.assert_allclose(imputed, NeighbourImputer(BruteForceSearch()).fit_transform(X))
@@ -0,0 +1,67 @@
+import http.client
+import json
+import os
+import threading
+
+import pytest
+
+from src.benchmarks.model_artifact_benchmark import make_listings
+from src.benchmarks.prediction_server_benchmark import fit_ensemble_artifacts
+from src.model_training.prediction_server import EnsemblePredictor, make_server
+
+
+@pytest.fixture(scope='module')
+def cars_and_models(tmp_path_factory):
+	# CatBoost writes its training logs to the working directory
+	cwd = os.getcwd()
+	os.chdir(tmp_path_factory.mktemp('catboost'))
+	try:
+		X, y = make_listings(300)
+		models = fit_ensemble_artifacts(X, y, n_estimators=20)
+	finally:
+		os.chdir(cwd)
+	return X.to_dict('records'), models
+
+
+def _post(predictor: EnsemblePredictor, car: dict) -> tuple[int, dict]:
+	server = make_server(predictor, port=0, batch_max_size=1)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	try:
+		connection = http.client.HTTPConnection(*server.server_address)
+		connection.request('POST', '/predict', body=json.dumps(car), headers={'Content-Type': 'application/json'})
+		response = connection.getresponse()
+		result = response.status, json.loads(response.read())
+		connection.close()
+	finally:
+		server.shutdown()
+		server.server_close()
+	return result
+
+
+def test_valid_car_is_predicted(cars_and_models):
+	cars, models = cars_and_models
+	predictor = EnsemblePredictor(models)
+	car = dict(cars[0], km=None)
+	status, body = _post(predictor, car)
+	assert status == 200
+	assert body == pytest.approx(predictor.predict_one(car))
+
+
+@pytest.mark.parametrize('column, value', [('oem', 5), ('km', '12000'), ('year', True), ('top_features', 3.5)])
+def test_value_of_the_wrong_type_is_rejected(cars_and_models, column, value):
+	cars, models = cars_and_models
+	status, body = _post(EnsemblePredictor(models), dict(cars[0], **{column: value}))
+	assert status == 400
+	assert column in body['error']
+
+
+def test_unexpected_error_returns_a_500(cars_and_models):
+	cars, models = cars_and_models
+	predictor = EnsemblePredictor(models)
+
+	def predict_one(car):
+		raise RuntimeError('broken model')
+	predictor.predict_one = predict_one
+	status, body = _post(predictor, cars[0])
+	assert status == 500
+	assert 'broken model' in body['error']
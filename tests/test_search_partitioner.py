@@ -0,0 +1,72 @@
+import asyncio
+
+import numpy as np
+
+from src.scrapper import params
+from src.scrapper.search_partitioner import FACET_VALUES, SearchPartitioner
+
+RESULT_CAP = 100
+
+
+def _make_cars(n_cars: int, unknown_fraction: float) -> list[dict]:
+	# Some cars have values which are not in the lists of params, e.g. a new brand
+	rng = np.random.default_rng(0)
+	cars = []
+	for i in range(n_cars):
+		car = {"usedCarSkuId": i}
+		for facet, values in FACET_VALUES.items():
+			car[facet] = f"unknown {facet}" if rng.random() < unknown_fraction else values[rng.integers(len(values))]
+		cars.append(car)
+	return cars
+
+
+class FakeAPI:
+	"""
+	The searches list their first RESULT_CAP cars in each sort order, like the listing API
+	"""
+
+	def __init__(self, cars: list[dict]):
+		self.cars = cars
+
+	def _search(self, filters: dict[str, str]) -> list[dict]:
+		return [car for car in self.cars if all(car[facet] == value for facet, value in filters.items())]
+
+	async def probe(self, filters: dict[str, str]) -> bool:
+		return len(self._search(filters)) > RESULT_CAP
+
+	async def fetch(self, filters: dict[str, str], capped: bool) -> list[dict]:
+		cars = self._search(filters)
+		return cars[:RESULT_CAP] + (cars[-RESULT_CAP:] if capped and len(cars) > RESULT_CAP else [])
+
+
+def _crawl(cars: list[dict], **kwargs) -> tuple[set, dict]:
+	api = FakeAPI(cars)
+	partitioner = SearchPartitioner(api.probe, api.fetch, result_cap=RESULT_CAP, tree_path=None, **kwargs)
+	found = asyncio.run(partitioner.crawl())
+	return {car["usedCarSkuId"] for car in found}, partitioner.get_stats()
+
+
+def test_all_the_cars_of_known_values_are_found():
+	cars = _make_cars(3000, unknown_fraction=0)
+	found, stats = _crawl(cars)
+	assert found == {car["usedCarSkuId"] for car in cars}
+	assert stats["remainder_cars"] == 0
+
+
+def test_cars_of_unknown_values_are_found_in_the_remainders():
+	cars = _make_cars(3000, unknown_fraction=0.01)
+	found, stats = _crawl(cars)
+	# Every car with known values is found, the others only when the capped listing of a split search has them
+	assert {car["usedCarSkuId"] for car in cars if "unknown" not in str(car.values())} <= found
+	assert stats["remainder_cars"] > 0
+
+
+def test_the_open_ended_facets_are_not_split():
+	# The owners and the cities of params are not all of them, splitting by them would lose the cars of the others
+	assert "owner" not in params.partition_facets
+	assert "city" not in params.partition_facets
+	cars = _make_cars(3000, unknown_fraction=0)
+	for car in cars[::2]:
+		car["owner"], car["city"] = "Third-Owner", "Pune"
+	found, _ = _crawl(cars)
+	assert found == {car["usedCarSkuId"] for car in cars}
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.storage import get_storage
+
+
+def _make_chunks() -> list[pd.DataFrame]:
+	# Raw scraped columns change types between the chunks: empty, then numbers, then text
+	chunks = [
+		pd.DataFrame({'km': [1000, 2000], 'Cargo Volumn': [np.nan, np.nan], 'color': ['red', None]}),
+		pd.DataFrame({'km': [np.nan, 3000], 'Cargo Volumn': [250.0, np.nan], 'color': [1.5, 'blue']}),
+		pd.DataFrame({'km': [4000, 5000], 'Cargo Volumn': ['300 litres', np.nan], 'color': ['green', 'white']}),
+		pd.DataFrame({'km': ['5,000 kms', 6000], 'Cargo Volumn': [np.nan, 120.0], 'color': [None, True]}),
+	]
+	for i, chunk in enumerate(chunks):
+		chunk.index = pd.Index([2 * i, 2 * i + 1], name='usedCarSkuId')
+	return chunks
+
+
+@pytest.mark.parametrize('storage_format', ['parquet', 'feather'])
+def test_writer_turns_the_columns_getting_text_into_text(storage_format, tmp_path):
+	storage = get_storage(storage_format)
+	file_path = str(tmp_path / f'cleaned{storage.extension}')
+	chunks = _make_chunks()
+	with storage.open_writer(file_path) as writer:
+		for chunk in chunks:
+			writer.write(chunk)
+
+	df = storage.load(file_path, index_col=None)
+	assert list(tmp_path.iterdir()) == [tmp_path / f'cleaned{storage.extension}']
+	assert df.index.tolist() == list(range(8))
+	assert df['Cargo Volumn'].tolist() == [None, None, '250.0', None, '300 litres', None, None, '120.0']
+	assert df['km'].tolist() == ['1000.0', '2000.0', None, '3000.0', '4000.0', '5000.0', '5,000 kms', '6000']
+	assert df['color'].tolist() == ['red', None, '1.5', 'blue', 'green', 'white', None, 'True']
+
+
+@pytest.mark.parametrize('storage_format', ['parquet', 'feather'])
+def test_writer_keeps_the_numeric_columns(storage_format, tmp_path):
+	storage = get_storage(storage_format)
+	file_path = str(tmp_path / f'cleaned{storage.extension}')
+	with storage.open_writer(file_path) as writer:
+		for chunk in _make_chunks()[:2]:
+			writer.write(chunk)
+
+	df = storage.load(file_path, index_col=None)
+	assert df['km'].dtype == np.float64
+	assert df['Cargo Volumn'].dtype == np.float64
+
+
+@pytest.mark.parametrize('storage_format', ['parquet', 'feather'])
+def test_writer_rewrites_the_chunks_one_at_a_time(storage_format, tmp_path):
+	storage = get_storage(storage_format)
+	file_path = str(tmp_path / f'cleaned{storage.extension}')
+	with storage.open_writer(file_path) as writer:
+		for chunk in _make_chunks():
+			writer.write(chunk)
+
+	# The chunks written before the schema was widened are still separate batches, they were not read back as a whole
+	assert [batch.num_rows for batch in storage._iter_batches(file_path)] == [2, 2, 2, 2]
@@ -0,0 +1,118 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.utils.utils import Utility as cutil
+
+RAW_DIR = os.path.join(os.path.dirname(__file__), os.pardir, 'data', 'raw')
+
+# The raw columns parsed by Cleaning, as the series passed to the parser, with the parser used
+RAW_COLUMNS = {
+    'Max Power Delivered': (lambda df: df['Max Power'].str.split('@').str[0], 'float'),
+    'Max Power At': (lambda df: df['Max Power'].str.split('@').str[1], 'float'),
+    'Max Torque Delivered': (lambda df: df['Max Torque'].str.split('@').str[0], 'float'),
+    'Max Torque At low': (lambda df: df['Max Torque'].str.split('@').str[1].astype(str).str.split('-').str[0], 'float'),
+    'Max Torque At high': (lambda df: df['Max Torque'].str.split('@').str[1].astype(str).str.split('-').str[1], 'float'),
+    'Bore': (lambda df: df['BoreX Stroke'].str.split('x').str[0], 'float'),
+    'Stroke': (lambda df: df['BoreX Stroke'].str.split('x').str[1], 'float'),
+    **{col: (lambda df, col=col: df[col], 'int') for col in [
+        'Length', 'Width', 'Height', 'Wheel Base', 'Kerb Weight', 'Gross Weight',
+    ]},
+    **{col: (lambda df, col=col: df[col], 'float') for col in [
+        'Front Tread', 'Rear Tread', 'Turning Radius', 'Top Speed', 'Acceleration', 'Cargo Volumn',
+        'Ground Clearance Unladen', 'Compression Ratio', 'Alloy Wheel Size', 'km', 'mileage_new',
+    ]},
+}
+
+# Values in the formats of the scraped columns, and the edge cases of the parser
+SAMPLE_RAW = pd.DataFrame({
+    'Max Power': ['33.54bhp@4000 rpm', '88.50bhp@6000rpm', '67.04bhp@5000-6000rpm', '118 PS', np.nan, '1.2.3bhp@@'],
+    'Max Torque': ['40.2Nm@3500 rpm', '113Nm@4400rpm', '250Nm@1500-2500rpm', '200Nm@1,750-3,000rpm', np.nan, 'Nm@-'],
+    'BoreX Stroke': ['69 x 72 mm', '73x74.5', '69.6 X 72mm', 'x', np.nan, '_76_ x ,80,'],
+    'Length': ['3599mm', '3,995 mm', '4_315', '', np.nan, 'mm'],
+    'Width': ['1495mm', '1,735', '1600 (mm)', '-1600', np.nan, '０１２'],
+    'Height': ['1700mm', '1,520mm', '1485', ' 1485', np.nan, 'N/A'],
+    'Wheel Base': ['2400mm', '2,520', '2450 mm', '2450', np.nan, '2,4,5,0'],
+    'Kerb Weight': ['960kg', '1,060-1,090kg', '1185', '1_185', np.nan, 'kg'],
+    'Gross Weight': ['1350kg', '1,630 kg', '1540', '0', np.nan, '00123'],
+    'Front Tread': ['1295mm', '1,479.5', '1.5.2', '.5', np.nan, '.'],
+    'Rear Tread': ['1295mm', '1,480', '1490 mm', '1490.', np.nan, '..'],
+    'Turning Radius': ['4.6 metres', '5.2m', '4.9', '5', np.nan, 'metres'],
+    'Top Speed': ['137 kmph', '180', '1,80 km/h', '200.0kmph', np.nan, '١٢٣'],
+    'Acceleration': ['13.5 seconds', '9.8s', '10', '12.0.1', np.nan, 'sec'],
+    'Cargo Volumn': ['300 litres', '1,050-litres', '120-litres', '256', np.nan, 'litres'],
+    'Ground Clearance Unladen': ['170mm', '1,70', '165 mm', '165', np.nan, '_'],
+    'Compression Ratio': ['10.0:1', '11.5', '16.5:1', '9', np.nan, ':1'],
+    'Alloy Wheel Size': ['15', '16.0', 'R16', '17 inch', np.nan, ','],
+    'km': ['1,20,000 kms', '45,000 km', '500', '1_000', np.nan, 'kms'],
+    'mileage_new': ['25.4 kmpl', '18.9', '21.1 km/kg', '15,2 kmpl', np.nan, 'kmpl'],
+})
+
+
+def _expected(s: pd.Series, conv: str) -> pd.Series:
+    # The per-cell parser, with the exception int() raises on a decimal prefix
+    parse = cutil.get_begin_number if conv == 'int' else cutil.get_begin_float
+    values = s.apply(parse)
+    return values.astype('Int64') if conv == 'int' else values.astype(float)
+
+
+def _assert_same_as_per_cell(s: pd.Series, conv: str) -> None:
+    parse_series = cutil.get_begin_number_series if conv == 'int' else cutil.get_begin_float_series
+    try:
+        expected = _expected(s, conv)
+    except ValueError:
+        with pytest.raises(ValueError):
+            parse_series(s)
+        return
+    pd.testing.assert_series_equal(parse_series(s), expected, check_names=False)
+
+
+def _read_raw_files() -> list[pd.DataFrame]:
+    frames = []
+    for path in sorted(glob.glob(os.path.join(RAW_DIR, '*.csv'))):
+        with open(path) as f:
+            # The raw dumps are stored with git LFS, skip the pointers when they are not pulled
+            if f.readline().startswith('version https://git-lfs'):
+                continue
+        frames.append(pd.read_csv(path, low_memory=False))
+    return frames
+
+
+@pytest.mark.parametrize('name', RAW_COLUMNS)
+def test_series_parser_matches_per_cell_parser_on_sample_columns(name):
+    get_series, conv = RAW_COLUMNS[name]
+    s = get_series(SAMPLE_RAW)
+    # Only the values without a decimal prefix can be parsed as int, like the per-cell parser
+    if conv == 'int':
+        _assert_same_as_per_cell(s[~s.astype(str).str.contains(r'^[0-9,_]*\.')], conv)
+    _assert_same_as_per_cell(s, conv)
+    _assert_same_as_per_cell(s, 'float')
+
+
+@pytest.mark.parametrize('name', RAW_COLUMNS)
+def test_series_parser_matches_per_cell_parser_on_raw_files(name):
+    frames = _read_raw_files()
+    get_series, conv = RAW_COLUMNS[name]
+    tested = False
+    for df in frames:
+        try:
+            s = get_series(df)
+        except (KeyError, AttributeError):
+            continue
+        _assert_same_as_per_cell(s, conv)
+        _assert_same_as_per_cell(s, 'float')
+        tested = True
+    if not tested:
+        pytest.skip('The raw dumps of data/raw are not available')
+
+
+def test_series_parser_matches_per_cell_parser_on_random_strings():
+    rng = np.random.default_rng(0)
+    alphabet = np.array(list('0123456789.,_ -@xkmKM/') + ['١', '０'])
+    s = pd.Series([''.join(rng.choice(alphabet, rng.integers(0, 12))) for _ in range(20000)] + [np.nan, None])
+    _assert_same_as_per_cell(s, 'float')
+    no_decimal = s[~s.astype(str).str.contains(r'^[0-9,_]*\.')]
+    _assert_same_as_per_cell(no_decimal, 'int')